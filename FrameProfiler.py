@@ -0,0 +1,113 @@
+import csv
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+import pygame
+import variables
+
+# Frame phases in display order, with their overlay labels
+PHASES = {
+    'events': "Events",
+    'grid': "Spatial grid",
+    'neighbors': "Neighbor distances",
+    'birds': "Bird updates",
+    'chart': "Chart update",
+    'background': "Background blit",
+    'bird_draw': "Bird draw",
+    'ui': "UI draw",
+    'flip': "Display flip",
+}
+
+
+class FrameProfiler:
+    """
+    The FrameProfiler class measures how long each phase of a frame takes. It keeps
+    a rolling window of recent frames for the on-screen overlay and can stream
+    every frame's timings to a CSV file.
+
+    Attributes:
+        window (int): Number of frames used for the rolling statistics.
+        history (dict): Rolling per-phase durations in milliseconds.
+        csv_path (str): File the timings are streamed to, or None.
+
+    Methods:
+        phase(name): Context manager timing one phase of the current frame.
+        end_frame(): Closes the current frame and records its timings.
+        summary(): Returns rolling mean and p95 per phase.
+        draw(screen, fps): Renders the timing overlay and returns its area.
+        close(): Flushes and closes the CSV stream.
+    """
+    def __init__(self, x, y, window=120, csv_path=None):
+        self.x = x
+        self.y = y
+        self.window = window
+        self.history = {name: deque(maxlen=window) for name in PHASES}
+        self.frame_history = deque(maxlen=window)
+        self.current = dict.fromkeys(PHASES, 0.0)
+        self.frame_count = 0
+        self.font = None
+
+        self.csv_path = csv_path
+        self.csv_file = None
+        self.csv_writer = None
+        if csv_path:
+            self.csv_file = open(csv_path, 'w', newline='')
+            self.csv_writer = csv.writer(self.csv_file)
+            self.csv_writer.writerow(['frame', *PHASES, 'total'])
+
+    @contextmanager
+    def phase(self, name):
+        """Time a phase, adding to it if it runs several times in a frame"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.current[name] += (time.perf_counter() - start) * 1000
+
+    def end_frame(self):
+        total = sum(self.current.values())
+        for name, duration in self.current.items():
+            self.history[name].append(duration)
+        self.frame_history.append(total)
+        if self.csv_writer is not None:
+            self.csv_writer.writerow([self.frame_count, *(f"{self.current[name]:.3f}" for name in PHASES),
+                                      f"{total:.3f}"])
+        self.frame_count += 1
+        self.current = dict.fromkeys(PHASES, 0.0)
+
+    def summary(self):
+        """Rolling (mean, p95) in milliseconds for every phase and the frame total"""
+        stats = {}
+        for name, durations in [*self.history.items(), ('total', self.frame_history)]:
+            if durations:
+                values = np.fromiter(durations, dtype=float)
+                stats[name] = (values.mean(), np.percentile(values, 95))
+            else:
+                stats[name] = (0.0, 0.0)
+        return stats
+
+    def draw(self, screen, fps=None):
+        if self.font is None:
+            self.font = pygame.font.Font(None, 18)
+        theme = variables.get_current_theme()
+        stats = self.summary()
+        rows = [("Phase", "avg ms", "p95 ms")]
+        rows += [(label, f"{stats[name][0]:.2f}", f"{stats[name][1]:.2f}") for name, label in PHASES.items()]
+        rows.append(("Frame", f"{stats['total'][0]:.2f}", f"{stats['total'][1]:.2f}"))
+        if fps is not None:
+            rows.append((f"FPS: {fps:.1f}", "", ""))
+
+        line_height = 16
+        surface = pygame.Surface((250, line_height * len(rows) + 10), pygame.SRCALPHA)
+        surface.fill((*theme['background'], 204))
+        for row, columns in enumerate(rows):
+            for column_x, text in zip((5, 145, 200), columns):
+                surface.blit(self.font.render(text, True, theme['text']), (column_x, 5 + row * line_height))
+        return screen.blit(surface, (self.x, self.y))
+
+    def close(self):
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
+            self.csv_writer = None
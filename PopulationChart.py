@@ -1,91 +1,323 @@
+from collections import deque
+import numpy as np
 import pygame
 import variables
 
+HISTORY_BUCKETS = 200  # Min/max buckets the whole-run history is kept in, an even number
+MAX_CACHED_LABELS = 512  # Rendered labels kept before the cache is cleared
+
+
+def bucket_size(count):
+    """Counts per whole-run bucket after count counts, the smallest power of two that fits them all"""
+    size = 1
+    while -(-count // size) > HISTORY_BUCKETS:
+        size *= 2
+    return size
+
+
+class HistoryPyramid:
+    """
+    The HistoryPyramid class gives the whole-run buckets a PopulationChart holds
+    after any number of counts of a fixed series, such as a recording, in time
+    independent of that number. The minimum and maximum of every aligned block
+    of 2 ** level counts are computed level by level. Full buckets are then
+    slices of one level, and the partial last bucket combines at most one block
+    of each lower level. Nothing is computed up front: the levels cover a
+    prefix of the series that doubles whenever a later count is asked for, so
+    playing through a recording costs constant time per count on average.
+
+    Attributes:
+        counts (ndarray): The series, read only as far as the levels reach.
+        built (int): Number of leading counts the levels cover.
+        levels (list): (minimum, maximum) arrays of the blocks of each level, level 0 being the counts.
+
+    Methods:
+        buckets(count): Returns the bucket minima, maxima and size after the first count counts.
+    """
+    def __init__(self, counts):
+        self.counts = counts
+        self.built = 0
+        self.levels = []
+
+    def build(self, count):
+        """Compute the levels over the first count counts"""
+        counts = np.asarray(self.counts[:count])
+        self.levels = [(counts, counts)]
+        while len(self.levels[-1][0]) >= 2:
+            lows, highs = self.levels[-1]
+            pairs = len(lows) // 2 * 2
+            self.levels.append((np.minimum(lows[0:pairs:2], lows[1:pairs:2]),
+                                np.maximum(highs[0:pairs:2], highs[1:pairs:2])))
+        self.built = count
+
+    def buckets(self, count):
+        if count > self.built:
+            self.build(min(len(self.counts), max(count, 2 * self.built)))
+        size = bucket_size(count)
+        level = size.bit_length() - 1
+        full = count // size
+        lows, highs = self.levels[level][0][:full], self.levels[level][1][:full]
+        start = full * size
+        if start < count:
+            # One block per set bit of the remainder, largest first
+            blocks = []
+            for lower in range(level - 1, -1, -1):
+                if (count - start) >> lower & 1:
+                    block = start >> lower
+                    blocks.append((self.levels[lower][0][block], self.levels[lower][1][block]))
+                    start += 1 << lower
+            lows = np.vstack([lows, np.min([low for low, _ in blocks], axis=0)])
+            highs = np.vstack([highs, np.max([high for _, high in blocks], axis=0)])
+        return lows, highs, size
+
+
 class PopulationChart:
+    """
+    The PopulationChart class plots predator and prey counts over time. The
+    latest CHART_HISTORY_LENGTH counts live in a ring buffer. Their maximum,
+    which scales the chart, is the only running extreme: a monotonic deque
+    keeps it up to date as counts enter and leave the window. The whole run is
+    kept at lower resolution as HISTORY_BUCKETS buckets holding the minimum and
+    maximum of their counts: when they are all in use, neighboring buckets are
+    merged and every bucket covers twice as many steps, so hours-long runs fit
+    in constant memory. The whole-run view is scaled by the largest bucket
+    maximum, found when it is drawn. The chart surface is only redrawn when
+    the lines, labels, view or theme it shows changed, from cached text labels.
+
+    Attributes:
+        total (int): Number of counts added since the history was last reset.
+        max_population (int): Largest count in the recent window, at least 1.
+        full_history (bool): Whether the whole run is shown instead of the recent window.
+        bucket_size (int): Counts per whole-run bucket, a power of two.
+
+    Methods:
+        update(num_predators, num_prey): Adds the counts of one step.
+        history(): Returns the recent predator and prey counts, oldest first.
+        set_history(predators, prey): Replaces the whole history.
+        state(): Returns the whole history as restore() arguments.
+        restore(predators, prey, total, bucket_min, bucket_max, bucket_size): Replaces the history from its parts.
+        toggle_view(): Switches between the recent window and the whole run.
+        draw(screen): Renders the chart and returns its area.
+    """
     def __init__(self, x, y):
         self.width = 200
         self.height = 200
         self.x = x
         self.y = y
-        self.predator_history = []
-        self.prey_history = []
-        self.max_population = 0
         self.font = pygame.font.Font(None, variables.POPULATION_FONT_SIZE)
-        
-        # Create transparent surface
+        self.labels = {}
+        self.full_history = False
+
+        # Create transparent surface, redrawn only when something on it changed
         self.surface = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
-        
+        self.drawn_key = None
+        self.reset()
+
+    def reset(self):
+        """Forget every count"""
+        self.length = variables.CHART_HISTORY_LENGTH
+        self.recent = np.zeros((self.length, 2), dtype=np.int64)
+        self.total = 0
+        # (index, value) pairs with decreasing values, the first one the window maximum
+        self.peaks = deque()
+        self.bucket_min = np.zeros((HISTORY_BUCKETS, 2), dtype=np.int64)
+        self.bucket_max = np.zeros((HISTORY_BUCKETS, 2), dtype=np.int64)
+        self.buckets = 0
+        self.bucket_size = 1
+        self.bucket_fill = 0
+
+    @property
+    def max_population(self):
+        return max(self.peaks[0][1], 1) if self.peaks else 1
+
+    @property
+    def predator_history(self):
+        return self.history()[0].tolist()
+
+    @property
+    def prey_history(self):
+        return self.history()[1].tolist()
+
     def update(self, num_predators, num_prey):
-        # Add new data points
-        self.predator_history.append(num_predators)
-        self.prey_history.append(num_prey)
-        
-        # Keep only the last N points
-        if len(self.predator_history) > variables.CHART_HISTORY_LENGTH:
-            self.predator_history.pop(0)
-            self.prey_history.pop(0)
-            
-        # Update max population for scaling
-        self.max_population = max(max(self.predator_history + self.prey_history), 1)
-        
+        index = self.total
+        self.recent[index % self.length] = num_predators, num_prey
+        self.total += 1
+
+        # Running maximum of the recent window
+        value = max(num_predators, num_prey)
+        while self.peaks and self.peaks[-1][1] <= value:
+            self.peaks.pop()
+        self.peaks.append((index, value))
+        if self.peaks[0][0] <= index - self.length:
+            self.peaks.popleft()
+
+        # Whole-run buckets, halving the resolution when they are all in use
+        if self.bucket_fill == 0:
+            if self.buckets == HISTORY_BUCKETS:
+                self.merge_buckets()
+            self.bucket_min[self.buckets] = self.bucket_max[self.buckets] = num_predators, num_prey
+            self.buckets += 1
+        else:
+            last = self.buckets - 1
+            self.bucket_min[last] = np.minimum(self.bucket_min[last], (num_predators, num_prey))
+            self.bucket_max[last] = np.maximum(self.bucket_max[last], (num_predators, num_prey))
+        self.bucket_fill = (self.bucket_fill + 1) % self.bucket_size
+
+    def merge_buckets(self):
+        half = HISTORY_BUCKETS // 2
+        self.bucket_min[:half] = np.minimum(self.bucket_min[0::2], self.bucket_min[1::2])
+        self.bucket_max[:half] = np.maximum(self.bucket_max[0::2], self.bucket_max[1::2])
+        self.buckets = half
+        self.bucket_size *= 2
+
+    def history(self):
+        """(predators, prey) arrays of the recent window, oldest first"""
+        count = min(self.total, self.length)
+        order = np.arange(self.total - count, self.total) % self.length
+        return self.recent[order, 0], self.recent[order, 1]
+
+    def state(self):
+        """The recent window and whole-run buckets, as keyword arguments of restore()"""
+        predators, prey = self.history()
+        return {
+            'predators': predators,
+            'prey': prey,
+            'total': self.total,
+            'bucket_min': self.bucket_min[:self.buckets].copy(),
+            'bucket_max': self.bucket_max[:self.buckets].copy(),
+            'bucket_size': self.bucket_size,
+        }
+
+    def set_history(self, predators, prey):
+        """Replace the history with the given counts, oldest first, as if they had been added one by one"""
+        counts = np.column_stack([np.asarray(predators, dtype=np.int64), np.asarray(prey, dtype=np.int64)])
+        size = bucket_size(len(counts))
+        starts = np.arange(0, len(counts), size)
+        if len(starts):
+            lows = np.minimum.reduceat(counts, starts, axis=0)
+            highs = np.maximum.reduceat(counts, starts, axis=0)
+        else:
+            lows = highs = np.zeros((0, 2), dtype=np.int64)
+        window = counts[-self.length:]
+        self.restore(window[:, 0], window[:, 1], len(counts), lows, highs, size)
+
+    def restore(self, predators, prey, total, bucket_min, bucket_max, bucket_size):
+        """
+        Replace the history with one of total counts, given as its latest counts,
+        oldest first, and its whole-run buckets of bucket_size counts each
+        """
+        window = np.column_stack([np.asarray(predators, dtype=np.int64),
+                                  np.asarray(prey, dtype=np.int64)])[-self.length:]
+        self.reset()
+        self.total = total
+        if len(window):
+            self.recent[np.arange(total - len(window), total) % self.length] = window
+            for offset, value in enumerate(window.max(axis=1).tolist()):
+                while self.peaks and self.peaks[-1][1] <= value:
+                    self.peaks.pop()
+                self.peaks.append((total - len(window) + offset, value))
+        self.buckets = len(bucket_min)
+        self.bucket_min[:self.buckets] = bucket_min
+        self.bucket_max[:self.buckets] = bucket_max
+        self.bucket_size = bucket_size
+        self.bucket_fill = total % bucket_size
+
+    def toggle_view(self):
+        self.full_history = not self.full_history
+
+    def label(self, text, color):
+        """Rendered text, cached by content and color"""
+        key = (text, tuple(color))
+        if key not in self.labels:
+            if len(self.labels) >= MAX_CACHED_LABELS:
+                self.labels.clear()
+            self.labels[key] = self.font.render(text, True, color)
+        return self.labels[key]
+
     def draw(self, screen):
+        # The counts move the lines by whole pixels, so most steps of a steady population draw the same chart
+        key = (self.drawn_values(), variables.is_dark_mode)
+        if key != self.drawn_key:
+            self.render(*key[0])
+            self.drawn_key = key
+
+        # Blit the transparent surface onto the main screen
+        return screen.blit(self.surface, (self.x, self.y))
+
+    def drawn_values(self):
+        """
+        Everything the chart shows: the view, the latest counts, the scale and the
+        screen points of every line, as (full_history, latest, max_population,
+        lines). Whole-run lines come as (top, bottom) points of each band.
+        """
+        predators, prey = self.history()
+        latest = (int(predators[-1]) if len(predators) else 0, int(prey[-1]) if len(prey) else 0)
+        if self.full_history:
+            lows, highs = self.bucket_min[:self.buckets], self.bucket_max[:self.buckets]
+            max_population = max(int(highs.max()), 1) if self.buckets else 1
+            lines = tuple((self.chart_points(highs[:, series], max_population),
+                           self.chart_points(lows[:, series], max_population)) for series in range(2))
+        else:
+            max_population = self.max_population
+            lines = tuple(self.chart_points(values, max_population) for values in (predators, prey))
+        return self.full_history, latest, max_population, lines
+
+    def render(self, full_history, latest, max_population, lines):
+        theme = variables.get_current_theme()
+
         # Clear the transparent surface
         self.surface.fill((0, 0, 0, 0))
-        
+
         # Draw semi-transparent background
-        pygame.draw.rect(self.surface, (*variables.get_current_theme()['background'], 204), 
-                        (0, 0, self.width, self.height))  # 204 is 80% of 255
-        
+        pygame.draw.rect(self.surface, (*theme['background'], 204),
+                         (0, 0, self.width, self.height))  # 204 is 80% of 255
+
         # Draw title
-        title = self.font.render("Population Over Time", True, (*variables.get_current_theme()['text'], 255))
+        title = self.label("Whole Run" if full_history else "Population Over Time", (*theme['text'], 255))
         title_x = (self.width - title.get_width()) // 2
         self.surface.blit(title, (title_x, 5))
-        
+
         # Draw population counts
-        pred_text = f"Predators: {self.predator_history[-1]}" if self.predator_history else "Predators: 0"
-        prey_text = f"Prey: {self.prey_history[-1]}" if self.prey_history else "Prey: 0"
-        
-        pred_surface = self.font.render(pred_text, True, (*variables.PREDATOR_COLOR, 255))
-        prey_surface = self.font.render(prey_text, True, (*variables.PREY_COLOR, 255))
-        
+        pred_surface = self.label(f"Predators: {latest[0]}", (*variables.PREDATOR_COLOR, 255))
+        prey_surface = self.label(f"Prey: {latest[1]}", (*variables.PREY_COLOR, 255))
+
         # Center the population counts
         pred_x = 10
         prey_x = self.width - prey_surface.get_width() - 10
         self.surface.blit(pred_surface, (pred_x, 25))
         self.surface.blit(prey_surface, (prey_x, 25))
-        
+
         # Draw chart border
-        pygame.draw.rect(self.surface, (*variables.get_current_theme()['border'], 255),
-                        (0, 0, self.width, self.height), 1)
-        
+        pygame.draw.rect(self.surface, (*theme['border'], 255), (0, 0, self.width, self.height), 1)
+
         # Draw grid lines
         for i in range(4):
             y_pos = 50 + (i * (self.height - 70) // 3)
             pygame.draw.line(self.surface, (*variables.CHART_GRID_COLOR, 204),
-                           (0, y_pos),
-                           (self.width, y_pos), 1)
-            
+                             (0, y_pos),
+                             (self.width, y_pos), 1)
+
             # Draw population value for this grid line
-            value = int(self.max_population * (3 - i) / 3)
-            value_text = str(value)
-            value_surface = self.font.render(value_text, True, (*variables.get_current_theme()['text'], 255))
-            self.surface.blit(value_surface, (5, y_pos - 8))
-            
+            value = int(max_population * (3 - i) / 3)
+            self.surface.blit(self.label(str(value), (*theme['text'], 255)), (5, y_pos - 8))
+
         # Draw population lines
-        if len(self.predator_history) > 1:
-            # Draw predator line
-            pred_points = [(int(i * self.width / (len(self.predator_history) - 1)),
-                           50 + int((self.height - 70) * (1 - p / self.max_population)))
-                          for i, p in enumerate(self.predator_history)]
-            if len(pred_points) > 1:
-                pygame.draw.lines(self.surface, (*variables.PREDATOR_COLOR, 255), False, pred_points, 2)
-            
-            # Draw prey line
-            prey_points = [(int(i * self.width / (len(self.prey_history) - 1)),
-                           50 + int((self.height - 70) * (1 - p / self.max_population)))
-                          for i, p in enumerate(self.prey_history)]
-            if len(prey_points) > 1:
-                pygame.draw.lines(self.surface, (*variables.PREY_COLOR, 255), False, prey_points, 2)
-                
-        # Blit the transparent surface onto the main screen
-        screen.blit(self.surface, (self.x, self.y))
+        colors = ((*variables.PREDATOR_COLOR, 255), (*variables.PREY_COLOR, 255))
+        if full_history:
+            # Every bucket spans the counts seen in it, drawn as a band from its minimum to its maximum
+            for (top, bottom), color in zip(lines, colors):
+                if len(top) > 1:
+                    pygame.draw.polygon(self.surface, (*color[:3], 120), top + bottom[::-1])
+                    pygame.draw.lines(self.surface, color, False, top, 1)
+        else:
+            for points, color in zip(lines, colors):
+                if len(points) > 1:
+                    pygame.draw.lines(self.surface, color, False, points, 2)
+
+    def chart_points(self, values, max_population):
+        """Screen points of a series spread over the chart width, as a tuple"""
+        if len(values) < 2:
+            return ()
+        x = (np.arange(len(values)) * self.width / (len(values) - 1)).astype(int)
+        y = 50 + ((self.height - 70) * (1 - values / max_population)).astype(int)
+        return tuple(zip(x.tolist(), y.tolist()))
@@ -24,6 +24,12 @@ class Slider:
         label_text = font.render(f"{self.label}: {self.val:.2f}", True, theme['text'])
         screen.blit(label_text, (self.x, self.y - 25)) # Label above the slider
 
+    def set_value(self, value):
+        """Move the handle to a value set from outside the slider"""
+        self.val = min(max(value, self.min_val), self.max_val)
+        self.slider_x = self.x + int((self.val - self.min_val) / (self.max_val - self.min_val) * self.width)
+        self.slider_rect.x = self.slider_x - 5
+
     def update(self, mouse_pos):
         if self.slider_rect.collidepoint(mouse_pos) and pygame.mouse.get_pressed()[0]: # Dragging
             self.slider_x = max(self.x, min(mouse_pos[0], self.x + self.width))
@@ -0,0 +1,96 @@
+import os
+import pygame
+import variables
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+
+class AssetManager:
+    """
+    The AssetManager class loads every texture from disk once, converted to the
+    display format, and composes the static parts of the arena (background,
+    borders, restricted areas and polygon obstacles) into a single cached layer. The layer is only
+    rebuilt when the theme or the restricted areas change.
+
+    Attributes:
+        textures (dict): Loaded textures by file name.
+        scaled (dict): Scaled copies of textures by (file name, size).
+
+    Methods:
+        texture(name): Returns a texture from the static directory.
+        scaled_texture(name, size): Returns a texture scaled to the given size.
+        background_layer(): Returns the composed static background.
+        invalidate(): Forces the background layer to be rebuilt.
+    """
+    def __init__(self, screen_width, screen_height):
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.textures = {}
+        self.scaled = {}
+        self.layer = None
+        self.layer_key = None
+
+    def texture(self, name):
+        if name not in self.textures:
+            texture = pygame.image.load(os.path.join(STATIC_DIR, name))
+            # convert() needs a display, without one the texture stays in its file format
+            self.textures[name] = texture.convert() if pygame.display.get_surface() else texture
+        return self.textures[name]
+
+    def scaled_texture(self, name, size):
+        key = (name, tuple(size))
+        if key not in self.scaled:
+            self.scaled[key] = pygame.transform.scale(self.texture(name), size)
+        return self.scaled[key]
+
+    def invalidate(self):
+        self.layer_key = None
+
+    def background_layer(self):
+        """The static background, rebuilt when the theme or the restricted areas have changed"""
+        key = (variables.is_dark_mode, tuple(tuple(rect) for rect in variables.restricted_areas),
+               tuple(tuple(map(tuple, points)) for points in variables.restricted_polygons))
+        if key != self.layer_key:
+            self.layer = self.compose_background()
+            self.layer_key = key
+        return self.layer
+
+    def compose_background(self):
+        layer = pygame.Surface((self.screen_width, self.screen_height))
+        layer.blit(self.scaled_texture('background.jpg', (self.screen_width, self.screen_height)), (0, 0))
+
+        # Draw wall texture for areas outside the main border
+        outside_border_rects = [
+            # Left side outside border
+            (0, 0, variables.BORDER_THICKNESS, self.screen_height),
+            # Right side outside border (accounting for panel)
+            (self.screen_width - variables.panel_width, 0, variables.BORDER_THICKNESS, self.screen_height),
+            # Top outside border
+            (0, 0, self.screen_width, variables.BORDER_THICKNESS),
+            # Bottom outside border
+            (0, self.screen_height - variables.BORDER_THICKNESS, self.screen_width, variables.BORDER_THICKNESS)
+        ]
+        for rect_x, rect_y, rect_width, rect_height in outside_border_rects:
+            layer.blit(self.scaled_texture('wall.jpg', (rect_width, rect_height)), (rect_x, rect_y))
+
+        # Solid border around the arena
+        pygame.draw.rect(layer, variables.get_current_theme()['border'],
+                         (variables.BORDER_THICKNESS, variables.BORDER_THICKNESS,
+                          self.screen_width - variables.panel_width - 2 * variables.BORDER_THICKNESS,
+                          self.screen_height - 2 * variables.BORDER_THICKNESS),
+                         2)  # Border with thickness of 2
+
+        # Restricted areas with wall texture
+        for rect_x, rect_y, rect_width, rect_height in variables.restricted_areas:
+            layer.blit(self.scaled_texture('wall.jpg', (rect_width, rect_height)), (rect_x, rect_y))
+
+        # Polygon obstacles, the wall texture cut to their shape
+        for points in variables.restricted_polygons:
+            left = min(point[0] for point in points)
+            top = min(point[1] for point in points)
+            size = (max(point[0] for point in points) - left + 1, max(point[1] for point in points) - top + 1)
+            shape = pygame.Surface(size, pygame.SRCALPHA)
+            pygame.draw.polygon(shape, (255, 255, 255, 255), [(x - left, y - top) for x, y in points])
+            shape.blit(self.scaled_texture('wall.jpg', size), (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
+            layer.blit(shape, (left, top))
+        return layer
@@ -0,0 +1,239 @@
+"""
+Benchmarks for the simulation.
+
+    python benchmark.py game --birds 100 1000 10000 100000 --output results.json
+    python benchmark.py compare baseline.json results.json
+    python benchmark.py neighbors --birds 1000 10000 --radius 30 --layout clustered
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+import numpy as np
+import variables
+from headless import load_obstacles, load_polygons
+from neighbors import NEIGHBOR_SEARCH_BACKENDS, create_neighbor_search
+
+# Obstacle layouts for the game benchmark, besides 'default', 'none' and JSON files
+OBSTACLE_SETS = {
+    # 120 small blocks in a regular lattice, the worst case for per-rectangle avoidance
+    'scattered': [(40 + 100 * column, 40 + 120 * row, 30, 30) for column in range(12) for row in range(6)
+                  if (column + row) % 3 != 0],
+    # 300 small blocks, a map with hundreds of obstacles
+    'dense': [(30 + 60 * column, 30 + 50 * row, 12, 12) for column in range(20) for row in range(15)],
+}
+
+
+def arena_positions(num_birds, layout, rng):
+    """Bird positions spread uniformly over the arena or packed into a few dense clusters"""
+    width = variables.screen_width - variables.panel_width
+    height = variables.screen_height
+    if layout == 'uniform':
+        return rng.uniform(0, width, num_birds), rng.uniform(0, height, num_birds)
+
+    centers = rng.uniform((0, 0), (width, height), size=(8, 2))
+    cluster = rng.integers(0, len(centers), num_birds)
+    x = np.clip(centers[cluster, 0] + rng.normal(0, 25, num_birds), 0, width)
+    y = np.clip(centers[cluster, 1] + rng.normal(0, 25, num_birds), 0, height)
+    return x, y
+
+
+def time_call(function, repeat):
+    """Best wall time of repeat calls, in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_neighbors(num_birds, radius, layout, backends, repeat=3, seed=0):
+    """Time build, pair search and k-nearest queries for every backend"""
+    rng = np.random.default_rng(seed)
+    x, y = arena_positions(num_birds, layout, rng)
+    probes = rng.integers(0, num_birds, 100)
+    results = []
+    for name in backends:
+        try:
+            search = create_neighbor_search(name, radius)
+        except ImportError as error:
+            print(f"skipping {name}: {error}")
+            continue
+        search.fit(radius)
+        build = time_call(lambda: search.build(x, y), repeat)
+        pairs = time_call(lambda: search.pairs(radius), repeat)
+        knn = time_call(lambda: [search.query_knn(x[p], y[p], 7) for p in probes], repeat) / len(probes)
+        results.append({
+            'backend': name,
+            'num_birds': num_birds,
+            'radius': radius,
+            'layout': layout,
+            'build_s': build,
+            'pairs_s': pairs,
+            'knn_query_s': knn,
+            'num_pairs': len(search.pairs(radius)),
+        })
+    return results
+
+
+def obstacles_for(spec):
+    return list(OBSTACLE_SETS[spec]) if spec in OBSTACLE_SETS else load_obstacles(spec)
+
+
+def polygons_for(spec):
+    return [] if spec in OBSTACLE_SETS else load_polygons(spec)
+
+
+def bench_game(num_birds, predator_ratio, radius, obstacles, frames=5, seed=0):
+    """Time Game.update and Game.draw separately for one configuration"""
+    import birdies_game
+
+    variables.num_birds = num_birds
+    variables.predator_ratio = predator_ratio
+    variables.interaction_zone_radius = radius
+    variables.restricted_areas = obstacles_for(obstacles)
+    variables.restricted_polygons = polygons_for(obstacles)
+    variables.seed = seed
+    game = birdies_game.Game()
+
+    neighbor_times = []
+    update_times = []
+    draw_times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        game.update_spatial_grid()
+        game.neighbor_pairs()
+        neighbor_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        game.update()
+        update_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        game.draw()
+        draw_times.append(time.perf_counter() - start)
+
+    # Peak memory of one more frame, measured apart as tracing slows everything down
+    tracemalloc.start()
+    game.update()
+    game.draw()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'num_birds': num_birds,
+        'predator_ratio': predator_ratio,
+        'interaction_radius': radius,
+        'obstacles': obstacles,
+        'engine': variables.engine,
+        'neighbor_search': variables.neighbor_search,
+        'frames': frames,
+        'update_s': float(np.median(update_times)),
+        'draw_s': float(np.median(draw_times)),
+        'neighbor_query_s': float(np.median(neighbor_times)),
+        'peak_memory_bytes': peak,
+    }
+
+
+def environment():
+    """Versions recorded next to the results, so files from different revisions can be told apart"""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        revision = ''
+    return {
+        'revision': revision,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+    }
+
+
+def config_key(result):
+    return tuple((name, result[name]) for name in ('engine', 'neighbor_search', 'num_birds', 'predator_ratio',
+                                                   'interaction_radius', 'obstacles'))
+
+
+def compare(baseline_path, current_path, metrics=('update_s', 'draw_s', 'neighbor_query_s', 'peak_memory_bytes')):
+    """Print the current/baseline ratio of every metric for configurations present in both files"""
+    with open(baseline_path) as baseline_file:
+        baseline = {config_key(result): result for result in json.load(baseline_file)['results']}
+    with open(current_path) as current_file:
+        current = json.load(current_file)['results']
+
+    print(f"{'birds':>7} {'pred':>5} {'radius':>6} {'obstacles':<10} " + " ".join(f"{m:>18}" for m in metrics))
+    for result in current:
+        old = baseline.get(config_key(result))
+        if old is None:
+            continue
+        ratios = [result[m] / old[m] if old[m] else float('nan') for m in metrics]
+        print(f"{result['num_birds']:>7} {result['predator_ratio']:>5} {result['interaction_radius']:>6} "
+              f"{result['obstacles']:<10} " + " ".join(f"{ratio:>17.2f}x" for ratio in ratios))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulation benchmarks")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    game = commands.add_parser('game', help="time Game.update and Game.draw across configurations")
+    game.add_argument('--birds', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    game.add_argument('--predator-ratios', type=float, nargs='+', default=[variables.predator_ratio])
+    game.add_argument('--radii', type=float, nargs='+', default=[variables.interaction_zone_radius])
+    game.add_argument('--obstacles', nargs='+', default=['default'],
+                      help="'default', 'none', 'scattered', 'dense' or JSON obstacle files")
+    game.add_argument('--engine', default=variables.engine)
+    game.add_argument('--neighbor-search', default=variables.neighbor_search)
+    game.add_argument('--frames', type=int, default=5)
+    game.add_argument('--output', help="write the results as JSON to this file")
+
+    diff = commands.add_parser('compare', help="compare two result files from the game benchmark")
+    diff.add_argument('baseline')
+    diff.add_argument('current')
+
+    neighbors = commands.add_parser('neighbors', help="compare neighbor-search backends")
+    neighbors.add_argument('--birds', type=int, nargs='+', default=[1000, 10000])
+    neighbors.add_argument('--radius', type=float, default=variables.interaction_zone_radius)
+    neighbors.add_argument('--layout', choices=['uniform', 'clustered'], default='uniform')
+    neighbors.add_argument('--backends', nargs='+', default=list(NEIGHBOR_SEARCH_BACKENDS))
+    neighbors.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == 'game':
+        # Render off-screen so the suite runs on machines without a display
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        variables.engine = args.engine
+        variables.neighbor_search = args.neighbor_search
+        results = []
+        print(f"{'birds':>7} {'pred':>5} {'radius':>6} {'obstacles':<10} {'update ms':>10} {'draw ms':>9} "
+              f"{'query ms':>9} {'peak MB':>8}")
+        for num_birds, predator_ratio, radius, obstacles in itertools.product(
+                args.birds, args.predator_ratios, args.radii, args.obstacles):
+            result = bench_game(num_birds, predator_ratio, radius, obstacles, args.frames)
+            results.append(result)
+            print(f"{num_birds:>7} {predator_ratio:>5} {radius:>6} {obstacles:<10} "
+                  f"{result['update_s'] * 1e3:>10.2f} {result['draw_s'] * 1e3:>9.2f} "
+                  f"{result['neighbor_query_s'] * 1e3:>9.2f} {result['peak_memory_bytes'] / 2**20:>8.1f}")
+        if args.output:
+            with open(args.output, 'w') as output_file:
+                json.dump({'environment': environment(), 'results': results}, output_file, indent=2)
+
+    elif args.command == 'compare':
+        compare(args.baseline, args.current)
+
+    elif args.command == 'neighbors':
+        print(f"{'backend':<8} {'birds':>7} {'pairs':>9} {'build ms':>9} {'pairs ms':>9} {'knn us':>8}")
+        for num_birds in args.birds:
+            for result in bench_neighbors(num_birds, args.radius, args.layout, args.backends, args.repeat):
+                print(f"{result['backend']:<8} {num_birds:>7} {result['num_pairs']:>9} "
+                      f"{result['build_s'] * 1e3:>9.2f} {result['pairs_s'] * 1e3:>9.2f} "
+                      f"{result['knn_query_s'] * 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
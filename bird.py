@@ -1,8 +1,24 @@
 import math
-import random
 import numpy as np
 import pygame
 import variables
+from clusters import cluster_colors
+from distance_field import obstacle_field, uses_distance_field
+from sprites import bird_sprites, alpha_bucket
+
+
+def draw_zone_arc(x, y, dx, dy, radius):
+    """Draw the 100-degree frontal arc of a zone around a bird heading along (dx, dy)"""
+    angle = math.atan2(dy, dx)  # Angle of movement
+    points = []
+    arc_angle = math.radians(100)  # 100 degrees in radians
+    pp = 13  # Number of points
+
+    for ii in range(pp):
+        current_angle = angle - arc_angle / 2 + ii * arc_angle / (pp - 1)  # Distribute points over the arc
+        points.append((x + radius * math.cos(current_angle), y + radius * math.sin(current_angle)))
+
+    return pygame.draw.lines(variables.screen, variables.get_current_theme()['border'], False, points, 1)
 
 
 class Bird:
@@ -34,10 +50,13 @@ class Bird:
         self.last_dy = dy
         
     def draw(self, bird_index, screen):
-        # Calculate rotation angle based on movement direction
-        angle = math.degrees(math.atan2(self.dy, self.dx))
+        """Draw the bird and return the screen area it covers"""
         size = self.get_size()
         color = self.get_color()
+        if variables.CLUSTERS is not None and not self.is_dead and self.can_be_killed():
+            # Prey take the color of their flock
+            color = variables.CLUSTER_COLORS[cluster_colors(variables.CLUSTERS[bird_index], variables.CLUSTER_COLORS)]
+        blur_rect = None
         
         if self.is_dead:
             # Draw dead bird with enhanced fade effect
@@ -46,77 +65,30 @@ class Bird:
                 self.fade_alpha = max(50, self.fade_alpha - 0.3)  # Slower fade
             else:
                 self.fade_alpha = 255
-            
-            # Create surface for dead bird with more detailed shape
-            bird_surface = pygame.Surface((size * 3, size * 3), pygame.SRCALPHA)
-            pygame.draw.polygon(bird_surface, (*color[:3], alpha), [
-                (size * 3, size * 1.5),  # Elongated tip
-                (0, size),  # Top back
-                (size, size * 1.5),  # Back indent
-                (0, size * 2),  # Bottom back
-            ])
-            
-            # Add subtle wing-like details
-            wing_color = (*color[:3], alpha // 2)
-            pygame.draw.polygon(bird_surface, wing_color, [
-                (size * 2, size * 1.5),
-                (size, size),
-                (size * 1.5, size * 1.5),
-            ])
+            sprite, offset = bird_sprites.sprite(color, size, False, self.dx, self.dy, alpha_bucket(alpha))
         else:
-            # Create surface for living bird
-            bird_surface = pygame.Surface((size * 3, size * 3), pygame.SRCALPHA)
-            
-            # Draw the main body with more dynamic shape
-            pygame.draw.polygon(bird_surface, color, [
-                (size * 3, size * 1.5),  # Elongated nose
-                (0, size),  # Top back
-                (size, size * 1.5),  # Back indent
-                (0, size * 2),  # Bottom back
-            ])
-            
-            # Add more detailed eye
-            eye_pos = (size * 2.5, size * 1.5)
-            pygame.draw.circle(bird_surface, (255, 255, 255), eye_pos, size/4)  # Larger white of eye
-            pygame.draw.circle(bird_surface, (0, 0, 0), eye_pos, size/6)  # Larger pupil
-            
-            # Add wing details
-            wing_color = tuple(max(0, c - 30) for c in color[:3])  # Slightly darker wing color
-            pygame.draw.polygon(bird_surface, wing_color, [
-                (size * 2, size * 1.5),
-                (size, size),
-                (size * 1.5, size * 1.5),
-            ])
-            
+            sprite, offset = bird_sprites.sprite(color, size, True, self.dx, self.dy)
+
             # Add motion blur effect for fast-moving birds
-            speed = math.hypot(self.dx, self.dy)
-            if speed > 2:
-                blur_surface = pygame.Surface((size * 3, size * 3), pygame.SRCALPHA)
-                blur_color = (*color[:3], 50)  # Very transparent
-                pygame.draw.polygon(blur_surface, blur_color, [
-                    (size * 3, size * 1.5),
-                    (0, size),
-                    (size, size * 1.5),
-                    (0, size * 2),
-                ])
-                screen.blit(pygame.transform.rotate(blur_surface, -angle),
-                          (variables.X[bird_index] - size + self.dx,
-                           variables.Y[bird_index] - size + self.dy))
-        
-        # Rotate and draw the bird
-        rotated_bird = pygame.transform.rotate(bird_surface, -angle)
-        screen.blit(rotated_bird,
-                   (variables.X[bird_index] - rotated_bird.get_width()/2,
-                    variables.Y[bird_index] - rotated_bird.get_height()/2))
+            if math.hypot(self.dx, self.dy) > 2:
+                blur_rect = screen.blit(bird_sprites.blur(color, size, self.dx, self.dy),
+                                        (variables.X[bird_index] - size + self.dx,
+                                         variables.Y[bird_index] - size + self.dy))
+
+        # Draw the pre-rotated bird
+        rect = screen.blit(sprite, (variables.X[bird_index] - offset[0], variables.Y[bird_index] - offset[1]))
+        if blur_rect is not None:
+            rect.union_ip(blur_rect)
         
         # Draw interaction zones if enabled
         if variables.show_zones:
-            self.draw_collision_zone(bird_index)
-            self.draw_interaction_zone(bird_index)
+            rect.union_ip(self.draw_collision_zone(bird_index))
+            rect.union_ip(self.draw_interaction_zone(bird_index))
+        return rect
         
     def get_size(self):
         """Override in subclasses to define specific sizes"""
-        return 10  # Increased base size from 5 to 10
+        return variables.BIRD_SIZE
         
     def get_color(self):
         """Override in subclasses to define specific colors"""
@@ -133,32 +105,12 @@ class Bird:
         return False
 
     def draw_collision_zone(self, bird_index):
-        angle = math.atan2(self.dy, self.dx)  # Angle of movement
-        points = []
-        arc_angle = math.radians(100)  # 100 degrees in radians
-        pp = 13  # Number of points
-
-        for ii in range(pp):
-            current_angle = angle - arc_angle / 2 + ii * arc_angle / (pp - 1)  # Distribute points over the arc
-            x = variables.X[bird_index] + variables.collision_zone_radius * math.cos(current_angle)
-            y = variables.Y[bird_index] + variables.collision_zone_radius * math.sin(current_angle)
-            points.append((x, y))
-
-        pygame.draw.lines(variables.screen, variables.get_current_theme()['border'], False, points, 1)
+        return draw_zone_arc(variables.X[bird_index], variables.Y[bird_index], self.dx, self.dy,
+                             variables.collision_zone_radius)
 
     def draw_interaction_zone(self, bird_index):
-        angle = math.atan2(self.dy, self.dx)
-        points = []
-        arc_angle = math.radians(100)  # 100 degrees in radians
-        pp = 13
-
-        for ii in range(pp):
-            current_angle = angle - arc_angle / 2 + ii * arc_angle / (pp - 1)
-            x = variables.X[bird_index] + variables.interaction_zone_radius * math.cos(current_angle)
-            y = variables.Y[bird_index] + variables.interaction_zone_radius * math.sin(current_angle)
-            points.append((x, y))
-
-        pygame.draw.lines(variables.screen, variables.get_current_theme()['border'], False, points, 1)  # Green lines
+        return draw_zone_arc(variables.X[bird_index], variables.Y[bird_index], self.dx, self.dy,
+                             variables.interaction_zone_radius)
 
     def is_colliding(self, bird_index, other_bird_index, distance):
         if self.is_dead:  # Dead birds don't collide
@@ -214,25 +166,29 @@ class Bird:
             self.dx += shift_strength * dx_to_other / distance
             self.dy += shift_strength * dy_to_other / distance
 
-    def update(self, bird_index, all_birds, distances, this_step_interactions):
+    def update(self, bird_index, all_birds, neighbor_indices, neighbor_distances, this_step_interactions,
+               speed_adjustment, escape_angle):
+        """
+        Advance the bird by one step. speed_adjustment and escape_angle are this bird's
+        draws from the simulation's random generator, made for all birds at once.
+        """
         # Update energy if this bird has an energy system
         if hasattr(self, 'update_energy'):
             self.update_energy()
             
-        if self.is_dead:
-            self.dx = 0
-            self.dy = 0
+        if self.is_dead:  # Dead birds keep their last heading but no longer move
             return
 
         # Initialize lists for different zones
         collision_zone_birds = []
         interaction_zone_birds = []
 
-        # Check all other birds
-        for other_bird_index, (other_bird, distance) in enumerate(zip(all_birds, distances[bird_index])):
+        # Check nearby birds, in index order
+        for other_bird_index, distance in zip(neighbor_indices, neighbor_distances):
+            other_bird = all_birds[other_bird_index]
             if other_bird_index == bird_index:
                 continue
-                
+
             # Skip dead birds for both collision and interaction
             if other_bird.is_dead:
                 continue
@@ -256,7 +212,7 @@ class Bird:
             self.handle_interactions(bird_index, interaction_zone_birds, all_birds=all_birds)
 
         # Update position
-        self.update_position(bird_index)
+        self.update_position(bird_index, speed_adjustment, escape_angle)
 
     def handle_collisions(self, bird_index, collision_zone_birds):
         for other_bird_index, distance in collision_zone_birds:
@@ -270,7 +226,7 @@ class Bird:
                 continue
             self.align_direction(bird_index, other_bird_index, other_bird, distance)
 
-    def update_position(self, bird_index):
+    def update_position(self, bird_index, speed_adjustment, escape_angle):
         """Update bird position considering inertia, borders, and restricted areas"""
         # Calculate desired direction
         desired_dx = self.dx
@@ -303,15 +259,18 @@ class Bird:
         self.dy = variables.inertia * self.last_dy + (1 - variables.inertia) * self.dy
         
         # Adjust speed with random variation
-        speed_adjustment = random.gauss(0, 0.35)  # 0.35 is standard deviation
         self.dx += speed_adjustment
         self.dy += speed_adjustment
 
-        # Border collision avoidance
-        self.handle_border_collision(bird_index)
-        
-        # Avoid restricted areas
-        self.handle_restricted_areas(bird_index)
+        if uses_distance_field():
+            # Walls and obstacles in one lookup
+            self.avoid_obstacles(bird_index, escape_angle)
+        else:
+            # Border collision avoidance
+            self.handle_border_collision(bird_index)
+
+            # Avoid restricted areas
+            self.handle_restricted_areas(bird_index, escape_angle)
         
         # Update last direction
         self.last_dx = self.dx
@@ -321,6 +280,20 @@ class Bird:
         variables.X[bird_index] += np.round(self.dx)
         variables.Y[bird_index] += np.round(self.dy)
 
+    def avoid_obstacles(self, bird_index, escape_angle):
+        """Handle walls and obstacles through the precomputed distance field"""
+        avoidance_radius = variables.collision_zone_radius * 2
+        distance, push_x, push_y = obstacle_field().sample(variables.X[bird_index], variables.Y[bird_index])
+        if distance >= avoidance_radius:
+            return
+        base_force = 1.0 if distance <= 0 else (1 - distance / avoidance_radius) * 0.5
+        force = base_force * max(1.0, np.hypot(self.dx, self.dy))
+        if push_x == 0 and push_y == 0:
+            # Two walls equally near, push in a random direction
+            push_x, push_y = math.cos(escape_angle), math.sin(escape_angle)
+        self.dx += force * push_x
+        self.dy += force * push_y
+
     def handle_border_collision(self,bird_index):
         """Handle collision with screen borders"""
         avoidance_radius = variables.collision_zone_radius * 2
@@ -355,7 +328,7 @@ class Bird:
             force = base_force * speed_multiplier
             self.dy -= force  # Push up
             
-    def handle_restricted_areas(self,bird_index):
+    def handle_restricted_areas(self, bird_index, escape_angle):
         """Handle collision with restricted areas"""
         for rect in variables.restricted_areas:
             rect_x, rect_y, rect_width, rect_height = rect
@@ -389,11 +362,10 @@ class Bird:
                     self.dx -= force * dx_to_rect / distance_to_rect
                     self.dy -= force * dy_to_rect / distance_to_rect
                 else:
-                    # If exactly on the border, apply random force
-                    angle = random.uniform(0, 2 * math.pi)
+                    # If exactly on the border, apply force in a random direction
                     force = base_force * speed_multiplier
-                    self.dx += force * math.cos(angle)
-                    self.dy += force * math.sin(angle)
+                    self.dx += force * math.cos(escape_angle)
+                    self.dy += force * math.sin(escape_angle)
 
     def check_predator_prey_collision(self, bird_index, other_bird_index, other_bird, distance):
         if distance > variables.collision_zone_radius:
@@ -1,14 +1,25 @@
 import numpy as np
+from contextlib import contextmanager
 import pygame
-import random
 import variables
 from Checkbox import Checkbox
 from Slider import Slider
 from Button import Button
-from predator import Predator
+from predator import Predator, draw_energy_bar
+from bird import draw_zone_arc
 from prey import Prey
 from PopulationChart import PopulationChart
-import math
+from FrameProfiler import FrameProfiler
+from flock import Flock, PREDATOR, PREY, NOISE_STD, FADED_ALPHA
+from neighbors import create_neighbor_search
+from checkpoint import save_checkpoint, load_checkpoint
+from recorder import TrajectoryRecorder
+from metrics import MetricsWriter
+from clusters import cluster_labels, cluster_colors
+from replay import Replay
+from assets import AssetManager
+from carcasses import CarcassLayer
+from sprites import bird_sprites, heading_bucket, alpha_bucket
 
 # Initialize Pygame
 pygame.init()
@@ -48,12 +59,25 @@ class Game:
         predator_ratio (float): Ratio of predators to total birds.
         screen_width (int): Width of the game window.
         screen_height (int): Height of the game window.
-        birds (list): List of bird objects in the simulation.
+        birds (list): Bird objects of the per-object engine, empty when the array engine runs the birds.
+        bird_ids (ndarray): Stable id of each bird object, for the per-object engine.
+        rng (Generator): Source of all the simulation's randomness, seeded from variables.seed.
+        step_count (int): Number of simulation steps taken.
+        recorder (TrajectoryRecorder): Streams every step to variables.record_path, or None.
+        metrics (MetricsWriter): Streams flock metrics to variables.metrics_path, or None.
+        replay (Replay): Plays back variables.replay_path instead of simulating, or None.
+        profiler (FrameProfiler): Per-phase frame timings.
+        clock (Clock): Caps and measures the frame rate of the main loop.
+        accumulator (float): Simulated seconds owed to the fixed-timestep scheduler.
+        previous_positions (tuple): Bird positions before the latest step, for render interpolation.
+        flock (Flock): Array engine driving the birds, or None for the per-object engine.
         particles (list): List of particle objects for visual effects.
-        wall_texture (Surface): Texture used for restricted areas.
-        background_surface (Surface): Surface for static background elements.
-        grid_cell_size (int): Size of each cell in the spatial partitioning grid.
-        spatial_grid (dict): Dictionary for spatial partitioning of birds.
+        carcasses (CarcassLayer): Dead birds that finished fading, baked into the background.
+        assets (AssetManager): Textures and the cached static background layer.
+        dirty_rects (list): Screen areas drawn over the background last frame, restored before the next one.
+        full_redraw (bool): Whether the next frame must redraw and push the whole screen.
+        ui_dirty (bool): Whether the control panel changed and must be redrawn.
+        spatial_grid (NeighborSearch): Neighbor-search backend for spatial partitioning of birds.
         batch_size (int): Number of birds processed in each batch for rendering.
     """
     def __init__(self):
@@ -63,69 +87,124 @@ class Game:
         self.screen_height = variables.screen_height
         self.birds = []
         pygame.init()
+        variables.init_display()
         pygame.display.set_caption("Predator-Prey Simulation")
 
-        self.create_birds()
+        self.rng = np.random.default_rng(variables.seed)
+        self.step_count = 0
+        self.carcasses = CarcassLayer()
+        spawn = self.create_birds()
+        self.flock = None
+        if variables.engine == 'vectorized':
+            self.flock = spawn  # Bird objects carry no breeding cooldowns, so the spawned flock is kept as it is
+            self.birds = []
+            variables.X = self.flock.x
+            variables.Y = self.flock.y
         self.create_ui_elements()
         chart_x = self.screen_width - variables.panel_width - 220  # 200 width + 20 margin
         chart_y = self.screen_height - 220  # 200 height + 20 margin
         self.population_chart = PopulationChart(chart_x, chart_y)
+        if variables.resume_from:
+            self.load_checkpoint(variables.resume_from)
+        self.replay = None
+        if variables.replay_path:
+            self.replay = Replay(variables.replay_path, variables.replay_world)
+            self.flock = self.replay.flock
+            self.birds = []
+            self.replay.show(self.population_chart)
+        self.recorder = None
+        if variables.record_path and self.replay is None:
+            flock = self.current_flock()
+            self.recorder = TrajectoryRecorder(variables.record_path, flock.kind, ids=flock.ids,
+                                               storage=variables.record_storage)
+        self.metrics = None
+        if variables.metrics_path and self.replay is None:
+            self.metrics = MetricsWriter(variables.metrics_path)
+        self.profiler = FrameProfiler(variables.BORDER_THICKNESS + 10, variables.BORDER_THICKNESS + 10,
+                                      csv_path=variables.profiler_csv)
+        self.clock = pygame.time.Clock()
+        self.accumulator = 0.0
+        self.previous_positions = (np.array(variables.X, dtype=float), np.array(variables.Y, dtype=float))
 
         # Initialize particle system
         self.particles = []
 
-        # Load wall texture for restricted areas
-        self.wall_texture = pygame.image.load('static/wall.jpg')
+        # Textures are loaded once, the static background is composed on first draw
+        self.assets = AssetManager(self.screen_width, self.screen_height)
+        self.arena_rect = pygame.Rect(0, 0, self.screen_width - variables.panel_width, self.screen_height)
 
-        # Initialize background surface for efficient updates
-        self.background_surface = pygame.Surface((self.screen_width, self.screen_height))
-        self.background_surface.fill(variables.get_current_theme()['background'])
-        self.draw_static_elements()
+        # Dirty-rectangle rendering state
+        self.background = None
+        self.dirty_rects = []
+        self.frame_rects = []
+        self.update_rects = []
+        self.full_redraw = True
+        self.ui_dirty = True
 
-        # Spatial partitioning grid setup
-        self.grid_cell_size = 50  # Size of each grid cell
-        self.spatial_grid = {}
+        # Spatial partitioning setup, grid cells track the interaction radii
+        self.spatial_grid = create_neighbor_search(variables.neighbor_search, self.search_radius())
 
         # Define batch size for processing
         self.batch_size = 10
 
     def create_birds(self):
-        num_predators = int(variables.num_birds * variables.predator_ratio)
-        num_prey = variables.num_birds - num_predators
+        # Predators then prey at random positions outside the restricted areas, drawn in one batch
+        spawn = Flock.random(variables.num_birds, variables.predator_ratio, seed=self.rng)
+        self.birds = self.birds_from_flock(spawn)
+        self.bird_ids = spawn.ids
+        variables.X = spawn.x
+        variables.Y = spawn.y
+        return spawn
+
+    def current_flock(self):
+        """The simulation state as a flock, built from the bird objects for the per-object engine"""
+        if self.flock is not None:
+            return self.flock
+        flock = Flock.from_birds(self.birds, variables.X, variables.Y, ids=self.bird_ids)
+        flock.rng = self.rng
+        return flock
+
+    def save_checkpoint(self, path):
+        """Write the simulation state, population history and parameters to path"""
+        save_checkpoint(path, self.current_flock(), self.step_count, self.population_chart.state())
+
+    def load_checkpoint(self, path):
+        """Replace the simulation state with a checkpoint, continuing under its parameters"""
+        flock, self.step_count, history = load_checkpoint(path)
+        self.rng = flock.rng
+        self.flock = flock if variables.engine == 'vectorized' else None
+        self.birds = self.birds_from_flock(flock) if self.flock is None else []
+        self.bird_ids = flock.ids
+        variables.X = flock.x
+        variables.Y = flock.y
+        if 'total' in history:
+            self.population_chart.restore(**history)
+        else:
+            self.population_chart.set_history(history['predators'], history['prey'])
+        variables.CLUSTERS = None  # Found again with the next step
+
+        # The sliders are copied into the parameters every frame, so they must follow them
+        for slider, name in zip(self.sliders, ('inertia', 'collision_zone_radius', 'interaction_zone_radius',
+                                               'shift_to_buddy', 'sim_speed')):
+            slider.set_value(getattr(variables, name))
+        self.spatial_grid = create_neighbor_search(variables.neighbor_search, self.search_radius())
+        self.previous_positions = (np.array(variables.X, dtype=float), np.array(variables.Y, dtype=float))
+        self.accumulator = 0.0
+        self.particles = []
+        self.carcasses.clear()
+        self.full_redraw = True
+        self.ui_dirty = True
 
-        # Initialize bird lists
-        self.birds = []
-        variables.X = []
-        variables.Y = []
-
-        # Create both predators and prey
-        for is_predator in [True, False]:
-            num_to_create = num_predators if is_predator else num_prey
-            for _ in range(num_to_create):
-                while True:
-                    x = random.randint(variables.BORDER_THICKNESS, 
-                                    self.screen_width - variables.panel_width - variables.BORDER_THICKNESS)
-                    y = random.randint(variables.BORDER_THICKNESS, 
-                                    self.screen_height - variables.BORDER_THICKNESS)
-
-                    # Check if the bird is inside any restricted area
-                    if not self.is_inside_restricted_areas(x, y):
-                        break
-
-                dx = random.uniform(-1, 1)
-                dy = random.uniform(-1, 1)
-                
-                # Create appropriate bird type
-                bird = Predator(dx, dy) if is_predator else Prey(dx, dy)
-                self.birds.append(bird)
-                variables.X.append(x)
-                variables.Y.append(y)
-        
-        variables.X = np.array(variables.X)
-        variables.Y = np.array(variables.Y)
+    def birds_from_flock(self, flock):
+        """Bird objects carrying the flock's per-bird state, speeds included as they are"""
+        birds = [Predator(0, 0) if kind == PREDATOR else Prey(0, 0) for kind in flock.kind]
+        flock.write_back(birds)
+        return birds
 
     def create_ui_elements(self):
         self.show_zones_checkbox = Checkbox(panel_x + 20, 300, 20, variables.show_zones, "Show Zones")
+        self.show_profiler_checkbox = Checkbox(panel_x + 20, 400, 20, variables.show_profiler, "Show Profiler")
+        self.color_clusters_checkbox = Checkbox(panel_x + 20, 450, 20, variables.color_clusters, "Color Flocks")
         self.theme_button = Button(panel_x + 20, 350, 160, 30, "Toggle Dark/Light Mode")
         self.sliders = [
             Slider(panel_x + 20, 50, variables.panel_width - 40, 20, 0.0, 1.0, variables.inertia, "Inertia"),
@@ -134,115 +213,156 @@ class Game:
             Slider(panel_x + 20, 150, variables.panel_width - 40, 20, 1, 100, variables.interaction_zone_radius,
                    "Interaction Radius"),
             Slider(panel_x + 20, 200, variables.panel_width - 40, 20, 0.0, 2.0, variables.shift_to_buddy, "Shift to Buddy"),
+            Slider(panel_x + 20, 250, variables.panel_width - 40, 20, 1.0, 50.0, variables.sim_speed, "Sim Speed"),
         ]
 
-    def is_inside_restricted_areas(self, x, y):
-        for rect in variables.restricted_areas:
-            rect_x, rect_y, rect_width, rect_height = rect
-            if (rect_x < x < rect_x + rect_width) and (rect_y < y < rect_y + rect_height):
-                return True
-        return False
-
     def run(self):
         running = True
         while running:
-            # Handle slider updates
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-
-                if event.type == pygame.MOUSEBUTTONDOWN or event.type == pygame.MOUSEMOTION:
-                    if pygame.mouse.get_pressed()[0]:  # Left mouse button held down
-                        mouse_pos = pygame.mouse.get_pos()
-                        self.show_zones_checkbox.update(mouse_pos)
-                        if self.theme_button.update(mouse_pos):
-                            # Update background surface when theme changes
-                            self.background_surface.fill(variables.get_current_theme()['background'])
-                            self.draw_static_elements()
-                        for slider in self.sliders:
-                            slider.update(mouse_pos)
-
-            # Update birds
-            self.update()
-            # Draw board and birds
-            self.draw()
-
-            # Draw control panel
-            theme = variables.get_current_theme()
-            pygame.draw.rect(variables.screen, theme['panel'], panel_rect)
+            # Real seconds since the last frame, with the frame rate capped
+            frame_seconds = self.clock.tick(variables.MAX_FPS) / 1000
 
-            # Draw sliders
-            for slider in self.sliders:
-                slider.draw(variables.screen)
-            # Draw checkbox
-            self.show_zones_checkbox.draw(variables.screen)
-            # Draw theme button
-            self.theme_button.draw(variables.screen)
+            with self.profiler.phase('events'):
+                running = self.handle_events()
 
             # Update global parameters from sliders
             variables.inertia = self.sliders[0].val
             variables.collision_zone_radius = self.sliders[1].val
             variables.interaction_zone_radius = self.sliders[2].val
             variables.shift_to_buddy = self.sliders[3].val
+            variables.sim_speed = self.sliders[4].val
             variables.show_zones = self.show_zones_checkbox.state
-
-            pygame.display.flip()
-
+            variables.show_profiler = self.show_profiler_checkbox.state
+            variables.color_clusters = self.color_clusters_checkbox.state
+
+            if self.replay is not None:
+                # Move through the recording instead of simulating
+                self.replay.advance(frame_seconds)
+                self.replay.show(self.population_chart)
+                self.draw()
+            else:
+                # Update birds, zero or more fixed steps
+                self.advance(frame_seconds)
+
+                # Draw board and birds between the last two states
+                step_seconds = 1 / variables.SIMULATION_HZ
+                with self.interpolated_positions(self.accumulator / step_seconds):
+                    self.draw()
+
+            with self.profiler.phase('flip'):
+                self.present()
+            self.profiler.end_frame()
+
+        self.profiler.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.metrics is not None:
+            self.metrics.close()
         pygame.quit()
 
+    def advance(self, frame_seconds):
+        """
+        Run as many fixed simulation steps as the elapsed time owes, sped up by
+        sim_speed. When the simulation cannot keep up, the backlog is dropped
+        rather than making every following frame slower.
+        """
+        step_seconds = 1 / variables.SIMULATION_HZ
+        max_steps = int(variables.MAX_SUBSTEPS * variables.sim_speed)
+        self.accumulator += frame_seconds * variables.sim_speed
+        steps = 0
+        while self.accumulator >= step_seconds and steps < max_steps:
+            self.previous_positions = (np.array(variables.X, dtype=float), np.array(variables.Y, dtype=float))
+            self.update()
+            self.accumulator -= step_seconds
+            steps += 1
+        if steps == max_steps:
+            self.accumulator = min(self.accumulator, step_seconds)
+        return steps
+
+    @contextmanager
+    def interpolated_positions(self, fraction):
+        """Temporarily place every bird between its previous and current position"""
+        current_positions = (variables.X, variables.Y)
+        previous_x, previous_y = self.previous_positions
+        fraction = min(max(fraction, 0.0), 1.0)
+        if len(previous_x) == len(variables.X):
+            variables.X = previous_x + (current_positions[0] - previous_x) * fraction
+            variables.Y = previous_y + (current_positions[1] - previous_y) * fraction
+        try:
+            yield
+        finally:
+            variables.X, variables.Y = current_positions
+
+    def handle_events(self):
+        """Process window and control panel events, returning False once the window is closed"""
+        running = True
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_h:
+                    self.population_chart.toggle_view()
+                elif self.replay is not None:
+                    self.replay.handle_key(event.key)
+                elif event.key == pygame.K_F5:
+                    self.save_checkpoint(variables.checkpoint_path)
+                elif event.key == pygame.K_F9:
+                    self.load_checkpoint(variables.checkpoint_path)
+
+            if event.type == pygame.MOUSEBUTTONDOWN or event.type == pygame.MOUSEMOTION:
+                if pygame.mouse.get_pressed()[0]:  # Left mouse button held down
+                    mouse_pos = pygame.mouse.get_pos()
+                    self.ui_dirty = True
+                    self.show_zones_checkbox.update(mouse_pos)
+                    self.show_profiler_checkbox.update(mouse_pos)
+                    self.color_clusters_checkbox.update(mouse_pos)
+                    self.theme_button.update(mouse_pos)  # The background layer follows the theme by itself
+                    for slider in self.sliders:
+                        slider.update(mouse_pos)
+        return running
+
+    def search_radius(self):
+        """Largest radius at which birds influence each other"""
+        return max(variables.collision_zone_radius, variables.interaction_zone_radius)
+
     def update_spatial_grid(self):
-        """Organize birds into a spatial grid for efficient interaction checks"""
-        # Clear previous grid
-        self.spatial_grid.clear()
-        
-        # Assign birds to grid cells
-        for bird_index, bird in enumerate(self.birds):
-            if bird.is_dead:
-                continue
-            
-            # Calculate grid cell coordinates
-            grid_x = int(variables.X[bird_index] // self.grid_cell_size)
-            grid_y = int(variables.Y[bird_index] // self.grid_cell_size)
-            
-            # Add bird to corresponding grid cell
-            grid_key = (grid_x, grid_y)
-            if grid_key not in self.spatial_grid:
-                self.spatial_grid[grid_key] = []
-            self.spatial_grid[grid_key].append(bird_index)
+        """Index living birds in the neighbor-search backend for the current interaction radii"""
+        self.spatial_grid.fit(self.search_radius())
+        alive = self.flock.alive if self.flock is not None else [not bird.is_dead for bird in self.birds]
+        self.spatial_grid.build(variables.X, variables.Y, np.asarray(alive, dtype=bool))
 
     def get_nearby_birds(self, bird_index):
-        """Retrieve birds in the same or neighboring grid cells"""
-        x = variables.X[bird_index]
-        y = variables.Y[bird_index]
-        
-        # Calculate current grid cell
-        grid_x = int(x // self.grid_cell_size)
-        grid_y = int(y // self.grid_cell_size)
-        
-        # Neighboring grid cells to check
-        nearby_cells = [
-            (grid_x, grid_y),
-            (grid_x-1, grid_y), (grid_x+1, grid_y),
-            (grid_x, grid_y-1), (grid_x, grid_y+1),
-            (grid_x-1, grid_y-1), (grid_x+1, grid_y-1),
-            (grid_x-1, grid_y+1), (grid_x+1, grid_y+1)
-        ]
-        
-        # Collect nearby bird indices
-        nearby_birds = []
-        for cell in nearby_cells:
-            if cell in self.spatial_grid:
-                nearby_birds.extend(self.spatial_grid[cell])
-        
-        return nearby_birds
+        """Retrieve birds within interaction range of a bird"""
+        return self.spatial_grid.get_nearby_birds(bird_index)
+
+    def neighbor_pairs(self):
+        """Build the sparse list of living birds within interaction range of each other"""
+        return self.spatial_grid.pairs(self.search_radius())
+
+    def update_flock(self, pairs):
+        """Advance the array engine by one step"""
+        self.flock.step(pairs)
+
+        # Births may have moved the arrays to a larger pool
+        variables.X = self.flock.x
+        variables.Y = self.flock.y
+        born = len(self.flock) - len(self.previous_positions[0])
+        if born > 0:
+            # Newborns are drawn where they were born, without interpolation
+            self.previous_positions = tuple(np.concatenate([previous, current[-born:]]) for previous, current
+                                            in zip(self.previous_positions, (self.flock.x, self.flock.y)))
+
+    def update_birds(self, pairs):
+        """Update every bird with the per-object Bird.update rules, returning the indices of the birds that died"""
+        # Random variation for every living bird, drawn in one batch per step. Dead birds
+        # draw nothing, so removing them from the list leaves the sequence unchanged
+        living = np.flatnonzero([not bird.is_dead for bird in self.birds])
+        speed_adjustments = np.zeros(len(self.birds))
+        escape_angles = np.zeros(len(self.birds))
+        speed_adjustments[living] = self.rng.normal(0, NOISE_STD, len(living))
+        escape_angles[living] = self.rng.uniform(0, 2 * np.pi, len(living))
 
-    def update(self):
-        # Update spatial grid before processing interactions
-        self.update_spatial_grid()
-        
-        # Prepare distance matrix for all birds
-        distances = np.full((len(self.birds), len(self.birds)), np.inf)
-        
         # Update birds using spatial partitioning and batch processing
         for start in range(0, len(self.birds), self.batch_size):
             end = min(start + self.batch_size, len(self.birds))
@@ -250,26 +370,51 @@ class Game:
                 bird = self.birds[bird_index]
                 if bird.is_dead:
                     continue
-                
-                # Get nearby birds
-                nearby_bird_indices = self.get_nearby_birds(bird_index)
-                
-                # Calculate distances for nearby birds
-                for nearby_idx in nearby_bird_indices:
-                    if nearby_idx != bird_index:
-                        dist = math.hypot(
-                            variables.X[bird_index] - variables.X[nearby_idx], 
-                            variables.Y[bird_index] - variables.Y[nearby_idx]
-                        )
-                        distances[bird_index, nearby_idx] = dist
-                
+
                 # Process interactions with nearby birds
-                bird.update(bird_index, self.birds, distances, [])
-        
+                nearby_bird_indices, nearby_distances = pairs.neighbors(bird_index)
+                bird.update(bird_index, self.birds, nearby_bird_indices, nearby_distances, [],
+                            speed_adjustments[bird_index], escape_angles[bird_index])
+        return living[[self.birds[bird_index].is_dead for bird_index in living]]
+
+    def update(self):
+        # Update spatial grid before processing interactions
+        with self.profiler.phase('grid'):
+            self.update_spatial_grid()
+        with self.profiler.phase('neighbors'):
+            pairs = self.neighbor_pairs()
+
+        self.step_count += 1
+        with self.profiler.phase('birds'):
+            if self.flock is not None:
+                self.update_flock(pairs)
+                num_predators = self.flock.count(PREDATOR)
+                num_prey = self.flock.count(PREY)
+            else:
+                died = self.update_birds(pairs)
+                num_predators = sum(1 for bird in self.birds if isinstance(bird, Predator) and not bird.is_dead)
+                num_prey = sum(1 for bird in self.birds if isinstance(bird, Prey) and not bird.is_dead)
+            measure = self.metrics is not None and self.step_count % variables.metrics_every == 0
+            labels = None
+            if self.recorder is not None or measure or variables.color_clusters:
+                flock = self.current_flock()
+                if self.flock is None:
+                    # Bird objects are never born, and only die by being caught or by starving
+                    flock.killed = died[flock.kind[died] == PREY]
+                    flock.starved = died[flock.kind[died] == PREDATOR]
+                if measure or variables.color_clusters:
+                    labels = cluster_labels(flock, pairs, variables.interaction_zone_radius)
+                if self.recorder is not None:
+                    self.recorder.record(flock, self.step_count)
+                if measure:
+                    self.metrics.record(flock, self.step_count, pairs, labels)
+            variables.CLUSTERS = labels if variables.color_clusters else None
+            if variables.compact_every and self.step_count % variables.compact_every == 0:
+                self.compact_dead_birds()
+
         # Update population statistics
-        num_predators = sum(1 for bird in self.birds if isinstance(bird, Predator) and not bird.is_dead)
-        num_prey = sum(1 for bird in self.birds if isinstance(bird, Prey) and not bird.is_dead)
-        self.population_chart.update(num_predators, num_prey)
+        with self.profiler.phase('chart'):
+            self.population_chart.update(num_predators, num_prey)
         
         # Update particles in batches
         for start in range(0, len(self.particles), self.batch_size):
@@ -279,77 +424,161 @@ class Game:
                 if particle.is_dead():
                     self.particles.remove(particle)
 
-    def draw(self):
-        # Load and scale background texture
-        background_texture = pygame.image.load('static/background.jpg')
-        background_texture = pygame.transform.scale(background_texture, (self.screen_width, self.screen_height))
-        variables.screen.blit(background_texture, (0, 0))
+    def compact_dead_birds(self):
+        """
+        Move dead birds that have finished fading out of the simulation and onto the
+        carcass layer, so they cost nothing per step or per frame from then on.
+        """
+        if self.flock is not None:
+            settled = self.flock.settled()
+            if not settled.any():
+                return
+            removed = self.flock.compact(settled)
+            variables.X = self.flock.x
+            variables.Y = self.flock.y
+        else:
+            settled = np.array([bird.is_dead and getattr(bird, 'fade_alpha', 255) <= FADED_ALPHA
+                                for bird in self.birds], dtype=bool)
+            if not settled.any():
+                return
+            removed = self.current_flock().compact(settled)
+            self.birds = [bird for bird, gone in zip(self.birds, settled) if not gone]
+            self.bird_ids = self.bird_ids[~settled]
+            variables.X = np.asarray(variables.X)[~settled]
+            variables.Y = np.asarray(variables.Y)[~settled]
+        self.previous_positions = tuple(positions[~settled] for positions in self.previous_positions)
+        if variables.CLUSTERS is not None:
+            variables.CLUSTERS = variables.CLUSTERS[~settled]
+
+        # The areas stamped are restored from the layer and pushed with the next frame
+        self.dirty_rects += self.carcasses.add(removed.x, removed.y, removed.dx, removed.dy, removed.kind)
 
-        # Render birds in batches
-        for start in range(0, len(self.birds), self.batch_size):
-            end = min(start + self.batch_size, len(self.birds))
-            for bird_index in range(start, end):
-                bird = self.birds[bird_index]
-                bird.draw(bird_index, variables.screen)
-
-        # Render particles in batches
-        for start in range(0, len(self.particles), self.batch_size):
-            end = min(start + self.batch_size, len(self.particles))
-            for particle in self.particles[start:end]:
-                particle.draw(variables.screen)
-
-        # Draw UI elements
-        pygame.draw.rect(variables.screen, variables.get_current_theme()['panel'],
-                        (self.screen_width - variables.panel_width, 0,
-                         variables.panel_width, self.screen_height))
-        for slider in self.sliders:
-            slider.draw(variables.screen)
-        self.show_zones_checkbox.draw(variables.screen)
-        self.theme_button.draw(variables.screen)
-        self.population_chart.draw(variables.screen)
-
-        # Draw interaction and collision zones if enabled
+    def draw(self):
+        screen = variables.screen
+        with self.profiler.phase('background'):
+            # Background, borders, restricted areas and carcasses in one cached layer
+            background = self.carcasses.layer(self.assets.background_layer())
+            if background is not self.background or not variables.dirty_rect_rendering:
+                self.full_redraw = True
+            self.background = background
+            if self.full_redraw:
+                screen.blit(background, (0, 0))
+            else:
+                # Only restore what was drawn over the background last frame
+                for rect in self.dirty_rects:
+                    screen.blit(background, rect, rect)
+
+        rects = []
+        with self.profiler.phase('bird_draw'):
+            screen.set_clip(self.arena_rect)
+            if self.flock is not None:
+                rects += self.draw_flock()
+            else:
+                # Render birds in batches
+                for start in range(0, len(self.birds), self.batch_size):
+                    end = min(start + self.batch_size, len(self.birds))
+                    for bird_index in range(start, end):
+                        bird = self.birds[bird_index]
+                        rects.append(bird.draw(bird_index, screen))
+
+            # Render particles in batches
+            for start in range(0, len(self.particles), self.batch_size):
+                end = min(start + self.batch_size, len(self.particles))
+                for particle in self.particles[start:end]:
+                    rects.append(particle.draw(screen))
+            screen.set_clip(None)
+
+        with self.profiler.phase('ui'):
+            # Draw UI elements, the panel only when it changed
+            panel_rects = []
+            if self.full_redraw or self.ui_dirty:
+                panel_rects.append(pygame.draw.rect(screen, variables.get_current_theme()['panel'],
+                                                    (self.screen_width - variables.panel_width, 0,
+                                                     variables.panel_width, self.screen_height)))
+                for slider in self.sliders:
+                    slider.draw(screen)
+                self.show_zones_checkbox.draw(screen)
+                self.show_profiler_checkbox.draw(screen)
+                self.color_clusters_checkbox.draw(screen)
+                self.theme_button.draw(screen)
+            rects.append(self.population_chart.draw(screen))
+            if variables.show_profiler:
+                rects.append(self.profiler.draw(screen, self.clock.get_fps()))
+            if self.replay is not None:
+                rects.append(self.replay.draw(screen))
+
+        self.frame_rects = rects
+        self.update_rects = panel_rects
+
+    def present(self):
+        """Push the frame to the display, only the changed areas in dirty-rectangle mode"""
+        if self.full_redraw:
+            pygame.display.flip()
+        else:
+            changed = self.dirty_rects + self.frame_rects
+            if len(changed) > variables.MAX_DIRTY_RECTS:
+                changed = [self.arena_rect]
+            pygame.display.update(changed + self.update_rects)
+        self.dirty_rects = self.frame_rects
+        self.full_redraw = False
+        self.ui_dirty = False
+
+    def draw_flock(self):
+        """Draw the array engine's birds as batches of pre-rotated sprites, returning the areas covered"""
+        flock = self.flock
+        x = variables.X  # Positions may be interpolated, so they are not read from the flock
+        y = variables.Y
+        theme = variables.get_current_theme()
+        sizes = {PREY: variables.BIRD_SIZE, PREDATOR: variables.BIRD_SIZE * variables.PREDATOR_SIZE_RATIO}
+        colors = {PREY: variables.PREY_COLOR, PREDATOR: variables.PREDATOR_COLOR}
+        headings = heading_bucket(flock.dx, flock.dy)
+        fades = alpha_bucket(flock.fade_alpha)
+        speeds = np.hypot(flock.dx, flock.dy)
+
+        blits = []
+        for kind in (PREDATOR, PREY):
+            size = sizes[kind]
+            of_kind = flock.kind == kind
+
+            # Dead birds, one sprite table per fade level
+            dead = of_kind & ~flock.alive
+            for alpha in np.unique(fades[dead]):
+                index = np.flatnonzero(dead & (fades == alpha))
+                blits += self.sprite_blits(bird_sprites.rotations(theme['dead_prey'], size, False, alpha),
+                                           index, headings)
+
+            # Living birds grouped by color, prey by their flock when flocks are colored
+            alive = np.flatnonzero(of_kind & flock.alive)
+            groups = [(colors[kind], alive)]
+            if kind == PREY and variables.CLUSTERS is not None:
+                shades = cluster_colors(variables.CLUSTERS[alive], variables.CLUSTER_COLORS)
+                groups = [(variables.CLUSTER_COLORS[shade], alive[shades == shade]) for shade in np.unique(shades)]
+
+            # Motion blur behind fast birds, then the living birds themselves
+            for color, members in groups:
+                for index in members[speeds[members] > 2]:
+                    blits.append((bird_sprites.blur(color, size, flock.dx[index], flock.dy[index]),
+                                  (x[index] - size + flock.dx[index], y[index] - size + flock.dy[index])))
+            for color, members in groups:
+                blits += self.sprite_blits(bird_sprites.rotations(color, size, True), members, headings)
+        rects = variables.screen.blits(blits, doreturn=variables.dirty_rect_rendering) or []
+
+        # Energy bars and zones are drawn on top of the sprites, replays have no energy to show
+        for index in np.flatnonzero(flock.alive & (flock.kind == PREDATOR) & ~np.isnan(flock.energy)):
+            rects.append(draw_energy_bar(x[index], y[index], flock.energy[index]))
         if variables.show_zones:
-            for bird in self.birds:
-                bird.draw_collision_zone()
-                bird.draw_interaction_zone()
-
-        # Ensure restricted areas are visible using wall texture
-        wall_texture = pygame.image.load('static/wall.jpg')
-        for rect in variables.restricted_areas:
-            rect_x, rect_y, rect_width, rect_height = rect
-            area_texture = pygame.transform.scale(wall_texture, (rect_width, rect_height))
-            variables.screen.blit(area_texture, (rect_x, rect_y))
-
-    def draw_static_elements(self):
-        # Draw wall texture for areas outside the main border
-        outside_border_rects = [
-            # Left side outside border
-            (0, 0, variables.BORDER_THICKNESS, self.screen_height),
-            # Right side outside border (accounting for panel)
-            (self.screen_width - variables.panel_width, 0, variables.BORDER_THICKNESS, self.screen_height),
-            # Top outside border
-            (0, 0, self.screen_width, variables.BORDER_THICKNESS),
-            # Bottom outside border
-            (0, self.screen_height - variables.BORDER_THICKNESS, self.screen_width, variables.BORDER_THICKNESS)
-        ]
-
-        for rect_x, rect_y, rect_width, rect_height in outside_border_rects:
-            area_texture = pygame.transform.scale(self.wall_texture, (rect_width, rect_height))
-            self.background_surface.blit(area_texture, (rect_x, rect_y))
-
-        # Draw solid borders on the background surface
-        pygame.draw.rect(self.background_surface, variables.get_current_theme()['border'],
-                         (variables.BORDER_THICKNESS, variables.BORDER_THICKNESS,
-                          self.screen_width - variables.panel_width - 2 * variables.BORDER_THICKNESS,
-                          self.screen_height - 2 * variables.BORDER_THICKNESS),
-                         2)  # Border with thickness of 2
-
-        # Draw all restricted areas with texture
-        for rect in variables.restricted_areas:
-            rect_x, rect_y, rect_width, rect_height = rect
-            area_texture = pygame.transform.scale(self.wall_texture, (rect_width, rect_height))
-            self.background_surface.blit(area_texture, (rect_x, rect_y))
+            for index in np.flatnonzero(flock.alive):
+                for radius in (variables.collision_zone_radius, variables.interaction_zone_radius):
+                    rects.append(draw_zone_arc(x[index], y[index], flock.dx[index], flock.dy[index], radius))
+        return rects
+
+    def sprite_blits(self, table, index, headings):
+        """(sprite, position) blit pairs for the given birds from one sprite table"""
+        surfaces, offset_x, offset_y = table
+        bucket = headings[index]
+        positions = zip((variables.X[index] - offset_x[bucket]).tolist(),
+                        (variables.Y[index] - offset_y[bucket]).tolist())
+        return list(zip(surfaces[bucket], positions))
 
     def update_particles(self):
         # Efficiently update particles
@@ -386,7 +615,7 @@ class Particle:
 
     def draw(self, screen):
         # Draw the particle on the screen
-        pygame.draw.circle(screen, (255, 255, 255),
+        return pygame.draw.circle(screen, (255, 255, 255),
                            (int(self.position[0]), int(self.position[1])), 3)
 
 
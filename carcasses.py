@@ -0,0 +1,86 @@
+import numpy as np
+import variables
+from flock import PREDATOR, PREY, FADED_ALPHA
+from sprites import bird_sprites, heading_bucket, alpha_bucket
+
+
+class CarcassLayer:
+    """
+    The CarcassLayer class keeps dead birds that have finished fading as part of
+    the picture instead of the simulation. Each carcass is stamped once onto a
+    copy of the static background, which the game then draws and restores from
+    in place of the background itself. When the background changes (theme or
+    obstacles), the copy is rebuilt and every carcass stamped again.
+
+    Attributes:
+        x (ndarray): Horizontal positions of the carcasses.
+        y (ndarray): Vertical positions of the carcasses.
+        heading (ndarray): Heading bucket of each carcass.
+        kind (ndarray): Species of each carcass.
+        surface (Surface): Background with every carcass stamped on it, or None while there are none.
+
+    Methods:
+        add(x, y, dx, dy, kind): Stamps new carcasses, returning the screen areas that changed.
+        layer(background): Returns the background to draw, with the carcasses on it.
+        clear(): Forgets every carcass.
+    """
+    def __init__(self):
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.heading = np.zeros(0, dtype=np.int64)
+        self.kind = np.zeros(0, dtype=np.int8)
+        self.background = None
+        self.surface = None
+
+    def __len__(self):
+        return len(self.x)
+
+    def clear(self):
+        self.__init__()
+
+    def add(self, x, y, dx, dy, kind):
+        """
+        Keep new carcasses and stamp them onto the layer. Returns the screen areas
+        that changed, which is none when the layer was (re)built from scratch.
+        """
+        if len(x) == 0:
+            return []
+        start = len(self)
+        self.x = np.concatenate([self.x, x])
+        self.y = np.concatenate([self.y, y])
+        self.heading = np.concatenate([self.heading, heading_bucket(dx, dy)])
+        self.kind = np.concatenate([self.kind, kind])
+        if self.background is None:
+            return []  # Stamped once the background is known
+        if self.surface is None:
+            self.rebuild()
+            return []
+        return self.stamp(np.arange(start, len(self)))
+
+    def layer(self, background):
+        """The background with every carcass on it, a new surface whenever the background has changed"""
+        if background is not self.background:
+            self.background = background
+            self.surface = None
+            if len(self):
+                self.rebuild()
+        return background if self.surface is None else self.surface
+
+    def rebuild(self):
+        self.surface = self.background.copy()
+        # Like live birds, carcasses are cut off at the edge of the arena
+        self.surface.set_clip((0, 0, variables.screen_width - variables.panel_width, variables.screen_height))
+        self.stamp(np.arange(len(self)))
+
+    def stamp(self, index):
+        """Blit the given carcasses onto the layer, returning the areas covered"""
+        color = variables.get_current_theme()['dead_prey']
+        sizes = {PREY: variables.BIRD_SIZE, PREDATOR: variables.BIRD_SIZE * variables.PREDATOR_SIZE_RATIO}
+        blits = []
+        for kind, size in sizes.items():
+            of_kind = index[self.kind[index] == kind]
+            surfaces, offset_x, offset_y = bird_sprites.rotations(color, size, False, alpha_bucket(FADED_ALPHA))
+            bucket = self.heading[of_kind]
+            blits += zip(surfaces[bucket], zip((self.x[of_kind] - offset_x[bucket]).tolist(),
+                                               (self.y[of_kind] - offset_y[bucket]).tolist()))
+        return self.surface.blits(blits, doreturn=True)
@@ -0,0 +1,130 @@
+"""
+Binary checkpoints of the whole simulation state. A checkpoint is a single .npz
+file holding the flock arrays, the random generator state, the population
+history, the step count and the simulation parameters, so a run can resume
+bit-exactly or be forked into several experiments.
+"""
+import json
+import numpy as np
+import variables
+from flock import Flock
+
+# Version 2 added breeding cooldowns and the whole-run population buckets, version 3 per-world prey capacities
+CHECKPOINT_VERSION = 3
+
+# Per-bird arrays stored for every checkpoint
+FLOCK_FIELDS = ('x', 'y', 'dx', 'dy', 'last_dx', 'last_dy', 'kind', 'alive', 'fade_alpha', 'energy',
+                'cycle_counter', 'breeding_cooldown', 'world', 'ids')
+
+# Per-bird arrays a version 1 checkpoint may lack, and their values for a given number of birds
+VERSION_1_DEFAULTS = {
+    'ids': lambda count: np.arange(count),  # Saved before stable ids, with every bird in id order
+    'breeding_cooldown': lambda count: np.zeros(count, dtype=np.int64),  # Saved before cooldowns existed
+}
+
+# Settings from variables.py that affect how the simulation evolves
+PARAMETERS = (
+    'inertia', 'collision_zone_radius', 'interaction_zone_radius', 'shift_to_buddy',
+    'num_birds', 'predator_ratio', 'seed', 'restricted_areas', 'restricted_polygons', 'obstacle_avoidance',
+    'sim_speed',
+    'engine', 'neighbor_search', 'interaction_kernel',
+    'PREDATOR_SPEED_RATIO', 'PREDATOR_INITIAL_ENERGY', 'PREDATOR_ENERGY_LOSS_INTERVAL',
+    'PREDATOR_ENERGY_LOSS_AMOUNT', 'PREDATOR_SPEED_ENERGY_COST', 'PREDATOR_BASE_SPEED',
+    'PREDATOR_BREEDING_ENERGY', 'PREDATOR_BREEDING_COST', 'PREDATOR_BREEDING_COOLDOWN', 'PREY_BIRTH_RATE',
+    'PREY_CAPACITY_RATIO',
+    'screen_width', 'screen_height', 'panel_width', 'BORDER_THICKNESS',
+)
+
+
+def save_checkpoint(path, flock, step_count=0, population_history=None):
+    """
+    Write the flock, its random generator, the step count and the current
+    parameters to path. population_history is an optional dict of the recent
+    counts and whole-run buckets, as returned by PopulationChart.state().
+    """
+    history = population_history or {}
+    state = {field: getattr(flock, field) for field in FLOCK_FIELDS}
+    np.savez_compressed(
+        path,
+        version=CHECKPOINT_VERSION,
+        step_count=step_count,
+        next_id=flock.next_id,  # Ids of removed birds are never given out again
+        num_worlds=flock.num_worlds,  # Worlds whose birds were all removed no longer show up in world
+        prey_capacity=flock.prey_capacity,  # Set by the prey each world started with, not the prey it has now
+        predator_history=np.asarray(history.get('predators', []), dtype=np.int64),
+        prey_history=np.asarray(history.get('prey', []), dtype=np.int64),
+        history_total=history.get('total', 0),
+        history_bucket_min=np.asarray(history.get('bucket_min', np.zeros((0, 2))), dtype=np.int64),
+        history_bucket_max=np.asarray(history.get('bucket_max', np.zeros((0, 2))), dtype=np.int64),
+        history_bucket_size=history.get('bucket_size', 1),
+        # Nested and arbitrary-precision values, kept as JSON text
+        rng_state=json.dumps(flock.rng.bit_generator.state),
+        parameters=json.dumps({name: getattr(variables, name) for name in PARAMETERS}),
+        **state)
+
+
+def load_checkpoint(path, apply_parameters=True):
+    """
+    Read a checkpoint written by save_checkpoint. Returns the flock, the step count
+    and the population history as a dict of PopulationChart.restore() arguments,
+    holding only the recent predators and prey for checkpoints saved without the
+    whole-run buckets. Unless apply_parameters is False, the saved parameters are
+    written back to variables so the run continues under the same settings.
+    """
+    with np.load(path) as data:
+        version = int(data['version'])
+        if not 1 <= version <= CHECKPOINT_VERSION:
+            raise ValueError(f"{path} is a version {version} checkpoint, "
+                             f"expected version {CHECKPOINT_VERSION} or older")
+        state = {}
+        for field in FLOCK_FIELDS:
+            if field in data:
+                state[field] = data[field]
+            elif version == 1 and field in VERSION_1_DEFAULTS:
+                state[field] = VERSION_1_DEFAULTS[field](len(data['x']))
+            else:
+                raise ValueError(f"{path} has no {field} array, which version {version} checkpoints must hold")
+        rng_state = json.loads(str(data['rng_state']))
+        parameters = json.loads(str(data['parameters']))
+        step_count = int(data['step_count'])
+        num_worlds = int(data['num_worlds']) if 'num_worlds' in data else None
+        next_id = int(data['next_id']) if 'next_id' in data else None
+        if 'prey_capacity' in data:
+            prey_capacity = data['prey_capacity']
+        elif version < 3:
+            # Older versions had one PREY_CAPACITY for every world, saved with the parameters once births existed
+            prey_capacity = parameters.get('PREY_CAPACITY')
+        else:
+            raise ValueError(f"{path} has no prey_capacity array, which version {version} checkpoints must hold")
+        population_history = {'predators': data['predator_history'], 'prey': data['prey_history']}
+        if 'history_total' in data:
+            population_history.update(total=int(data['history_total']), bucket_min=data['history_bucket_min'],
+                                      bucket_max=data['history_bucket_max'],
+                                      bucket_size=int(data['history_bucket_size']))
+
+    if apply_parameters:
+        for name, value in parameters.items():
+            # JSON turns the obstacle tuples into lists
+            if name == 'restricted_areas':
+                value = [tuple(rect) for rect in value]
+            elif name == 'restricted_polygons':
+                value = [[tuple(point) for point in points] for points in value]
+            setattr(variables, name, value)
+
+    flock = Flock(state['x'], state['y'], state['dx'], state['dy'], state['kind'], world=state['world'],
+                  ids=state['ids'])
+    for field in FLOCK_FIELDS:
+        setattr(flock, field, state[field])
+    if num_worlds is not None:
+        flock.num_worlds = num_worlds
+    if next_id is not None:
+        flock.next_id = next_id
+    if prey_capacity is None:
+        # Saved before births existed: capped by the prey the checkpoint holds, and none in worlds left empty
+        prey_capacity = np.zeros(flock.num_worlds)
+        prey_capacity[:len(flock.prey_capacity)] = flock.prey_capacity
+    flock.prey_capacity = np.broadcast_to(np.asarray(prey_capacity, dtype=float), flock.num_worlds).copy()
+    bit_generator = getattr(np.random, rng_state['bit_generator'])()
+    bit_generator.state = rng_state
+    flock.rng = np.random.Generator(bit_generator)
+    return flock, step_count, population_history
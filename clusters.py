@@ -0,0 +1,92 @@
+"""
+Flock detection. Two living birds of the same world closer than the interaction
+radius are neighbors, and a flock is a connected group of neighbors: a
+connected component of the neighbor graph. The graph's edges are the pairs the
+step's neighbor search already produced, so finding the flocks is a single
+linear pass instead of a comparison of every bird with every other. The flocks
+are found from scratch every step; nothing is carried over from the last one.
+"""
+import numpy as np
+
+try:
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+except ImportError:  # SciPy is optional, components then come from the NumPy union-find
+    connected_components = None
+
+CLUSTER_SIZE_BINS = (1, 2, 4, 8, 16, 32, 64)  # Smallest flock size of each histogram bin, the last bin is open-ended
+
+
+def union_find(i, j, count):
+    """
+    Component of each of count nodes linked by the edges (i, j), as the smallest
+    node index in it. Every round hooks the larger root of each edge onto the
+    smaller one, then flattens the trees, until no edge joins two trees.
+    """
+    parent = np.arange(count)
+    while True:
+        root_i, root_j = parent[i], parent[j]
+        joining = root_i != root_j
+        if not joining.any():
+            return parent
+        root_i, root_j = root_i[joining], root_j[joining]
+        np.minimum.at(parent, np.maximum(root_i, root_j), np.minimum(root_i, root_j))
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+
+def components(i, j, count):
+    """Component number of each node, from SciPy's connected components when available"""
+    if connected_components is None:
+        return union_find(i, j, count)
+    graph = coo_matrix((np.ones(len(i), dtype=np.int8), (i, j)), shape=(count, count)).tocsr()
+    return connected_components(graph, directed=False)[1]
+
+
+def cluster_labels(flock, pairs, radius):
+    """
+    Flock of every bird, labelled by the smallest id among its members. Although
+    the flocks are recomputed every step, a flock keeps its label as long as
+    that bird stays in it, so its color does not change when drawn. Dead birds
+    are labelled -1, and birds born after the search are flocks of their own.
+    """
+    alive = flock.alive
+    link = (alive[pairs.i] & alive[pairs.j]) & (pairs.distance < radius)
+    link &= flock.world[pairs.i] == flock.world[pairs.j]
+    component = components(pairs.i[link], pairs.j[link], len(flock))
+    smallest = np.full(len(flock), np.iinfo(np.int64).max)
+    np.minimum.at(smallest, component, flock.ids)
+    return np.where(alive, smallest[component], -1)
+
+
+def cluster_stats(labels, world, num_worlds):
+    """
+    Number of flocks, largest and mean flock size, number of lone birds and the
+    flock size histogram over CLUSTER_SIZE_BINS in every world.
+    """
+    member = labels >= 0
+    _, first, sizes = np.unique(labels[member], return_index=True, return_counts=True)
+    cluster_world = world[member][first]
+    count = np.bincount(cluster_world, minlength=num_worlds)
+    largest = np.zeros(num_worlds, dtype=np.int64)
+    np.maximum.at(largest, cluster_world, sizes)
+    bins = len(CLUSTER_SIZE_BINS)
+    size_bin = np.searchsorted(CLUSTER_SIZE_BINS, sizes, side='right') - 1
+    histogram = np.bincount(cluster_world * bins + size_bin, minlength=num_worlds * bins).reshape(num_worlds, bins)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_size = np.bincount(cluster_world, weights=sizes, minlength=num_worlds) / count
+    return {
+        'clusters': count,
+        'largest_cluster': largest,
+        'mean_cluster_size': mean_size,
+        'lone_birds': np.bincount(cluster_world[sizes == 1], minlength=num_worlds),
+        'size_histogram': histogram,
+    }
+
+
+def cluster_colors(labels, palette):
+    """Index into palette for every label, spread so neighboring labels get different colors"""
+    return (labels * 2654435761 % (2 ** 32)) % len(palette)
@@ -0,0 +1,139 @@
+"""
+Signed distance field of the arena walls and obstacles. Distances to the
+borders, the restricted rectangles and any polygon obstacles are rasterized
+once, together with their gradient, so obstacle avoidance for every bird is an
+array lookup whose cost does not depend on the number of obstacles.
+"""
+import numpy as np
+import variables
+
+CELL_SIZE = 2  # Pixels per field cell
+MAX_AVOIDANCE_RADIUS = 200  # Largest avoidance radius the field is accurate for, twice the slider's maximum
+
+
+def rect_distance(rect, x, y):
+    """Signed distance from points to an axis-aligned rectangle, negative inside"""
+    rect_x, rect_y, rect_width, rect_height = rect
+    offset_x = np.abs(x - (rect_x + rect_width / 2)) - rect_width / 2
+    offset_y = np.abs(y - (rect_y + rect_height / 2)) - rect_height / 2
+    outside = np.hypot(np.maximum(offset_x, 0), np.maximum(offset_y, 0))
+    return outside + np.minimum(np.maximum(offset_x, offset_y), 0)
+
+
+def polygon_contains(points, x, y):
+    """Even-odd test of whether points lie inside a polygon given as a list of (x, y) vertices"""
+    vertices = np.asarray(points, dtype=float)
+    inside = np.zeros(np.shape(x), dtype=bool)
+    for (x1, y1), (x2, y2) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        crosses = (y1 > y) != (y2 > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing_x = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses & (x < crossing_x)
+    return inside
+
+
+def polygon_distance(points, x, y):
+    """Signed distance from points to a polygon, negative inside"""
+    vertices = np.asarray(points, dtype=float)
+    distance = np.full(np.shape(x), np.inf)
+    for (x1, y1), (x2, y2) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        edge_x, edge_y = x2 - x1, y2 - y1
+        length_squared = max(edge_x * edge_x + edge_y * edge_y, 1e-12)
+        along = np.clip(((x - x1) * edge_x + (y - y1) * edge_y) / length_squared, 0, 1)
+        distance = np.minimum(distance, np.hypot(x - (x1 + along * edge_x), y - (y1 + along * edge_y)))
+    return np.where(polygon_contains(vertices, x, y), -distance, distance)
+
+
+def inside_obstacles(x, y):
+    """True where a position lies strictly inside any restricted area or polygon obstacle"""
+    inside = np.zeros(len(x), dtype=bool)
+    for rect_x, rect_y, rect_width, rect_height in variables.restricted_areas:
+        inside |= (rect_x < x) & (x < rect_x + rect_width) & (rect_y < y) & (y < rect_y + rect_height)
+    for points in variables.restricted_polygons:
+        inside |= polygon_contains(points, x, y)
+    return inside
+
+
+class DistanceField:
+    """
+    The DistanceField class holds the signed distance from every cell of the
+    arena to the nearest wall or obstacle (negative inside them) and the unit
+    gradient pointing away from it. Distances are exact at cell centers and
+    capped at max_distance, beyond which nothing pushes the birds.
+
+    Attributes:
+        cell_size (float): Pixels per cell.
+        max_distance (float): Distance the field is accurate up to.
+        distance (ndarray): Signed distances, indexed [row, column].
+        gradient_x (ndarray): Horizontal component of the direction away from the nearest wall.
+        gradient_y (ndarray): Vertical component of the direction away from the nearest wall.
+
+    Methods:
+        sample(x, y): Returns distance and gradient at the given positions.
+    """
+    def __init__(self, width, height, border, rects=(), polygons=(), cell_size=CELL_SIZE,
+                 max_distance=MAX_AVOIDANCE_RADIUS):
+        self.cell_size = cell_size
+        self.max_distance = max_distance
+        self.columns = int(np.ceil(width / cell_size)) + 1
+        self.rows = int(np.ceil(height / cell_size)) + 1
+        center_x = np.arange(self.columns) * cell_size
+        center_y = np.arange(self.rows) * cell_size
+
+        # The arena walls: the distance to the nearest border line, negative past it
+        wall_x = np.minimum(center_x - border, width - border - center_x)
+        wall_y = np.minimum(center_y - border, height - border - center_y)
+        distance = np.minimum(wall_x[np.newaxis, :], wall_y[:, np.newaxis])
+        distance = np.minimum(distance, max_distance)
+
+        # Each obstacle only changes the cells within max_distance of its bounding box
+        shapes = [(rect_distance, rect, (rect[0], rect[1], rect[0] + rect[2], rect[1] + rect[3]))
+                  for rect in rects]
+        for points in polygons:
+            vertices = np.asarray(points, dtype=float)
+            shapes.append((polygon_distance, vertices, (*vertices.min(axis=0), *vertices.max(axis=0))))
+        for shape_distance, shape, (left, top, right, bottom) in shapes:
+            columns = self.cell_range(left, right, self.columns)
+            rows = self.cell_range(top, bottom, self.rows)
+            window_x, window_y = np.meshgrid(center_x[columns], center_y[rows])
+            distance[rows, columns] = np.minimum(distance[rows, columns], shape_distance(shape, window_x, window_y))
+        self.distance = distance.astype(np.float32)
+
+        gradient_y, gradient_x = np.gradient(distance, cell_size)
+        norm = np.hypot(gradient_x, gradient_y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Zero on ridges where two walls are equally near, callers pick a direction there
+            self.gradient_x = np.where(norm > 1e-6, gradient_x / norm, 0.0).astype(np.float32)
+            self.gradient_y = np.where(norm > 1e-6, gradient_y / norm, 0.0).astype(np.float32)
+
+    def cell_range(self, low, high, count):
+        first = max(int(np.floor((low - self.max_distance) / self.cell_size)), 0)
+        last = min(int(np.ceil((high + self.max_distance) / self.cell_size)) + 1, count)
+        return slice(first, last)
+
+    def sample(self, x, y):
+        """Distance and unit gradient at the nearest cell to each position, positions off the field are clamped"""
+        column = np.clip(np.rint(np.asarray(x) / self.cell_size).astype(np.int64), 0, self.columns - 1)
+        row = np.clip(np.rint(np.asarray(y) / self.cell_size).astype(np.int64), 0, self.rows - 1)
+        return self.distance[row, column], self.gradient_x[row, column], self.gradient_y[row, column]
+
+
+_field = None
+_field_key = None
+
+
+def obstacle_field():
+    """The field for the current arena and obstacles, rebuilt only when they change"""
+    global _field, _field_key
+    key = (variables.screen_width - variables.panel_width, variables.screen_height, variables.BORDER_THICKNESS,
+           tuple(tuple(rect) for rect in variables.restricted_areas),
+           tuple(tuple(map(tuple, points)) for points in variables.restricted_polygons))
+    if key != _field_key:
+        _field = DistanceField(key[0], key[1], key[2], key[3], key[4])
+        _field_key = key
+    return _field
+
+
+def uses_distance_field():
+    """Whether avoidance goes through the field, which polygon obstacles always need"""
+    return variables.obstacle_avoidance == 'field' or bool(variables.restricted_polygons)
@@ -0,0 +1,575 @@
+import numpy as np
+import variables
+from distance_field import inside_obstacles, obstacle_field, uses_distance_field
+from kernels import pair_kernel
+
+# Species codes stored in Flock.kind
+PREY = 0
+PREDATOR = 1
+
+# Half-width of the frontal cone used by the predator kill test (100 degrees total)
+FRONTAL_HALF_ANGLE = np.radians(100) / 2
+MAX_TURN_ANGLE = np.radians(5)  # Maximum 5 degree turn per update
+NOISE_STD = 0.35  # Standard deviation of the per-step speed variation
+FADED_ALPHA = 50  # Opacity at which dead birds stop fading
+
+# Per-bird arrays, kept in step when birds are removed
+BIRD_FIELDS = ('x', 'y', 'dx', 'dy', 'last_dx', 'last_dy', 'kind', 'alive', 'fade_alpha', 'energy', 'cycle_counter',
+               'breeding_cooldown', 'world', 'ids')
+
+
+class Flock:
+    """
+    The Flock class is a structure-of-arrays simulation engine. It holds the whole
+    population as contiguous NumPy arrays and advances it one step at a time with
+    whole-array operations. It applies the flocking, hunting and avoidance rules
+    of Bird.update, but not its update order: the object engine moves one bird
+    at a time, so later birds see the new state of the birds before them, while
+    here every bird reads the state at the start of the step and all of them
+    move together (a synchronous update). The two engines therefore do not
+    produce the same runs from the same start.
+
+    Neighbors are passed in as NeighborPairs sorted by i then j, which mirrors the
+    index order in which Bird.update walks its neighbors.
+
+    The per-bird arrays are views into pool buffers with room to spare. Births
+    are appended into the free slots after the last bird, and the pool only
+    reallocates, doubling in size, once it is full.
+
+    Attributes:
+        x (ndarray): Horizontal positions.
+        y (ndarray): Vertical positions.
+        dx (ndarray): Horizontal movement components.
+        dy (ndarray): Vertical movement components.
+        last_dx (ndarray): Previous horizontal movement components.
+        last_dy (ndarray): Previous vertical movement components.
+        kind (ndarray): Species of each bird (PREY or PREDATOR).
+        alive (ndarray): False once a bird is dead.
+        fade_alpha (ndarray): Opacity of dead birds, fading down to FADED_ALPHA.
+        energy (ndarray): Predator energy (unused for prey).
+        cycle_counter (ndarray): Predator cycles since the last energy loss.
+        breeding_cooldown (ndarray): Steps before a predator can breed, counted from its birth or last offspring.
+        world (ndarray): Independent world each bird lives in, birds of different worlds never interact.
+        num_worlds (int): Number of worlds batched in this flock.
+        prey_capacity (ndarray): Prey of each world at which prey births stop, PREY_CAPACITY_RATIO times its first prey.
+        ids (ndarray): Stable id of each bird, unchanged when other birds are removed.
+        next_id (int): Id given to the next bird born.
+        killed (ndarray): Indices of the birds caught by predators in the last step.
+        starved (ndarray): Indices of the predators that starved in the last step.
+        born (ndarray): Indices of the birds born in the last step.
+        capacity (int): Number of birds the pool buffers can hold.
+        pool (dict): Buffer behind every per-bird array, by field.
+        rng (Generator): Random source for the speed variation.
+
+    Methods:
+        random(num_birds, predator_ratio, seed): Spawns predators then prey outside the restricted areas,
+            the predators at random points of their breeding cooldown.
+        random_worlds(num_worlds, num_birds, predator_ratio, seed): Spawns a batch of independent worlds.
+        concatenate(flocks): Batches flocks into one, each becoming its own world.
+        from_birds(birds, X, Y, seed, ids): Builds a flock from Bird objects.
+        write_back(birds): Copies the array state back onto Bird objects.
+        settled(): Returns the mask of dead birds that have finished fading.
+        compact(remove): Removes birds from every array, returning them as a flock of their own.
+        allocate(field, size, dtype): Makes the pool buffer of a per-bird field.
+        resize(count, reallocate): Extends or cuts the per-bird arrays, growing the pool when it is full.
+        add(x, y, dx, dy, kind, world, energy): Appends newborn birds into the pool.
+        search_positions(radius): Positions to build the neighbor search from.
+        step(pairs): Advances the simulation by one step.
+    """
+    def __init__(self, x, y, dx, dy, kind, seed=None, world=None, ids=None):
+        self.x = np.array(x, dtype=float)
+        self.y = np.array(y, dtype=float)
+        self.dx = np.array(dx, dtype=float)
+        self.dy = np.array(dy, dtype=float)
+        self.last_dx = self.dx.copy()
+        self.last_dy = self.dy.copy()
+        self.kind = np.array(kind, dtype=np.int8)
+        self.alive = np.ones(len(self.x), dtype=bool)
+        self.fade_alpha = np.full(len(self.x), 255.0)
+        self.energy = np.where(self.kind == PREDATOR, float(variables.PREDATOR_INITIAL_ENERGY), 0.0)
+        self.cycle_counter = np.zeros(len(self.x), dtype=np.int64)
+        self.breeding_cooldown = np.zeros(len(self.x), dtype=np.int64)
+        self.world = np.zeros(len(self.x), dtype=np.int64) if world is None else np.array(world, dtype=np.int64)
+        self.num_worlds = int(self.world.max()) + 1 if len(self.world) else 1
+        self.prey_capacity = variables.PREY_CAPACITY_RATIO * np.bincount(self.world[self.kind == PREY],
+                                                                         minlength=self.num_worlds)
+        self.ids = np.arange(len(self.x)) if ids is None else np.array(ids, dtype=np.int64)
+        self.next_id = int(self.ids.max()) + 1 if len(self.ids) else 0
+        self.pool = {}
+        self.capacity = 0
+        self.clear_events()
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return len(self.x)
+
+    @classmethod
+    def random(cls, num_birds, predator_ratio, seed=None):
+        """
+        Spawn predators then prey at random positions outside the restricted areas.
+        Each predator starts at a random point of its breeding cooldown, so the
+        first kills do not make every predator breed in the same few steps.
+        """
+        rng = np.random.default_rng(seed)
+        num_predators = int(num_birds * predator_ratio)
+        x = np.zeros(num_birds)
+        y = np.zeros(num_birds)
+        pending = np.arange(num_birds)
+        while len(pending) > 0:
+            x[pending] = rng.integers(variables.BORDER_THICKNESS,
+                                      variables.screen_width - variables.panel_width - variables.BORDER_THICKNESS,
+                                      len(pending), endpoint=True)
+            y[pending] = rng.integers(variables.BORDER_THICKNESS,
+                                      variables.screen_height - variables.BORDER_THICKNESS,
+                                      len(pending), endpoint=True)
+            pending = pending[inside_obstacles(x[pending], y[pending])]
+
+        kind = np.where(np.arange(num_birds) < num_predators, PREDATOR, PREY)
+        speed_ratio = np.where(kind == PREDATOR, variables.PREDATOR_SPEED_RATIO, 1.0)
+        dx = rng.uniform(-1, 1, num_birds) * speed_ratio
+        dy = rng.uniform(-1, 1, num_birds) * speed_ratio
+        flock = cls(x, y, dx, dy, kind)
+        flock.breeding_cooldown[:num_predators] = rng.integers(max(variables.PREDATOR_BREEDING_COOLDOWN, 1),
+                                                               size=num_predators)
+        flock.rng = rng
+        return flock
+
+    @classmethod
+    def random_worlds(cls, num_worlds, num_birds, predator_ratio, seed=None):
+        """Spawn num_worlds independent worlds of num_birds each, sharing one random source"""
+        rng = np.random.default_rng(seed)
+        flock = cls.concatenate([cls.random(num_birds, predator_ratio, seed=rng) for _ in range(num_worlds)])
+        flock.rng = rng
+        return flock
+
+    @classmethod
+    def concatenate(cls, flocks):
+        """One flock holding every given flock as a contiguous slice, each one its own world"""
+        flock = cls(np.concatenate([part.x for part in flocks]),
+                    np.concatenate([part.y for part in flocks]),
+                    np.concatenate([part.dx for part in flocks]),
+                    np.concatenate([part.dy for part in flocks]),
+                    np.concatenate([part.kind for part in flocks]),
+                    world=np.repeat(np.arange(len(flocks)), [len(part) for part in flocks]))
+        for name in ('last_dx', 'last_dy', 'alive', 'fade_alpha', 'energy', 'cycle_counter', 'breeding_cooldown'):
+            setattr(flock, name, np.concatenate([getattr(part, name) for part in flocks]))
+        return flock
+
+    @classmethod
+    def from_birds(cls, birds, X, Y, seed=None, ids=None):
+        """Build a flock from Predator/Prey objects and their positions"""
+        flock = cls(X, Y,
+                    [bird.dx for bird in birds],
+                    [bird.dy for bird in birds],
+                    [PREDATOR if hasattr(bird, 'energy') else PREY for bird in birds],
+                    seed=seed, ids=ids)
+        flock.last_dx = np.array([bird.last_dx for bird in birds], dtype=float)
+        flock.last_dy = np.array([bird.last_dy for bird in birds], dtype=float)
+        flock.alive = np.array([not bird.is_dead for bird in birds], dtype=bool)
+        flock.fade_alpha = np.array([getattr(bird, 'fade_alpha', 255) for bird in birds], dtype=float)
+        for index, bird in enumerate(birds):
+            if hasattr(bird, 'energy'):
+                flock.energy[index] = bird.energy
+                flock.cycle_counter[index] = bird.cycle_counter
+        return flock
+
+    def write_back(self, birds):
+        """Copy movement, death and energy state back onto the Bird objects"""
+        for index, bird in enumerate(birds):
+            bird.dx = self.dx[index]
+            bird.dy = self.dy[index]
+            bird.last_dx = self.last_dx[index]
+            bird.last_dy = self.last_dy[index]
+            bird.is_dead = not self.alive[index]
+            if bird.is_dead:
+                bird.fade_alpha = self.fade_alpha[index]
+            if hasattr(bird, 'energy'):
+                bird.energy = self.energy[index]
+                bird.cycle_counter = self.cycle_counter[index]
+
+    def settled(self):
+        """Mask of the dead birds whose fade has finished, which no longer change in any way"""
+        return ~self.alive & (self.fade_alpha <= FADED_ALPHA)
+
+    def compact(self, remove):
+        """
+        Drop the birds in the remove mask from every per-bird array and return them
+        as a flock of their own. The remaining birds keep their order and their ids,
+        so pairs, kills and random draws resolve exactly as before, and recordings
+        and stats can still follow every bird by id.
+        """
+        keep = ~remove
+        removed = Flock(self.x[remove], self.y[remove], self.dx[remove], self.dy[remove], self.kind[remove])
+        for field in BIRD_FIELDS:
+            # Moved down in place, the freed slots at the end stay in the pool for births
+            values = getattr(self, field)
+            setattr(removed, field, values[remove])
+            kept = values[keep]
+            values[:len(kept)] = kept
+            setattr(self, field, values[:len(kept)])
+        removed.num_worlds = self.num_worlds
+        self.clear_events()  # Their indices no longer point at the same birds
+        return removed
+
+    def allocate(self, field, size, dtype):
+        """Pool buffer of a per-bird field, replaced on the instance by steppers that keep the pool in shared memory"""
+        return np.zeros(size, dtype=dtype)
+
+    def resize(self, count, reallocate=False):
+        """
+        Extend or cut every per-bird array to count birds, growing the pool when it
+        is full. With reallocate, the pool buffers are made anew even when they fit.
+        """
+        pooled = all(field in self.pool and getattr(self, field).base is self.pool[field] for field in BIRD_FIELDS)
+        if count > self.capacity or not pooled or reallocate:
+            size = min(len(self), count)
+            if count > self.capacity:
+                self.capacity = max(count, 2 * self.capacity)
+            for field in BIRD_FIELDS:
+                values = getattr(self, field)
+                self.pool[field] = self.allocate(field, self.capacity, values.dtype)
+                self.pool[field][:size] = values[:size]
+        for field in BIRD_FIELDS:
+            setattr(self, field, self.pool[field][:count])
+
+    def add(self, x, y, dx, dy, kind, world, energy=None):
+        """
+        Append newborn birds after the last one, with fresh ids, returning their
+        slice of the arrays. Predators start with energy, by default full, and
+        cannot breed for PREDATOR_BREEDING_COOLDOWN steps.
+        """
+        start = len(self)
+        born = slice(start, start + len(x))
+        self.resize(born.stop)
+        self.x[born] = x
+        self.y[born] = y
+        self.dx[born] = dx
+        self.dy[born] = dy
+        self.last_dx[born] = dx
+        self.last_dy[born] = dy
+        self.kind[born] = kind
+        self.alive[born] = True
+        self.fade_alpha[born] = 255
+        self.energy[born] = np.where(self.kind[born] == PREDATOR,
+                                     variables.PREDATOR_INITIAL_ENERGY if energy is None else energy, 0.0)
+        self.cycle_counter[born] = 0
+        self.breeding_cooldown[born] = variables.PREDATOR_BREEDING_COOLDOWN
+        self.world[born] = world
+        self.ids[born] = np.arange(self.next_id, self.next_id + len(x))
+        self.next_id += len(x)
+        return born
+
+    def count(self, kind):
+        """Number of living birds of the given species"""
+        return int(np.count_nonzero(self.alive & (self.kind == kind)))
+
+    def populations(self):
+        """Living predators and prey in every world, as two arrays indexed by world"""
+        living = self.world[self.alive]
+        kind = self.kind[self.alive]
+        return (np.bincount(living[kind == PREDATOR], minlength=self.num_worlds),
+                np.bincount(living[kind == PREY], minlength=self.num_worlds))
+
+    def search_positions(self, radius):
+        """
+        Positions for building the neighbor search. With several worlds, each world
+        is moved to its own tile of a larger virtual arena, spaced so that birds of
+        different worlds are never within radius of each other and the search
+        never has to consider them together.
+        """
+        if self.num_worlds == 1:
+            return self.x, self.y
+        columns = int(np.ceil(np.sqrt(self.num_worlds)))
+        tile_width = variables.screen_width + 4 * radius
+        tile_height = variables.screen_height + 4 * radius
+        return self.x + (self.world % columns) * tile_width, self.y + (self.world // columns) * tile_height
+
+    def live_pairs(self, pairs):
+        """Mask of the pairs where both birds are alive and in the same world"""
+        live = self.alive[pairs.i] & self.alive[pairs.j]
+        if self.num_worlds > 1:
+            # Guards against birds that strayed far enough outside their arena to reach another tile
+            live &= self.world[pairs.i] == self.world[pairs.j]
+        return live
+
+    def step(self, pairs):
+        """Advance every bird by one simulation step"""
+        self.begin_step()
+        live_pairs = self.live_pairs(pairs)
+        pair_i = pairs.i[live_pairs]
+        pair_j = pairs.j[live_pairs]
+        pair_distance = pairs.distance[live_pairs]
+
+        kill_pairs, new_dx, new_dy = self.interact_pairs(pair_i, pair_j, pair_distance)
+        self.end_step(pair_i[kill_pairs], pair_j[kill_pairs], new_dx, new_dy)
+
+    def interact_pairs(self, pair_i, pair_j, pair_distance):
+        """Kill mask and desired directions for live pairs, from the compiled kernel when enabled"""
+        if variables.interaction_kernel == 'jit' and pair_kernel is not None:
+            return pair_kernel(self.x, self.y, self.dx, self.dy, self.kind, pair_i, pair_j, pair_distance,
+                               float(variables.collision_zone_radius), float(variables.interaction_zone_radius),
+                               float(variables.shift_to_buddy), PREDATOR, PREY, FRONTAL_HALF_ANGLE)
+        kill_pairs = self.find_kills(pair_i, pair_j, pair_distance)
+        new_dx, new_dy = self.interact(pair_i, pair_j, pair_distance, kill_pairs)
+        return kill_pairs, new_dx, new_dy
+
+    def clear_events(self):
+        self.killed = self.starved = self.born = np.zeros(0, dtype=np.int64)
+
+    def begin_step(self):
+        """Per-bird bookkeeping that comes before any interaction"""
+        self.clear_events()
+
+        # Dead birds slowly fade out
+        dead = ~self.alive
+        self.fade_alpha[dead] = np.maximum(FADED_ALPHA, self.fade_alpha[dead] - 0.3)
+
+        self.update_energy()
+
+    def end_step(self, kill_i, kill_j, new_dx, new_dy):
+        """Apply this step's kills and desired directions, then move every surviving bird"""
+        killed, breeders = self.apply_kills(kill_i, kill_j)
+        moving = self.alive & ~killed
+        self.alive[killed] = False
+        self.dx[moving] = new_dx[moving]
+        self.dy[moving] = new_dy[moving]
+        self.update_position(np.flatnonzero(moving))
+        self.reproduce(breeders)
+
+    def update_energy(self):
+        """Time and speed based energy loss for living predators"""
+        hunters = np.flatnonzero(self.alive & (self.kind == PREDATOR))
+        self.breeding_cooldown[hunters] = np.maximum(self.breeding_cooldown[hunters] - 1, 0)
+        self.cycle_counter[hunters] += 1
+        due = hunters[self.cycle_counter[hunters] >= variables.PREDATOR_ENERGY_LOSS_INTERVAL]
+        if len(due) == 0:
+            return
+
+        self.cycle_counter[due] = 0
+        self.energy[due] -= variables.PREDATOR_ENERGY_LOSS_AMOUNT
+
+        # Speed-based energy loss
+        current_speed = np.hypot(self.dx[due], self.dy[due])
+        speed_cost = (current_speed - variables.PREDATOR_BASE_SPEED) * variables.PREDATOR_SPEED_ENERGY_COST
+        self.energy[due] -= np.where(current_speed > variables.PREDATOR_BASE_SPEED, speed_cost, 0.0)
+
+        # Starvation
+        starved = due[self.energy[due] <= 0]
+        self.energy[starved] = 0
+        self.alive[starved] = False
+        self.starved = starved
+
+    def in_frontal_cone(self, pair_i, pair_j):
+        """True where bird j lies inside the 100-degree frontal cone of bird i"""
+        angle_to_other = np.arctan2(self.y[pair_j] - self.y[pair_i], self.x[pair_j] - self.x[pair_i])
+        angle_of_movement = np.arctan2(self.dy[pair_i], self.dx[pair_i])
+        angle_diff = (angle_to_other - angle_of_movement) % (2 * np.pi)
+        return (angle_diff < FRONTAL_HALF_ANGLE) | (angle_diff > 2 * np.pi - FRONTAL_HALF_ANGLE)
+
+    def find_kills(self, pair_i, pair_j, pair_distance):
+        """Mask of the pairs where predator i catches prey j in its frontal cone"""
+        kill_pairs = ((pair_distance <= variables.collision_zone_radius) &
+                      (self.kind[pair_i] == PREDATOR) & (self.kind[pair_j] == PREY))
+        candidates = np.flatnonzero(kill_pairs)
+        kill_pairs[candidates] = self.in_frontal_cone(pair_i[candidates], pair_j[candidates])
+        return kill_pairs
+
+    def apply_kills(self, kill_i, kill_j):
+        """
+        Resolve this step's kills, returning the mask of killed birds and the
+        predators that breed. A prey caught by several predators is credited to the
+        lowest-index one, which is the one that would have reached it first in
+        Bird.update order. The other predators still skip it, as the prey is
+        already dead for them. A predator breeds when it feeds with its energy
+        still at PREDATOR_BREEDING_ENERGY or more, once its breeding cooldown is
+        over. Breeding leaves it PREDATOR_BREEDING_COST below full energy, under
+        the breeding threshold, so it has to feed again before the next kill can
+        make it breed.
+        """
+        killed = np.zeros(len(self), dtype=bool)
+        killed[kill_j] = True
+        self.killed = np.flatnonzero(killed)
+
+        # Only the first predator to reach a prey gets to feed
+        order = np.lexsort((kill_i, kill_j))
+        _, first = np.unique(kill_j[order], return_index=True)
+        fed = kill_i[order][first]
+        ready = (self.energy[fed] >= variables.PREDATOR_BREEDING_ENERGY) & (self.breeding_cooldown[fed] == 0)
+        breeders = np.unique(fed[ready])  # A predator catching several prey at once still breeds once
+        self.energy[fed] = variables.PREDATOR_INITIAL_ENERGY
+        return killed, breeders
+
+    def reproduce(self, breeders):
+        """
+        This step's births. Breeding predators give PREDATOR_BREEDING_COST of their
+        energy to one offspring each and start their cooldown. Every living prey
+        has an offspring with chance PREY_BIRTH_RATE, which falls to zero as the
+        prey of its world approach its prey_capacity. Offspring appear next to their
+        parent, heading in a random direction.
+        """
+        parents = breeders
+        if variables.PREY_BIRTH_RATE > 0:
+            prey = np.flatnonzero(self.alive & (self.kind == PREY))
+            _, prey_counts = self.populations()
+            capacity = np.maximum(self.prey_capacity, 1)
+            chance = variables.PREY_BIRTH_RATE * np.maximum(0.0, 1 - prey_counts / capacity)
+            parents = np.concatenate([breeders, prey[self.rng.random(len(prey)) < chance[self.world[prey]]]])
+        if len(parents) == 0:
+            return
+
+        self.energy[breeders] -= variables.PREDATOR_BREEDING_COST
+        self.breeding_cooldown[breeders] = variables.PREDATOR_BREEDING_COOLDOWN
+        kind = self.kind[parents]
+        angle = self.rng.uniform(0, 2 * np.pi, len(parents))
+        speed_ratio = np.where(kind == PREDATOR, variables.PREDATOR_SPEED_RATIO, 1.0)
+        dx = self.rng.uniform(-1, 1, len(parents)) * speed_ratio
+        dy = self.rng.uniform(-1, 1, len(parents)) * speed_ratio
+        # Positions stay whole pixels
+        born = self.add(self.x[parents] + np.round(np.cos(angle) * variables.BIRD_SIZE),
+                        self.y[parents] + np.round(np.sin(angle) * variables.BIRD_SIZE),
+                        dx, dy, kind, self.world[parents], energy=variables.PREDATOR_BREEDING_COST)
+        self.born = np.arange(born.start, born.stop)
+
+    def interact(self, pair_i, pair_j, pair_distance, kill_pairs):
+        """Apply collision avoidance and alignment, returning the desired directions"""
+        n = len(self)
+        new_dx = self.dx.copy()
+        new_dy = self.dy.copy()
+        offset_x = self.x[pair_j] - self.x[pair_i]
+        offset_y = self.y[pair_j] - self.y[pair_i]
+
+        # Collision avoidance: steer away from every bird in the collision zone
+        collision = ~kill_pairs & (pair_distance < variables.collision_zone_radius)
+        angle_to_other = np.arctan2(offset_y[collision], offset_x[collision])
+        new_dx -= np.bincount(pair_i[collision], weights=0.2 * np.cos(angle_to_other), minlength=n)
+        new_dy -= np.bincount(pair_i[collision], weights=0.2 * np.sin(angle_to_other), minlength=n)
+
+        # Alignment overwrites the direction, so only the last buddy in index order counts
+        interaction = (~kill_pairs & ~collision &
+                       (pair_distance < variables.interaction_zone_radius) &
+                       (self.kind[pair_j] != PREDATOR))
+        buddies = np.flatnonzero(interaction)
+        if len(buddies) == 0:
+            return new_dx, new_dy
+        owners = pair_i[buddies]
+        last = buddies[np.append(owners[1:] != owners[:-1], True)]
+        bird, other, distance = pair_i[last], pair_j[last], pair_distance[last]
+
+        # Dynamic speed adjustment based on distance
+        angle_of_other_movement = np.arctan2(self.dy[other], self.dx[other])
+        speed_adjustment = np.clip(1.0 - distance / variables.interaction_zone_radius, 0.1, 1.0)
+        new_dx[bird] = speed_adjustment * np.cos(angle_of_other_movement)
+        new_dy[bird] = speed_adjustment * np.sin(angle_of_other_movement)
+
+        # Shift towards the buddy
+        apart = distance > 0
+        bird, distance = bird[apart], distance[apart]
+        shift_strength = variables.shift_to_buddy * (1.0 - distance / variables.interaction_zone_radius)
+        new_dx[bird] += shift_strength * offset_x[last][apart] / distance
+        new_dy[bird] += shift_strength * offset_y[last][apart] / distance
+        return new_dx, new_dy
+
+    def update_position(self, index):
+        """Update positions of the given birds considering inertia, borders and restricted areas"""
+        desired_dx = self.dx[index]
+        desired_dy = self.dy[index]
+        last_dx = self.last_dx[index]
+        last_dy = self.last_dy[index]
+
+        # Limit turning angle
+        current_angle = np.arctan2(last_dy, last_dx)
+        angle_diff = np.arctan2(desired_dy, desired_dx) - current_angle
+        angle_diff = (angle_diff + np.pi) % (2 * np.pi) - np.pi
+        angle_diff = np.clip(angle_diff, -MAX_TURN_ANGLE, MAX_TURN_ANGLE)
+        new_angle = current_angle + angle_diff
+        speed = np.hypot(desired_dx, desired_dy)
+        dx = np.cos(new_angle) * speed
+        dy = np.sin(new_angle) * speed
+
+        # Apply inertia
+        dx = variables.inertia * last_dx + (1 - variables.inertia) * dx
+        dy = variables.inertia * last_dy + (1 - variables.inertia) * dy
+
+        # Adjust speed with random variation
+        speed_adjustment = self.rng.normal(0, NOISE_STD, len(index))
+        dx += speed_adjustment
+        dy += speed_adjustment
+
+        x = self.x[index]
+        y = self.y[index]
+        if uses_distance_field():
+            dx, dy = self.avoid_obstacles(x, y, dx, dy)
+        else:
+            dx, dy = self.handle_border_collision(x, y, dx, dy)
+            dx, dy = self.handle_restricted_areas(x, y, dx, dy)
+
+        self.dx[index] = dx
+        self.dy[index] = dy
+        self.last_dx[index] = dx
+        self.last_dy[index] = dy
+        self.x[index] = x + np.round(dx)
+        self.y[index] = y + np.round(dy)
+
+    def avoid_obstacles(self, x, y, dx, dy):
+        """Push birds away from the nearest wall or obstacle, looked up in the precomputed distance field"""
+        avoidance_radius = variables.collision_zone_radius * 2
+        distance, push_x, push_y = obstacle_field().sample(x, y)
+        near = np.flatnonzero(distance < avoidance_radius)
+        if len(near) == 0:
+            return dx, dy
+        distance = distance[near]
+        base_force = np.where(distance <= 0, 1.0, (1 - distance / avoidance_radius) * 0.5)
+        force = base_force * np.maximum(1.0, np.hypot(dx[near], dy[near]))
+
+        # A random direction where two walls are equally near
+        push_x, push_y = push_x[near], push_y[near]
+        undecided = (push_x == 0) & (push_y == 0)
+        angle = self.rng.uniform(0, 2 * np.pi, np.count_nonzero(undecided))
+        push_x[undecided] = np.cos(angle)
+        push_y[undecided] = np.sin(angle)
+        dx[near] += force * push_x
+        dy[near] += force * push_y
+        return dx, dy
+
+    def handle_border_collision(self, x, y, dx, dy):
+        """Push birds away from the screen borders"""
+        avoidance_radius = variables.collision_zone_radius * 2
+        speed_multiplier = np.maximum(1.0, np.hypot(dx, dy))
+
+        def border_force(distance):
+            base_force = np.where(distance <= 0, 1.0, (1 - distance / avoidance_radius) * 0.5)
+            return np.where(distance < avoidance_radius, base_force * speed_multiplier, 0.0)
+
+        right_edge = variables.screen_width - variables.panel_width - variables.BORDER_THICKNESS
+        bottom_edge = variables.screen_height - variables.BORDER_THICKNESS
+        dx = dx + border_force(x - variables.BORDER_THICKNESS) - border_force(right_edge - x)
+        dy = dy + border_force(y - variables.BORDER_THICKNESS) - border_force(bottom_edge - y)
+        return dx, dy
+
+    def handle_restricted_areas(self, x, y, dx, dy):
+        """Push birds away from every restricted area"""
+        avoidance_radius = variables.collision_zone_radius * 2
+        for rect_x, rect_y, rect_width, rect_height in variables.restricted_areas:
+            is_inside = (rect_x < x) & (x < rect_x + rect_width) & (rect_y < y) & (y < rect_y + rect_height)
+            dx_to_rect = np.clip(x, rect_x, rect_x + rect_width) - x
+            dy_to_rect = np.clip(y, rect_y, rect_y + rect_height) - y
+            distance_to_rect = np.hypot(dx_to_rect, dy_to_rect)
+
+            near = np.flatnonzero((distance_to_rect < avoidance_radius) | is_inside)
+            if len(near) == 0:
+                continue
+            base_force = np.where(is_inside[near], 1.0, (1 - distance_to_rect[near] / avoidance_radius) * 0.5)
+            force = base_force * np.maximum(1.0, np.hypot(dx[near], dy[near]))
+
+            # Away from the closest point, or a random direction when exactly on it
+            distance = distance_to_rect[near]
+            on_rect = distance == 0
+            with np.errstate(invalid='ignore', divide='ignore'):
+                push_x = np.where(on_rect, 0.0, -dx_to_rect[near] / distance)
+                push_y = np.where(on_rect, 0.0, -dy_to_rect[near] / distance)
+            angle = self.rng.uniform(0, 2 * np.pi, np.count_nonzero(on_rect))
+            push_x[on_rect] = np.cos(angle)
+            push_y[on_rect] = np.sin(angle)
+            dx[near] += force * push_x
+            dy[near] += force * push_y
+        return dx, dy
@@ -0,0 +1,253 @@
+"""
+Headless simulation runner. Advances the vectorized engine without opening a
+window or loading any textures, for soak jobs on machines without a display.
+
+    python headless.py --steps 10000 --num-birds 20000 --predator-ratio 0.05 --seed 1
+"""
+import argparse
+import json
+import time
+import numpy as np
+import variables
+from flock import Flock, PREDATOR, PREY
+from neighbors import create_neighbor_search
+from parallel import TiledStepper
+from checkpoint import save_checkpoint, load_checkpoint
+from recorder import STORAGE_MODES, TrajectoryRecorder
+from metrics import MetricsWriter
+
+
+class HeadlessSimulation:
+    """
+    The HeadlessSimulation class couples a Flock with a neighbor-search backend and
+    advances them together, exactly like Game.update does for the vectorized
+    engine but without any rendering. With workers, steps run on a TiledStepper.
+    With several worlds, the flock batches that many independent simulations.
+    Nothing is drawn, so dead birds are removed from the flock as soon as the
+    next compaction comes round.
+
+    Attributes:
+        flock (Flock): Simulation state.
+        search (NeighborSearch): Neighbor-search backend rebuilt every step.
+        stepper (TiledStepper): Multi-process stepper, or None to step in this process.
+        recorder (TrajectoryRecorder): Receives the state every record_every steps, or None.
+        metrics (MetricsWriter): Receives the flock metrics every metrics_every steps, or None.
+        compact_every (int): Steps between removals of dead birds from the flock, 0 to keep them.
+        max_population (int): Living birds of one species a world may hold before step() fails, or None.
+        step_count (int): Number of steps simulated so far.
+
+    Methods:
+        step(): Advances the simulation by one step.
+        check_populations(): Fails if a species of any world exceeds max_population.
+        run(steps, report_every, report): Advances several steps, reporting progress.
+        populations(): Returns the living predator and prey counts.
+        world_populations(): Returns the living predator and prey counts of every world.
+        save(path): Writes a checkpoint of the simulation.
+        restore(path, workers): Builds a simulation from a checkpoint.
+        close(): Stops the worker processes and finishes the recording and metrics, if any.
+    """
+    def __init__(self, num_birds=None, predator_ratio=None, seed=None, flock=None, workers=0, worlds=1):
+        if flock is None:
+            flock = Flock.random_worlds(worlds,
+                                        variables.num_birds if num_birds is None else num_birds,
+                                        variables.predator_ratio if predator_ratio is None else predator_ratio,
+                                        seed=seed)
+        self.flock = flock
+        self.search = create_neighbor_search(variables.neighbor_search, self.search_radius())
+        self.stepper = TiledStepper(workers) if workers > 1 else None
+        self.recorder = None
+        self.record_every = 1
+        self.metrics = None
+        self.metrics_every = 1
+        self.compact_every = variables.compact_every
+        self.max_population = None
+        self.step_count = 0
+
+    def save(self, path):
+        save_checkpoint(path, self.flock, self.step_count)
+
+    @classmethod
+    def restore(cls, path, workers=0):
+        """Continue a checkpointed run, under the parameters it was saved with"""
+        flock, step_count, _ = load_checkpoint(path)
+        simulation = cls(flock=flock, workers=workers)
+        simulation.step_count = step_count
+        return simulation
+
+    def close(self):
+        if self.stepper is not None:
+            self.stepper.close()
+            self.stepper = None
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        if self.metrics is not None:
+            self.metrics.close()
+            self.metrics = None
+
+    def search_radius(self):
+        """Largest radius at which birds influence each other"""
+        return max(variables.collision_zone_radius, variables.interaction_zone_radius)
+
+    def step(self):
+        measure = self.metrics is not None and (self.step_count + 1) % self.metrics_every == 0
+        pairs = None
+        if self.stepper is None or measure:
+            # With workers the pairs are only searched here when the metrics need them
+            radius = self.search_radius()
+            self.search.fit(radius)
+            self.search.build(*self.flock.search_positions(radius), self.flock.alive)
+            pairs = self.search.pairs(radius)
+        if self.stepper is not None:
+            self.stepper.step(self.flock)
+        else:
+            self.flock.step(pairs)
+        self.step_count += 1
+        if self.recorder is not None and self.step_count % self.record_every == 0:
+            self.recorder.record(self.flock, self.step_count)
+        if measure:
+            self.metrics.record(self.flock, self.step_count, pairs)
+        if self.compact_every and self.step_count % self.compact_every == 0:
+            self.flock.compact(~self.flock.alive)
+        if self.max_population is not None:
+            self.check_populations()
+
+    def check_populations(self):
+        """Fail once either species of any world has grown past max_population"""
+        for name, counts in zip(('predators', 'prey'), self.world_populations()):
+            if counts.max() > self.max_population:
+                world = int(counts.argmax())
+                raise RuntimeError(f"World {world} has {int(counts[world])} {name} at step {self.step_count}, "
+                                   f"more than the limit of {self.max_population}")
+
+    def populations(self):
+        return self.flock.count(PREDATOR), self.flock.count(PREY)
+
+    def world_populations(self):
+        return self.flock.populations()
+
+    def run(self, steps, report_every=0, report=None, checkpoint_every=0, checkpoint_path=None):
+        """
+        Advance the given number of steps, calling report(stats) every report_every
+        steps and overwriting a checkpoint at checkpoint_path every checkpoint_every steps.
+        """
+        start = time.perf_counter()
+        last_time = start
+        last_step = self.step_count
+        for _ in range(steps):
+            self.step()
+            if report is not None and report_every and self.step_count % report_every == 0:
+                now = time.perf_counter()
+                report(self.stats((self.step_count - last_step) / max(now - last_time, 1e-9)))
+                last_time = now
+                last_step = self.step_count
+            if checkpoint_path and checkpoint_every and self.step_count % checkpoint_every == 0:
+                self.save(checkpoint_path)
+        elapsed = time.perf_counter() - start
+        return self.stats(steps / max(elapsed, 1e-9), elapsed)
+
+    def stats(self, steps_per_second, elapsed=None):
+        num_predators, num_prey = self.populations()
+        stats = {
+            'step': self.step_count,
+            'steps_per_second': round(steps_per_second, 2),
+            'predators': num_predators,
+            'prey': num_prey,
+            'active_birds': len(self.flock),
+        }
+        if self.flock.num_worlds > 1:
+            world_predators, world_prey = self.world_populations()
+            stats['worlds'] = self.flock.num_worlds
+            stats['predators_mean'] = round(float(world_predators.mean()), 2)
+            stats['prey_mean'] = round(float(world_prey.mean()), 2)
+            stats['worlds_without_predators'] = int(np.count_nonzero(world_predators == 0))
+            stats['worlds_without_prey'] = int(np.count_nonzero(world_prey == 0))
+        if elapsed is not None:
+            stats['elapsed_seconds'] = round(elapsed, 3)
+        return stats
+
+
+def read_obstacle_file(path):
+    """Rectangles ([x, y, width, height]) and polygons (lists of [x, y] vertices) from a JSON list"""
+    with open(path) as obstacle_file:
+        entries = json.load(obstacle_file)
+    rects = [tuple(entry) for entry in entries if not isinstance(entry[0], list)]
+    polygons = [[tuple(point) for point in entry] for entry in entries if isinstance(entry[0], list)]
+    return rects, polygons
+
+
+def load_obstacles(spec):
+    """Restricted areas from 'default', 'none' or a JSON obstacle file"""
+    if spec == 'default':
+        return variables.restricted_areas
+    if spec == 'none':
+        return []
+    return read_obstacle_file(spec)[0]
+
+
+def load_polygons(spec):
+    """Polygon obstacles from 'default', 'none' or a JSON obstacle file"""
+    if spec == 'default':
+        return variables.restricted_polygons
+    if spec == 'none':
+        return []
+    return read_obstacle_file(spec)[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the simulation without a display")
+    parser.add_argument('--steps', type=int, default=1000)
+    parser.add_argument('--num-birds', type=int, default=variables.num_birds, help="birds per world")
+    parser.add_argument('--worlds', type=int, default=1, help="independent worlds advanced together as one batch")
+    parser.add_argument('--predator-ratio', type=float, default=variables.predator_ratio)
+    parser.add_argument('--seed', type=int, default=variables.seed)
+    parser.add_argument('--obstacles', default='default',
+                        help="'default', 'none' or a JSON file listing [x, y, width, height] rectangles "
+                             "and [[x, y], ...] polygons")
+    parser.add_argument('--neighbor-search', default=variables.neighbor_search)
+    parser.add_argument('--workers', type=int, default=variables.workers,
+                        help="worker processes for the tiled parallel update, 0 or 1 to stay in one process")
+    parser.add_argument('--report-every', type=int, default=100)
+    parser.add_argument('--checkpoint', help="file to write checkpoints to, also written at the end of the run")
+    parser.add_argument('--checkpoint-every', type=int, default=0)
+    parser.add_argument('--resume', help="checkpoint to continue from, with the parameters it was saved with")
+    parser.add_argument('--record', help="directory to stream trajectories to")
+    parser.add_argument('--record-every', type=int, default=1)
+    parser.add_argument('--record-storage', choices=list(STORAGE_MODES), default=variables.record_storage)
+    parser.add_argument('--metrics', help="CSV file to stream per-step flock metrics to")
+    parser.add_argument('--metrics-every', type=int, default=variables.metrics_every)
+    parser.add_argument('--compact-every', type=int, default=variables.compact_every,
+                        help="steps between removals of dead birds from the state arrays, 0 to keep them")
+    parser.add_argument('--max-population', type=int,
+                        help="stop with an error once either species of a world has more living birds than this")
+    args = parser.parse_args()
+
+    if args.resume:
+        simulation = HeadlessSimulation.restore(args.resume, workers=args.workers)
+    else:
+        variables.restricted_areas = load_obstacles(args.obstacles)
+        variables.restricted_polygons = load_polygons(args.obstacles)
+        variables.neighbor_search = args.neighbor_search
+        simulation = HeadlessSimulation(args.num_birds, args.predator_ratio, seed=args.seed,
+                                        workers=args.workers, worlds=args.worlds)
+    if args.record:
+        simulation.recorder = TrajectoryRecorder(args.record, simulation.flock.kind, simulation.flock.world,
+                                                 simulation.flock.ids, storage=args.record_storage)
+        simulation.record_every = args.record_every
+    if args.metrics:
+        simulation.metrics = MetricsWriter(args.metrics)
+        simulation.metrics_every = args.metrics_every
+    simulation.compact_every = args.compact_every
+    simulation.max_population = args.max_population
+    try:
+        summary = simulation.run(args.steps, args.report_every, report=lambda stats: print(json.dumps(stats)),
+                                 checkpoint_every=args.checkpoint_every, checkpoint_path=args.checkpoint)
+        if args.checkpoint:
+            simulation.save(args.checkpoint)
+    finally:
+        simulation.close()
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Compiled pair-interaction kernel for the vectorized engine. One loop over the
+neighbor list does the kill test, collision avoidance and alignment, the same
+rules as Flock.find_kills and Flock.interact, without their per-pair temporaries.
+"""
+import math
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # Numba is optional, Flock falls back to the NumPy path without it
+    numba = None
+
+
+def _pair_kernel(x, y, dx, dy, kind, pair_i, pair_j, pair_distance,
+                 collision_radius, interaction_radius, shift_to_buddy, predator, prey, half_angle):
+    """
+    Loop over pairs sorted by i then j, returning the kill mask and the desired
+    directions. Pairs must already be limited to living birds.
+    """
+    n = len(x)
+    num_pairs = len(pair_i)
+    kill_pairs = np.zeros(num_pairs, dtype=np.bool_)
+    avoid_x = np.zeros(n)
+    avoid_y = np.zeros(n)
+    last = np.full(n, -1, dtype=np.int64)
+
+    for p in range(num_pairs):
+        i = pair_i[p]
+        j = pair_j[p]
+        distance = pair_distance[p]
+        offset_x = x[j] - x[i]
+        offset_y = y[j] - y[i]
+
+        # Predator catches prey in its frontal cone
+        if distance <= collision_radius and kind[i] == predator and kind[j] == prey:
+            angle_diff = (math.atan2(offset_y, offset_x) - math.atan2(dy[i], dx[i])) % (2 * math.pi)
+            if angle_diff < half_angle or angle_diff > 2 * math.pi - half_angle:
+                kill_pairs[p] = True
+                continue
+
+        # Collision avoidance: steer away from every bird in the collision zone
+        if distance < collision_radius:
+            angle_to_other = math.atan2(offset_y, offset_x)
+            avoid_x[i] += 0.2 * math.cos(angle_to_other)
+            avoid_y[i] += 0.2 * math.sin(angle_to_other)
+        elif distance < interaction_radius and kind[j] != predator:
+            last[i] = p  # Alignment overwrites the direction, so only the last buddy counts
+
+    new_dx = dx - avoid_x
+    new_dy = dy - avoid_y
+    for i in range(n):
+        p = last[i]
+        if p < 0:
+            continue
+        j = pair_j[p]
+        distance = pair_distance[p]
+
+        # Dynamic speed adjustment based on distance
+        angle_of_other_movement = math.atan2(dy[j], dx[j])
+        speed_adjustment = min(max(1.0 - distance / interaction_radius, 0.1), 1.0)
+        new_dx[i] = speed_adjustment * math.cos(angle_of_other_movement)
+        new_dy[i] = speed_adjustment * math.sin(angle_of_other_movement)
+
+        # Shift towards the buddy
+        if distance > 0:
+            shift_strength = shift_to_buddy * (1.0 - distance / interaction_radius)
+            new_dx[i] += shift_strength * (x[j] - x[i]) / distance
+            new_dy[i] += shift_strength * (y[j] - y[i]) / distance
+    return kill_pairs, new_dx, new_dy
+
+
+# None when Numba is missing, so callers can tell whether the kernel is compiled
+pair_kernel = numba.njit(cache=True, nogil=True)(_pair_kernel) if numba is not None else None
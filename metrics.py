@@ -0,0 +1,197 @@
+"""
+Per-step flock metrics. Flock-level statistics are computed from the state
+arrays with whole-array operations, one row per world, and streamed to a CSV
+file by a background thread so they can be analyzed offline:
+
+    step, world          simulation step and world of the row
+    predators, prey      living birds of each species
+    kills, starvations   prey caught and predators starved during the recorded step
+    births               birds born during the recorded step
+    polarization         length of the mean heading of living prey, 1 when they all fly the same way
+    mean_speed           mean speed of living birds
+    nearest_neighbor_within_radius
+                         mean distance from living birds to their nearest living neighbor, over the
+                         birds that have one within the search radius
+    isolated             living birds with no neighbor within the search radius, left out of the mean above
+    clusters, largest_cluster, mean_cluster_size, lone_birds
+                         flocks as found by clusters.py, their sizes and the birds flying alone
+    flocks_of_1, flocks_of_2_3, ..., flocks_of_64_up
+                         flock size distribution: number of flocks with a size in each bin of
+                         clusters.CLUSTER_SIZE_BINS
+    energy_mean, energy_min, energy_median, energy_max
+                         energy distribution of living predators
+
+Nearest neighbors and flocks come from the pairs the step was computed from, so
+they are measured at the positions the step started from. Statistics over no
+birds are NaN.
+"""
+import csv
+import queue
+import threading
+import numpy as np
+import variables
+from clusters import CLUSTER_SIZE_BINS, cluster_labels, cluster_stats
+from flock import PREDATOR, PREY
+
+
+def size_column(low, high):
+    """Name of the column counting flocks of low to high - 1 birds, or of low birds and more when high is None"""
+    if high is None:
+        return f'flocks_of_{low}_up'
+    return f'flocks_of_{low}' if high == low + 1 else f'flocks_of_{low}_{high - 1}'
+
+
+SIZE_COLUMNS = tuple(size_column(low, high) for low, high in zip(CLUSTER_SIZE_BINS, CLUSTER_SIZE_BINS[1:] + (None,)))
+COLUMNS = ('step', 'world', 'predators', 'prey', 'kills', 'starvations', 'births', 'polarization', 'mean_speed',
+           'nearest_neighbor_within_radius', 'isolated', 'clusters', 'largest_cluster', 'mean_cluster_size',
+           'lone_birds') + SIZE_COLUMNS + ('energy_mean', 'energy_min', 'energy_median', 'energy_max')
+DECIMALS = 4  # Float metrics are rounded to this many decimals in the file
+
+
+def nearest_neighbor_distances(flock, pairs):
+    """
+    Distance from every bird to its nearest living neighbor in the same world,
+    among the pairs within the search radius. inf where there is none that close.
+    """
+    searched = len(pairs.offsets) - 1  # Birds born after the search have no pairs
+    nearest = np.full(len(flock), np.inf)
+    near = (flock.alive[pairs.i] & flock.alive[pairs.j]) & (flock.world[pairs.i] == flock.world[pairs.j])
+    i, distance = pairs.i[near], pairs.distance[near]
+    if len(i):
+        # Pairs are sorted by i, so every bird's neighbors are one run
+        starts = np.flatnonzero(np.append(True, i[1:] != i[:-1]))
+        nearest[i[starts]] = np.minimum.reduceat(distance, starts)
+    nearest[searched:] = np.nan
+    return nearest
+
+
+def flock_metrics(flock, pairs=None, labels=None):
+    """
+    Metrics of every world of the flock, as a dict of arrays indexed by world.
+    Without pairs, the nearest-neighbor and flock columns are NaN. labels are the
+    flocks from cluster_labels, found from the pairs when not given.
+    """
+    worlds = flock.num_worlds
+
+    def per_world(index, weights=None):
+        return np.bincount(flock.world[index], weights=weights, minlength=worlds)
+
+    def mean(total, count):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return total / count
+
+    predators, prey = flock.populations()
+    metrics = {
+        'predators': predators,
+        'prey': prey,
+        'kills': per_world(flock.killed),
+        'starvations': per_world(flock.starved),
+        'births': per_world(flock.born),
+    }
+
+    living = np.flatnonzero(flock.alive)
+    speed = np.hypot(flock.dx[living], flock.dy[living])
+    metrics['mean_speed'] = mean(per_world(living, speed), per_world(living))
+
+    # Order parameter over the unit headings of the prey that are moving
+    heading = (flock.kind[living] == PREY) & (speed > 0)
+    moving, speed = living[heading], speed[heading]
+    sum_x = per_world(moving, flock.dx[moving] / speed)
+    sum_y = per_world(moving, flock.dy[moving] / speed)
+    metrics['polarization'] = mean(np.hypot(sum_x, sum_y), per_world(moving))
+
+    if pairs is not None:
+        nearest = nearest_neighbor_distances(flock, pairs)[living]
+        within = np.isfinite(nearest)
+        metrics['nearest_neighbor_within_radius'] = mean(per_world(living[within], nearest[within]),
+                                                         per_world(living[within]))
+        metrics['isolated'] = per_world(living[np.isinf(nearest)])
+        if labels is None:
+            labels = cluster_labels(flock, pairs, variables.interaction_zone_radius)
+        stats = cluster_stats(labels, flock.world, worlds)
+        metrics.update(zip(SIZE_COLUMNS, stats.pop('size_histogram').T))
+        metrics.update(stats)
+    else:
+        for name in ('nearest_neighbor_within_radius', 'isolated', 'clusters', 'largest_cluster', 'mean_cluster_size',
+                     'lone_birds') + SIZE_COLUMNS:
+            metrics[name] = np.full(worlds, np.nan)
+
+    # Energy quantiles from the predators sorted by world, then energy
+    hunters = np.flatnonzero(flock.alive & (flock.kind == PREDATOR))
+    energy = flock.energy[hunters]
+    energy = energy[np.lexsort((energy, flock.world[hunters]))]
+    count = per_world(hunters)
+    first = np.cumsum(count) - count
+    fed = count > 0
+    metrics['energy_mean'] = mean(per_world(hunters, flock.energy[hunters]), count)
+    for name, position in (('energy_min', first), ('energy_max', first + count - 1)):
+        metrics[name] = np.full(worlds, np.nan)
+        metrics[name][fed] = energy[position[fed]]
+    metrics['energy_median'] = np.full(worlds, np.nan)
+    metrics['energy_median'][fed] = (energy[(first + (count - 1) // 2)[fed]] + energy[(first + count // 2)[fed]]) / 2
+    return metrics
+
+
+class MetricsWriter:
+    """
+    The MetricsWriter class streams flock metrics to a CSV file with one row per
+    world and recorded step. Metrics are computed on the simulation thread and
+    queued to a writer thread, which formats and writes them, so the simulation
+    loop never waits on the disk unless the writer falls far behind.
+
+    Attributes:
+        path (str): CSV file the metrics are written to.
+        steps (int): Number of steps recorded so far.
+
+    Methods:
+        record(flock, step, pairs, labels): Queues the flock's metrics at a simulation step.
+        close(): Writes the pending steps and closes the file.
+    """
+    def __init__(self, path, queued_steps=256):
+        self.path = path
+        self.steps = 0
+        self.file = open(path, 'w', newline='')
+        self.csv_writer = csv.writer(self.file)
+        self.csv_writer.writerow(COLUMNS)
+        self.pending = queue.Queue(maxsize=queued_steps)
+        self.error = None
+        self.writer = threading.Thread(target=self.write_rows, name='metrics-writer', daemon=True)
+        self.writer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def record(self, flock, step, pairs=None, labels=None):
+        if self.error is not None:
+            raise self.error
+        self.pending.put((step, flock_metrics(flock, pairs, labels)))
+        self.steps += 1
+
+    def write_rows(self):
+        """Writer thread: format queued metrics until the None sentinel arrives"""
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            step, metrics = item
+            try:
+                worlds = len(metrics['prey'])
+                columns = [np.full(worlds, step), np.arange(worlds)]
+                columns += [np.round(metrics[name], DECIMALS) if metrics[name].dtype.kind == 'f' else metrics[name]
+                            for name in COLUMNS[2:]]
+                self.csv_writer.writerows(zip(*(column.tolist() for column in columns)))
+            except Exception as error:  # Surfaced on the next record() or close()
+                self.error = error
+
+    def close(self):
+        if self.writer is None:
+            return
+        self.pending.put(None)
+        self.writer.join()
+        self.writer = None
+        self.file.close()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,323 @@
+from abc import ABC, abstractmethod
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # SciPy is optional, the KD-tree backend is unavailable without it
+    cKDTree = None
+
+
+class NeighborPairs:
+    """
+    The NeighborPairs class is a compact list of neighboring birds. Pairs are
+    directed and sorted by i then j, so the neighbors of bird i are a contiguous
+    slice described by CSR-style offsets.
+
+    Attributes:
+        i (ndarray): Index of the bird doing the looking.
+        j (ndarray): Index of the neighboring bird.
+        distance (ndarray): Distance between the two birds.
+        offsets (ndarray): Neighbors of bird i are stored in [offsets[i], offsets[i + 1]).
+
+    Methods:
+        neighbors(bird_index): Returns the neighbor indices and distances of one bird.
+    """
+    def __init__(self, i, j, distance, num_birds):
+        self.i = np.asarray(i, dtype=np.int64)
+        self.j = np.asarray(j, dtype=np.int64)
+        self.distance = np.asarray(distance, dtype=float)
+        self.offsets = np.zeros(num_birds + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.i, minlength=num_birds), out=self.offsets[1:])
+
+    def __len__(self):
+        return len(self.i)
+
+    @classmethod
+    def from_candidates(cls, i, j, x, y, radius, num_birds):
+        """Keep candidate pairs closer than radius, dropping self pairs and sorting by i then j"""
+        i = np.asarray(i, dtype=np.int64)
+        j = np.asarray(j, dtype=np.int64)
+        distance = np.hypot(x[i] - x[j], y[i] - y[j])
+        keep = (i != j) & (distance <= radius)
+        i, j, distance = i[keep], j[keep], distance[keep]
+        order = np.lexsort((j, i))
+        return cls(i[order], j[order], distance[order], num_birds)
+
+    def neighbors(self, bird_index):
+        start, end = self.offsets[bird_index], self.offsets[bird_index + 1]
+        return self.j[start:end], self.distance[start:end]
+
+
+class NeighborSearch(ABC):
+    """
+    The NeighborSearch class is the interface shared by all neighbor-search
+    backends. A backend is rebuilt from the bird positions once per step and then
+    answers radius and k-nearest queries over the active birds.
+
+    Methods:
+        fit(radius): Adapts the backend to the search radius.
+        build(x, y, active): Indexes the active birds.
+        get_nearby_birds(bird_index): Returns candidate neighbors of one bird.
+        pairs(radius): Returns NeighborPairs of all active birds within radius.
+        query_radius(px, py, radius): Returns active birds within radius of a point.
+        query_knn(px, py, k): Returns the k active birds nearest to a point.
+    """
+    def fit(self, radius):
+        """Adapt to the search radius, returning True if the backend changed"""
+        return False
+
+    @abstractmethod
+    def build(self, x, y, active=None):
+        """Index the birds at (x, y), only those in the active mask when given"""
+
+    @abstractmethod
+    def pairs(self, radius):
+        """NeighborPairs of all active birds within radius of each other, sorted by i then j"""
+
+    @abstractmethod
+    def query_radius(self, px, py, radius):
+        """Indices of the active birds within radius of the point (px, py)"""
+
+    def get_nearby_birds(self, bird_index):
+        """Retrieve birds within the current search radius of a bird"""
+        return list(self.query_radius(self.x[bird_index], self.y[bird_index], self.radius))
+
+    def query_knn(self, px, py, k):
+        """Indices and distances of the k nearest active birds, found by widening a radius query"""
+        radius = self.radius
+        while True:
+            index = self.query_radius(px, py, radius)
+            if len(index) >= k or len(index) == len(self.active_index):
+                break
+            radius *= 2
+        distance = np.hypot(self.x[index] - px, self.y[index] - py)
+        nearest = np.argsort(distance, kind='stable')[:k]
+        return index[nearest], distance[nearest]
+
+    def index_active(self, x, y, active):
+        self.x = x
+        self.y = y
+        self.active_index = np.arange(len(x)) if active is None else np.flatnonzero(active)
+
+
+class HashGrid(NeighborSearch):
+    """
+    The HashGrid class is the dictionary-of-lists spatial grid: each occupied cell
+    key maps to a Python list of the birds inside it. Simple, but every build and
+    query runs in Python.
+
+    Attributes:
+        cell_size (float): Side length of a grid cell.
+        cells (dict): Maps (cell_x, cell_y) to the list of birds in that cell.
+    """
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self.radius = self.cell_size
+        self.cells = {}
+        self.index_active(np.zeros(0), np.zeros(0), None)
+
+    def fit(self, radius):
+        self.radius = max(float(radius), 1.0)
+        if self.radius == self.cell_size:
+            return False
+        self.cell_size = self.radius
+        return True
+
+    def build(self, x, y, active=None):
+        self.index_active(x, y, active)
+        self.cells.clear()
+        for bird_index in self.active_index:
+            grid_key = (int(x[bird_index] // self.cell_size), int(y[bird_index] // self.cell_size))
+            if grid_key not in self.cells:
+                self.cells[grid_key] = []
+            self.cells[grid_key].append(bird_index)
+
+    def query_radius(self, px, py, radius):
+        reach = int(np.ceil(radius / self.cell_size))
+        grid_x = int(px // self.cell_size)
+        grid_y = int(py // self.cell_size)
+        nearby_birds = []
+        for cell_x in range(grid_x - reach, grid_x + reach + 1):
+            for cell_y in range(grid_y - reach, grid_y + reach + 1):
+                nearby_birds.extend(self.cells.get((cell_x, cell_y), ()))
+
+        index = np.sort(np.array(nearby_birds, dtype=np.int64))
+        return index[np.hypot(self.x[index] - px, self.y[index] - py) <= radius]
+
+    def pairs(self, radius):
+        pair_i = []
+        pair_j = []
+        for bird_index in self.active_index:
+            nearby_bird_indices = self.query_radius(self.x[bird_index], self.y[bird_index], radius)
+            pair_i.extend([bird_index] * len(nearby_bird_indices))
+            pair_j.extend(nearby_bird_indices)
+        return NeighborPairs.from_candidates(pair_i, pair_j, self.x, self.y, radius, len(self.x))
+
+
+class UniformGrid(NeighborSearch):
+    """
+    The UniformGrid class is an array-backed spatial grid. Birds are sorted by
+    cell key with np.argsort, and each cell is described by a start offset and a
+    count into that order, so no per-cell Python containers are built.
+
+    The cell size is kept equal to the search radius, which makes the 3x3 block of
+    cells around a bird a complete and tight candidate set for radius queries.
+    Larger query radii scan a correspondingly wider block.
+
+    Attributes:
+        cell_size (float): Side length of a grid cell.
+        order (ndarray): Bird indices sorted by cell key.
+        cell_start (ndarray): Offset of each cell's first bird in order.
+        cell_count (ndarray): Number of birds in each cell.
+    """
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self.radius = self.cell_size
+        self.index_active(np.zeros(0), np.zeros(0), None)
+        self.order = np.zeros(0, dtype=np.int64)
+        self.cell_start = np.zeros(0, dtype=np.int64)
+        self.cell_count = np.zeros(0, dtype=np.int64)
+        self.cell_x = np.zeros(0, dtype=np.int64)
+        self.cell_y = np.zeros(0, dtype=np.int64)
+        self.origin = (0, 0)
+        self.columns = 0
+        self.rows = 0
+
+    def fit(self, radius):
+        """Match the cell size to the search radius, returning True if it changed"""
+        self.radius = max(float(radius), 1.0)
+        if self.radius == self.cell_size:
+            return False
+        self.cell_size = self.radius
+        return True
+
+    def cell_of(self, x, y):
+        return np.floor_divide(x, self.cell_size).astype(np.int64), np.floor_divide(y, self.cell_size).astype(np.int64)
+
+    def build(self, x, y, active=None):
+        """Bin the active birds into cells with a counting sort over the cell keys"""
+        self.index_active(x, y, active)
+        index = self.active_index
+        self.cell_x = np.zeros(len(x), dtype=np.int64)
+        self.cell_y = np.zeros(len(x), dtype=np.int64)
+        if len(index) == 0:
+            self.order = index
+            self.cell_start = np.zeros(1, dtype=np.int64)
+            self.cell_count = np.zeros(1, dtype=np.int64)
+            self.columns = self.rows = 1
+            return
+
+        cell_x, cell_y = self.cell_of(x[index], y[index])
+        self.origin = (cell_x.min(), cell_y.min())
+        cell_x -= self.origin[0]
+        cell_y -= self.origin[1]
+        self.cell_x[index] = cell_x
+        self.cell_y[index] = cell_y
+        self.columns = int(cell_x.max()) + 1
+        self.rows = int(cell_y.max()) + 1
+
+        keys = cell_y * self.columns + cell_x
+        sort = np.argsort(keys, kind='stable')
+        self.order = index[sort]
+        self.cell_count = np.bincount(keys, minlength=self.columns * self.rows)
+        self.cell_start = np.cumsum(self.cell_count) - self.cell_count
+
+    def query_radius(self, px, py, radius):
+        reach = int(np.ceil(radius / self.cell_size))
+        cell_x, cell_y = self.cell_of(px, py)
+        cell_x -= self.origin[0]
+        cell_y -= self.origin[1]
+        nearby_birds = []
+        for neighbor_y in range(max(cell_y - reach, 0), min(cell_y + reach + 1, self.rows)):
+            # Cells of one row are contiguous in the sorted order
+            first_x = max(cell_x - reach, 0)
+            last_x = min(cell_x + reach, self.columns - 1)
+            if first_x <= last_x:
+                start = self.cell_start[neighbor_y * self.columns + first_x]
+                end_key = neighbor_y * self.columns + last_x
+                nearby_birds.append(self.order[start:self.cell_start[end_key] + self.cell_count[end_key]])
+
+        index = np.sort(np.concatenate(nearby_birds)) if nearby_birds else self.order[:0]
+        return index[np.hypot(self.x[index] - px, self.y[index] - py) <= radius]
+
+    def candidate_pairs(self, reach=1):
+        """All (i, j) pairs of binned birds whose cells are at most reach cells apart"""
+        birds = self.order
+        pair_i = []
+        pair_j = []
+        for offset_y in range(-reach, reach + 1):
+            for offset_x in range(-reach, reach + 1):
+                neighbor_x = self.cell_x[birds] + offset_x
+                neighbor_y = self.cell_y[birds] + offset_y
+                inside = ((neighbor_x >= 0) & (neighbor_x < self.columns) &
+                          (neighbor_y >= 0) & (neighbor_y < self.rows))
+                owners = birds[inside]
+                keys = neighbor_y[inside] * self.columns + neighbor_x[inside]
+                counts = self.cell_count[keys]
+
+                # Expand each owner into one candidate per bird of the neighbor cell
+                total = counts.sum()
+                first = np.repeat(self.cell_start[keys], counts)
+                within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                pair_i.append(np.repeat(owners, counts))
+                pair_j.append(self.order[first + within])
+        return np.concatenate(pair_i), np.concatenate(pair_j)
+
+    def pairs(self, radius):
+        pair_i, pair_j = self.candidate_pairs(int(np.ceil(radius / self.cell_size)))
+        return NeighborPairs.from_candidates(pair_i, pair_j, self.x, self.y, radius, len(self.x))
+
+
+class KDTreeSearch(NeighborSearch):
+    """
+    The KDTreeSearch class answers neighbor queries with SciPy's cKDTree. Its cost
+    does not depend on how evenly the birds are spread, which makes it the better
+    choice for maps where obstacles pack the flock into a few dense corridors.
+    """
+    def __init__(self, radius):
+        if cKDTree is None:
+            raise ImportError("The 'kdtree' neighbor search needs SciPy (pip install scipy)")
+        self.radius = float(radius)
+        self.tree = None
+        self.index_active(np.zeros(0), np.zeros(0), None)
+
+    def fit(self, radius):
+        self.radius = float(radius)
+        return False
+
+    def build(self, x, y, active=None):
+        self.index_active(x, y, active)
+        self.tree = cKDTree(np.column_stack((x[self.active_index], y[self.active_index])))
+
+    def query_radius(self, px, py, radius):
+        found = self.tree.query_ball_point((px, py), radius)
+        return np.sort(self.active_index[np.asarray(found, dtype=np.int64)])
+
+    def query_knn(self, px, py, k):
+        k = min(k, len(self.active_index))
+        if k == 0:
+            return self.active_index[:0], np.zeros(0)
+        distance, found = self.tree.query((px, py), k=[*range(1, k + 1)])
+        return self.active_index[found], distance
+
+    def pairs(self, radius):
+        found = self.tree.query_pairs(radius, output_type='ndarray')
+        first = self.active_index[found[:, 0]]
+        second = self.active_index[found[:, 1]]
+        return NeighborPairs.from_candidates(np.concatenate((first, second)), np.concatenate((second, first)),
+                                             self.x, self.y, radius, len(self.x))
+
+
+# Neighbor-search backends selectable through variables.neighbor_search
+NEIGHBOR_SEARCH_BACKENDS = {
+    'hash': HashGrid,
+    'grid': UniformGrid,
+    'kdtree': KDTreeSearch,
+}
+
+
+def create_neighbor_search(name, radius):
+    """Create the named neighbor-search backend for the given search radius"""
+    if name not in NEIGHBOR_SEARCH_BACKENDS:
+        raise ValueError(f"Unknown neighbor search '{name}', expected one of {sorted(NEIGHBOR_SEARCH_BACKENDS)}")
+    return NEIGHBOR_SEARCH_BACKENDS[name](radius)
@@ -0,0 +1,278 @@
+"""
+Multi-process stepping of a Flock. The arena of every world is cut into spatial
+tiles, and each worker process updates the birds of one tile at a time. The
+flock's position, direction, species and world arrays live in shared memory, so
+workers read them in place. Once per step the parent sorts the living birds
+into tiles and shares only the list of every tile's birds plus a halo of
+neighbors within interaction range.
+
+    python headless.py --steps 1000 --num-birds 100000 --workers 32
+"""
+import math
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import variables
+from flock import Flock
+from neighbors import create_neighbor_search
+
+# Flock fields workers read, kept in shared memory as the flock's own pool buffers
+FLOCK_FIELDS = ('x', 'y', 'dx', 'dy', 'kind', 'world')
+# Tile lists written by the parent every step, grouped by tile
+TILE_FIELDS = {
+    'index': np.int64,  # Position of the bird in the flock
+    'owned': np.bool_,  # Whether the bird belongs to the tile rather than its halo
+}
+# Per-bird results written back by workers, at the birds' positions in the flock
+OUTPUT_FIELDS = {
+    'new_dx': np.float64,
+    'new_dy': np.float64,
+}
+
+# Simulation parameters workers need, sent with every task so slider changes reach them
+TASK_PARAMETERS = ('collision_zone_radius', 'interaction_zone_radius', 'shift_to_buddy', 'neighbor_search',
+                   'interaction_kernel')
+
+# Shared-memory blocks a worker process has attached to, by name
+_attached = {}
+# Unlinked blocks the parent could not close yet because arrays still use them
+_retired = []
+
+
+def _attach(layout):
+    """Array views of the parent's shared blocks, re-attaching after the parent reallocated them"""
+    names = {name for name, _, _ in layout.values()}
+    if set(_attached) != names:
+        for block in _attached.values():
+            block.close()
+        _attached.clear()
+        for name in names:
+            # Spawned workers share the parent's resource tracker, which forgets the block when the parent unlinks it
+            _attached[name] = shared_memory.SharedMemory(name=name)
+    return {field: np.ndarray((size,), dtype=dtype, buffer=_attached[name].buf)
+            for field, (name, size, dtype) in layout.items()}
+
+
+def _retire(block):
+    """Unlink a block the parent made, to be closed once no array uses it"""
+    block.unlink()
+    _retired.append(block)
+
+
+def _close_retired():
+    """Close the retired blocks that no array uses anymore"""
+    for block in list(_retired):
+        try:
+            block.close()
+        except BufferError:
+            continue
+        _retired.remove(block)
+
+
+def update_tile(task):
+    """
+    Worker entry point. Computes kills and desired directions for the birds owned
+    by one tile, from the flock rows the parent listed for it: the tile's living
+    birds and their halo, in flock order. Writes the directions to shared memory
+    and returns the tile's kill pairs as flock (predator, prey) indices, which
+    the parent resolves.
+    """
+    layout, start, stop, parameters = task
+    for name, value in parameters.items():
+        setattr(variables, name, value)
+    arrays = _attach(layout)
+    rows = slice(start, stop)
+    index, owned = arrays['index'][rows], arrays['owned'][rows]
+    radius = max(variables.collision_zone_radius, variables.interaction_zone_radius)
+
+    # A flock of just these birds, with the tile's neighbor pairs
+    tile = Flock(arrays['x'][index], arrays['y'][index], arrays['dx'][index], arrays['dy'][index],
+                 arrays['kind'][index], world=arrays['world'][index])
+    search = create_neighbor_search(variables.neighbor_search, radius)
+    search.fit(radius)
+    search.build(*tile.search_positions(radius))
+    pairs = search.pairs(radius)
+    mine = owned[pairs.i] & tile.live_pairs(pairs)
+    pair_i, pair_j, pair_distance = pairs.i[mine], pairs.j[mine], pairs.distance[mine]
+
+    kill_pairs, new_dx, new_dy = tile.interact_pairs(pair_i, pair_j, pair_distance)
+    arrays['new_dx'][index[owned]] = new_dx[owned]
+    arrays['new_dy'][index[owned]] = new_dy[owned]
+    return index[pair_i[kill_pairs]], index[pair_j[kill_pairs]]
+
+
+class TiledStepper:
+    """
+    The TiledStepper class advances a Flock with a pool of worker processes. It
+    moves the flock's pool buffers of FLOCK_FIELDS into shared memory, where
+    they stay, also when births grow the pool. Every step, the parent does the
+    per-bird bookkeeping and sorts the living birds into tiles, each world
+    having its own. Workers then update one tile each, reading that tile's
+    birds and halo straight from the flock's arrays. Finally the parent
+    resolves all kills at once, with the same lowest-index rule as
+    Flock.apply_kills, and moves the birds. Results match a single-process
+    Flock.step exactly.
+
+    Attributes:
+        workers (int): Number of worker processes.
+        tiles (int): Number of spatial tiles per step, more than workers for load balancing, split among the worlds.
+        capacity (int): Number of rows the tile and output blocks can hold.
+        flock (Flock): Flock whose pool lives in shared memory, None before the first step.
+
+    Methods:
+        step(flock): Advances the flock by one step.
+        close(): Stops the workers, moves the flock back to private memory and frees the shared memory.
+    """
+    def __init__(self, workers, tiles=None):
+        self.workers = workers
+        self.tiles = tiles or workers * 4
+        self.capacity = 0
+        self.blocks = {}
+        self.flock = None
+        self.flock_blocks = {}
+        # Spawned workers do not inherit the parent's window or pygame state
+        self.pool = multiprocessing.get_context('spawn').Pool(workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def allocate(self, field, size, dtype):
+        """Pool buffer of a flock field, in a new shared block for the fields workers read"""
+        if field not in FLOCK_FIELDS:
+            return np.zeros(size, dtype=dtype)
+        if field in self.flock_blocks:
+            # Still copied from by the flock's resize, closed on a later step
+            _retire(self.flock_blocks.pop(field))
+        block = shared_memory.SharedMemory(create=True, size=max(1, size * np.dtype(dtype).itemsize))
+        self.flock_blocks[field] = block
+        return np.ndarray((size,), dtype=dtype, buffer=block.buf)
+
+    def adopt(self, flock):
+        """Move the flock's pool into shared memory, giving back the previous flock's"""
+        self.disown()
+        flock.allocate = self.allocate
+        flock.resize(len(flock), reallocate=True)
+        self.flock = flock
+
+    def disown(self):
+        """Move the flock's pool back to private memory and free its shared blocks"""
+        if self.flock is None:
+            return
+        del self.flock.allocate
+        self.flock.resize(len(self.flock), reallocate=True)
+        for block in self.flock_blocks.values():
+            _retire(block)
+        self.flock_blocks = {}
+        self.flock = None
+        _close_retired()
+
+    def ensure_capacity(self, count):
+        """(Re)allocate the tile and output blocks when the tile lists or the flock outgrow them"""
+        if count <= self.capacity:
+            return
+        self.free_blocks()
+        self.capacity = max(count, 2 * self.capacity)
+        for field, dtype in {**TILE_FIELDS, **OUTPUT_FIELDS}.items():
+            block = shared_memory.SharedMemory(create=True, size=max(1, self.capacity * np.dtype(dtype).itemsize))
+            self.blocks[field] = (block, np.ndarray((self.capacity,), dtype=dtype, buffer=block.buf))
+
+    def tile_edges(self, num_worlds):
+        """
+        x and y edges of the tiles covering the arena of each world, the outer ones
+        open-ended so every bird has a tile. The tiles are shared among the worlds,
+        and a world gets at least one.
+        """
+        tiles = max(1, math.ceil(self.tiles / num_worlds))
+        width = variables.screen_width - variables.panel_width
+        height = variables.screen_height
+        columns = max(1, round(math.sqrt(tiles * width / height)))
+        rows = max(1, math.ceil(tiles / columns))
+        x_edges = np.linspace(0, width, columns + 1)
+        y_edges = np.linspace(0, height, rows + 1)
+        x_edges[0], x_edges[-1] = -np.inf, np.inf
+        y_edges[0], y_edges[-1] = -np.inf, np.inf
+        return x_edges, y_edges
+
+    def partition(self, flock, radius):
+        """
+        Living birds of every tile and of its halo, the birds of the tile's world
+        within radius of its bounds. Returns the birds' flock indices grouped by
+        tile and in flock order within each tile, whether the tile owns each of
+        them, and the start of every tile's group. A bird near a tile corner is in
+        up to four groups.
+        """
+        living = np.flatnonzero(flock.alive)
+        x, y = flock.x[living], flock.y[living]
+        x_edges, y_edges = self.tile_edges(flock.num_worlds)
+        columns, rows = len(x_edges) - 1, len(y_edges) - 1
+
+        # Columns and rows of the tiles that may see each bird, widened a little against rounding
+        margin = radius * (1 + 1e-9)
+        first_column = np.searchsorted(x_edges[1:-1], x - margin, side='right')
+        column_span = np.searchsorted(x_edges[1:-1], x + margin, side='right') - first_column + 1
+        first_row = np.searchsorted(y_edges[1:-1], y - margin, side='right')
+        row_span = np.searchsorted(y_edges[1:-1], y + margin, side='right') - first_row + 1
+        copies = column_span * row_span
+        bird = np.repeat(np.arange(len(living)), copies)
+        offset = np.arange(len(bird)) - np.repeat(np.cumsum(copies) - copies, copies)
+        column = first_column[bird] + offset % column_span[bird]
+        row = first_row[bird] + offset // column_span[bird]
+
+        # The same bounds tests a tile applies to the whole flock
+        x, y = x[bird], y[bird]
+        left, right = x_edges[column], x_edges[column + 1]
+        top, bottom = y_edges[row], y_edges[row + 1]
+        nearby = (x >= left - radius) & (x < right + radius) & (y >= top - radius) & (y < bottom + radius)
+        owned = (x >= left) & (x < right) & (y >= top) & (y < bottom)
+        world = flock.world[living[bird]]
+        tile = ((world * rows + row) * columns + column)[nearby]
+        bird, owned = bird[nearby], owned[nearby]
+
+        order = np.lexsort((bird, tile))
+        tile = tile[order]
+        starts = np.searchsorted(tile, np.arange(flock.num_worlds * rows * columns + 1))
+        return living[bird[order]], owned[order], starts
+
+    def step(self, flock):
+        if flock is not self.flock:
+            self.adopt(flock)
+        # Arrays assigned to the flock directly are copied back into its shared pool
+        flock.resize(len(flock))
+        _close_retired()
+        count = len(flock)
+        flock.begin_step()
+        radius = max(variables.collision_zone_radius, variables.interaction_zone_radius)
+        index, owned, starts = self.partition(flock, radius)
+        self.ensure_capacity(max(count, len(index)))
+
+        self.blocks['index'][1][:len(index)] = index
+        self.blocks['owned'][1][:len(index)] = owned
+        layout = {field: (block.name, len(array), array.dtype) for field, (block, array) in self.blocks.items()}
+        layout.update({field: (self.flock_blocks[field].name, len(flock.pool[field]), flock.pool[field].dtype)
+                       for field in FLOCK_FIELDS})
+        parameters = {name: getattr(variables, name) for name in TASK_PARAMETERS}
+        # Tiles without birds of their own have nothing to update
+        owned_before = np.concatenate([[0], np.cumsum(owned)])
+        busy = owned_before[starts[1:]] > owned_before[starts[:-1]]
+        tasks = [(layout, int(starts[tile]), int(starts[tile + 1]), parameters) for tile in np.flatnonzero(busy)]
+        results = self.pool.map(update_tile, tasks)
+
+        kill_i = np.concatenate([result[0] for result in results] + [np.zeros(0, dtype=np.int64)])
+        kill_j = np.concatenate([result[1] for result in results] + [np.zeros(0, dtype=np.int64)])
+        flock.end_step(kill_i, kill_j, self.blocks['new_dx'][1][:count], self.blocks['new_dy'][1][:count])
+
+    def free_blocks(self):
+        for block, _ in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+        self.disown()
+        self.free_blocks()
+        self.capacity = 0
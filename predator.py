@@ -3,6 +3,35 @@ import variables
 import pygame
 from bird import Bird
 
+
+def draw_energy_bar(x, y, energy):
+    """Draw an energy bar above a predator at (x, y) and return its area"""
+    # Calculate energy bar position
+    bar_x = x - variables.ENERGY_BAR_WIDTH // 2
+    bar_y = y - variables.ENERGY_BAR_OFFSET
+
+    # Draw background (black)
+    rect = pygame.draw.rect(variables.screen, (0, 0, 0),
+                    (bar_x, bar_y, variables.ENERGY_BAR_WIDTH, variables.ENERGY_BAR_HEIGHT))
+
+    # Calculate energy bar width based on current energy
+    energy_width = int((energy / variables.PREDATOR_INITIAL_ENERGY) * variables.ENERGY_BAR_WIDTH)
+
+    # Choose color based on energy level
+    if energy > variables.PREDATOR_INITIAL_ENERGY * 0.7:
+        color = variables.ENERGY_BAR_HIGH
+    elif energy > variables.PREDATOR_INITIAL_ENERGY * 0.3:
+        color = variables.ENERGY_BAR_MEDIUM
+    else:
+        color = variables.ENERGY_BAR_LOW
+
+    # Draw energy bar
+    if energy_width > 0:
+        pygame.draw.rect(variables.screen, color,
+                       (bar_x, bar_y, energy_width, variables.ENERGY_BAR_HEIGHT))
+    return rect
+
+
 class Predator(Bird):
     def __init__(self, dx, dy):
         # Apply speed reduction before passing to parent
@@ -42,37 +71,16 @@ class Predator(Bird):
         
     def draw(self, bird_index,screen):
         # Draw the bird triangle
-        super().draw(bird_index,screen)
+        rect = super().draw(bird_index,screen)
         
         # Draw energy bar if alive
         if not self.is_dead:
-            self.draw_energy_bar(bird_index)
+            rect.union_ip(self.draw_energy_bar(bird_index))
+        return rect
             
     def draw_energy_bar(self, bird_index):
         """Draw energy bar above the predator"""
-        # Calculate energy bar position
-        bar_x = variables.X[bird_index] - variables.ENERGY_BAR_WIDTH // 2
-        bar_y = variables.Y[bird_index] - variables.ENERGY_BAR_OFFSET
-        
-        # Draw background (black)
-        pygame.draw.rect(variables.screen, (0, 0, 0),
-                        (bar_x, bar_y, variables.ENERGY_BAR_WIDTH, variables.ENERGY_BAR_HEIGHT))
-        
-        # Calculate energy bar width based on current energy
-        energy_width = int((self.energy / variables.PREDATOR_INITIAL_ENERGY) * variables.ENERGY_BAR_WIDTH)
-        
-        # Choose color based on energy level
-        if self.energy > variables.PREDATOR_INITIAL_ENERGY * 0.7:
-            color = variables.ENERGY_BAR_HIGH
-        elif self.energy > variables.PREDATOR_INITIAL_ENERGY * 0.3:
-            color = variables.ENERGY_BAR_MEDIUM
-        else:
-            color = variables.ENERGY_BAR_LOW
-            
-        # Draw energy bar
-        if energy_width > 0:
-            pygame.draw.rect(variables.screen, color,
-                           (bar_x, bar_y, energy_width, variables.ENERGY_BAR_HEIGHT))
+        return draw_energy_bar(variables.X[bird_index], variables.Y[bird_index], self.energy)
         
     def get_size(self):
         """Predators are larger"""
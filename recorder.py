@@ -0,0 +1,417 @@
+"""
+Streaming trajectory recorder. Positions, headings and alive flags of every
+bird are appended step by step to memory-mapped files on disk, written by a
+background thread so the simulation loop only pays for copying the state.
+
+A recording is a directory holding one raw array file per field, the species
+and world of every bird, and a meta.json describing the layout:
+
+    x.bin, y.bin      positions, (steps, birds)
+    heading.bin       movement direction, (steps, birds)
+    alive.bin         alive flags packed 8 birds per byte, (steps, ceil(birds / 8))
+    step.bin          simulation step of every recorded row, the keyframe index used for seeking
+    population.bin    living predators and prey of every world in every recorded row
+    kind.npy          species of every bird
+    world.npy         world of every bird
+    ids.npy           stable id of the bird recorded in every column
+    first_row.npy     row in which every bird was first recorded, later than 0 for birds born during the recording
+
+Birds born during the recording get new columns after the existing ones. The
+per-bird files keep spare columns for them, recorded dead. When the spare
+columns run out, the new columns go into a segment of their own, x.1.bin,
+y.1.bin, heading.1.bin and alive.1.bin for the first one, which starts at
+the row it was opened in. Each segment is as wide as all the columns before
+it, so a recording has few of them, and files already written are never
+rewritten.
+"""
+import json
+import os
+import queue
+import threading
+import numpy as np
+import variables
+
+# On-disk types of each storage mode. Positions are whole pixels, so int16 keeps them exactly
+STORAGE_MODES = {
+    'float32': {'position': np.float32, 'heading': np.float32},
+    'float16': {'position': np.float16, 'heading': np.float16},
+    'quantized': {'position': np.int16, 'heading': np.uint8},
+}
+HEADING_LEVELS = 256  # Quantized headings split the full turn into this many steps
+
+
+def encode_heading(dx, dy, storage):
+    """Movement direction in radians, or as a fraction of a full turn in the quantized mode"""
+    heading = np.arctan2(dy, dx)
+    if storage != 'quantized':
+        return heading
+    return np.round(heading / (2 * np.pi) * HEADING_LEVELS).astype(np.int64) % HEADING_LEVELS
+
+
+def segment_file(field, segment):
+    """Name of a per-bird field's file in a column segment, without the .bin extension"""
+    return field if segment == 0 else f'{field}.{segment}'
+
+
+def decode_heading(heading, storage):
+    if storage != 'quantized':
+        return heading.astype(float)
+    return heading.astype(float) * (2 * np.pi / HEADING_LEVELS)
+
+
+class TrajectoryRecorder:
+    """
+    The TrajectoryRecorder class streams per-step bird state into a recording
+    directory. Steps are gathered into chunks on the simulation thread and
+    handed to a writer thread, which converts them to the storage types and
+    copies them into memory-mapped files that grow geometrically as needed.
+    Birds are matched to their columns by id, so birds removed from the flock
+    stay in the recording, dead where they were last seen, and newborn birds
+    are given new columns, in new column segments once the spare ones run out.
+
+    Attributes:
+        path (str): Recording directory.
+        num_birds (int): Number of birds recorded so far, one column each.
+        width (int): Columns the per-bird files and chunks have room for.
+        segments (list): First row, first column and end column of every column segment.
+        ids (ndarray): Id of the bird recorded in every column.
+        first_row (ndarray): Row in which every column was first recorded.
+        storage (str): 'float32', 'float16' or 'quantized'.
+        chunk_steps (int): Steps gathered before a chunk is handed to the writer.
+        steps (int): Number of steps recorded so far.
+
+    Methods:
+        record(flock, step): Appends the flock's state at a simulation step.
+        close(): Writes the pending steps, trims the files and finishes the metadata.
+    """
+    def __init__(self, path, kind, world=None, ids=None, storage='quantized', chunk_steps=64, capacity_steps=1024,
+                 queued_chunks=4):
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode {storage!r}, expected one of {', '.join(STORAGE_MODES)}")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.num_birds = len(kind)
+        self.width = self.num_birds
+        self.storage = storage
+        self.chunk_steps = chunk_steps
+        self.steps = 0
+        self.kind = np.asarray(kind, dtype=np.int8)
+        self.world = np.zeros(self.num_birds, dtype=np.int64) if world is None else np.asarray(world, dtype=np.int64)
+        self.num_worlds = int(self.world.max()) + 1 if self.num_birds else 1
+        # dtype, width and first row of every file, by name
+        self.fields = {
+            'step': (np.int64, 1, 0),
+            'population': (np.int32, 2 * self.num_worlds, 0),  # Predators then prey of each world
+        }
+        self.ids = np.arange(self.num_birds) if ids is None else np.asarray(ids, dtype=np.int64)
+        self.first_row = np.zeros(self.num_birds, dtype=np.int64)
+
+        # Column of every id, and the last state seen in every column
+        self.columns = np.full(int(self.ids.max()) + 1 if self.num_birds else 0, -1, dtype=np.int64)
+        self.columns[self.ids] = np.arange(self.num_birds)
+        self.last = {field: np.zeros(self.width, dtype=np.float32) for field in ('x', 'y', 'dx', 'dy')}
+
+        # Disk side, owned by the writer thread
+        self.capacity = 0
+        self.maps = {}
+        self.written = 0
+        self.segments = []
+        self.add_segment(0, 0, self.width)
+        self.grow(capacity_steps)
+
+        # Chunk buffers cycle between the simulation thread and the writer
+        self.free_chunks = queue.Queue()
+        for _ in range(queued_chunks):
+            self.free_chunks.put(self.new_chunk())
+        self.full_chunks = queue.Queue()
+        self.chunk = self.free_chunks.get()
+        self.chunk_rows = 0
+        self.error = None
+        self.writer = threading.Thread(target=self.write_chunks, name='trajectory-writer', daemon=True)
+        self.writer.start()
+        self.write_meta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def new_chunk(self):
+        return {
+            'x': np.zeros((self.chunk_steps, self.width), dtype=np.float32),
+            'y': np.zeros((self.chunk_steps, self.width), dtype=np.float32),
+            'dx': np.zeros((self.chunk_steps, self.width), dtype=np.float32),
+            'dy': np.zeros((self.chunk_steps, self.width), dtype=np.float32),
+            'alive': np.zeros((self.chunk_steps, self.width), dtype=bool),
+            'step': np.zeros(self.chunk_steps, dtype=np.int64),
+            'population': np.zeros((self.chunk_steps, 2 * self.num_worlds), dtype=np.int32),
+        }
+
+    def record(self, flock, step=None):
+        """
+        Copy the flock's state at a simulation step (by default the number of steps
+        recorded so far) into the current chunk, blocking only if the writer is
+        several chunks behind. Birds missing from the flock are recorded dead at
+        their last position and heading. Birds the recording has no column for
+        yet, born since it started, get new columns.
+        """
+        if self.error is not None:
+            raise self.error
+        newborn = flock.ids >= len(self.columns)
+        newborn[~newborn] = self.columns[flock.ids[~newborn]] < 0
+        if newborn.any():
+            self.add_columns(flock, np.flatnonzero(newborn))
+        row = self.chunk_rows
+        self.chunk['step'][row] = self.steps if step is None else step
+        self.chunk['population'][row] = np.column_stack(flock.populations()).ravel()
+
+        columns = self.columns[flock.ids]
+        for field, values in self.last.items():
+            values[columns] = getattr(flock, field)
+            self.chunk[field][row] = values
+        self.chunk['alive'][row] = False
+        self.chunk['alive'][row, columns] = flock.alive
+        self.chunk_rows += 1
+        self.steps += 1
+        if self.chunk_rows == self.chunk_steps:
+            self.submit()
+
+    def add_columns(self, flock, newborn):
+        """Give the birds at the newborn indices of the flock the next free columns, widening when they run out"""
+        ids = flock.ids[newborn]
+        start = self.num_birds
+        self.num_birds += len(newborn)
+        if int(ids.max()) >= len(self.columns):
+            columns = np.full(max(int(ids.max()) + 1, 2 * len(self.columns)), -1, dtype=np.int64)
+            columns[:len(self.columns)] = self.columns
+            self.columns = columns
+        self.columns[ids] = np.arange(start, self.num_birds)
+        self.kind = np.concatenate([self.kind, flock.kind[newborn].astype(np.int8)])
+        self.world = np.concatenate([self.world, flock.world[newborn]])
+        self.ids = np.concatenate([self.ids, ids])
+        self.first_row = np.concatenate([self.first_row, np.full(len(newborn), self.steps, dtype=np.int64)])
+        if self.num_birds <= self.width:
+            return
+
+        # Rows gathered so far go out at the old width, later chunks are made at the new one
+        if self.chunk_rows:
+            self.submit()
+        self.width = max(self.num_birds, 2 * self.width)
+        self.chunk = self.new_chunk()
+        for field, values in self.last.items():
+            self.last[field] = np.zeros(self.width, dtype=np.float32)
+            self.last[field][:len(values)] = values
+
+    def submit(self):
+        self.full_chunks.put((self.chunk, self.chunk_rows))
+        self.chunk = self.free_chunks.get()
+        if self.chunk['x'].shape[1] < self.width:
+            self.chunk = self.new_chunk()  # Made before the recording last widened
+        self.chunk_rows = 0
+
+    def write_chunks(self):
+        """Writer thread: encode chunks into the mapped files until the None sentinel arrives"""
+        while True:
+            item = self.full_chunks.get()
+            if item is None:
+                return
+            chunk, rows = item
+            try:
+                self.write_chunk(chunk, rows)
+            except Exception as error:  # Surfaced on the next record() or close()
+                self.error = error
+            self.free_chunks.put(chunk)
+
+    def write_chunk(self, chunk, rows):
+        width = chunk['x'].shape[1]
+        if width > self.segments[-1][2]:
+            # The first chunk this wide starts at the row its new columns were added in
+            self.add_segment(self.written, self.segments[-1][2], width)
+        capacity = self.capacity
+        if self.written + rows > capacity:
+            capacity = max(self.written + rows, 2 * capacity)
+        if capacity > self.capacity or len(self.maps) < len(self.fields):
+            self.grow(capacity)  # Also maps the files of a new segment
+        for index, (first_row, start, stop) in enumerate(self.segments):
+            target = slice(self.written - first_row, self.written - first_row + rows)
+            names = {field: segment_file(field, index) for field in ('x', 'y', 'heading', 'alive')}
+            if self.storage == 'quantized':
+                self.maps[names['x']][target] = np.round(chunk['x'][:rows, start:stop])
+                self.maps[names['y']][target] = np.round(chunk['y'][:rows, start:stop])
+            else:
+                self.maps[names['x']][target] = chunk['x'][:rows, start:stop]
+                self.maps[names['y']][target] = chunk['y'][:rows, start:stop]
+            self.maps[names['heading']][target] = encode_heading(chunk['dx'][:rows, start:stop],
+                                                                 chunk['dy'][:rows, start:stop], self.storage)
+            self.maps[names['alive']][target] = np.packbits(chunk['alive'][:rows, start:stop], axis=1)
+        target = slice(self.written, self.written + rows)
+        self.maps['step'][target, 0] = chunk['step'][:rows]
+        self.maps['population'][target] = chunk['population'][:rows]
+        self.written += rows
+
+    def field_path(self, field):
+        return os.path.join(self.path, f'{field}.bin')
+
+    def add_segment(self, first_row, start, stop):
+        """Add the files of the columns from start to stop, recorded from first_row on, mapped by the next grow()"""
+        self.segments.append((first_row, start, stop))
+        index = len(self.segments) - 1
+        positions, headings = STORAGE_MODES[self.storage]['position'], STORAGE_MODES[self.storage]['heading']
+        for field, dtype, width in (('x', positions, stop - start), ('y', positions, stop - start),
+                                    ('heading', headings, stop - start), ('alive', np.uint8, (stop - start + 7) // 8)):
+            self.fields[segment_file(field, index)] = (dtype, width, first_row)
+
+    def grow(self, capacity):
+        """Extend every file to hold the rows up to capacity and map it again"""
+        for field, (dtype, width, first_row) in self.fields.items():
+            if field in self.maps:
+                self.maps[field].flush()
+            rows = capacity - first_row
+            row_bytes = np.dtype(dtype).itemsize * width
+            with open(self.field_path(field), 'ab') as field_file:
+                field_file.truncate(max(1, rows * row_bytes))
+            self.maps[field] = np.memmap(self.field_path(field), dtype=dtype, mode='r+', shape=(rows, width))
+        self.capacity = capacity
+
+    def write_meta(self):
+        for name in ('kind', 'world', 'ids', 'first_row'):
+            np.save(os.path.join(self.path, f'{name}.npy'), getattr(self, name))
+        meta = {
+            'storage': self.storage,
+            'steps': self.written,
+            'num_birds': self.num_birds,
+            'num_worlds': self.num_worlds,
+            'fields': {field: {'dtype': np.dtype(dtype).str, 'width': width, 'first_row': first_row}
+                       for field, (dtype, width, first_row) in self.fields.items()},
+            'segments': [{'first_row': first_row, 'columns': [start, stop]}
+                         for first_row, start, stop in self.segments],
+            'arena': [variables.screen_width - variables.panel_width, variables.screen_height],
+            'restricted_areas': [list(rect) for rect in variables.restricted_areas],
+            'restricted_polygons': [[list(point) for point in points] for points in variables.restricted_polygons],
+        }
+        with open(os.path.join(self.path, 'meta.json'), 'w') as meta_file:
+            json.dump(meta, meta_file, indent=2)
+
+    def close(self):
+        if self.writer is None:
+            return
+        if self.chunk_rows:
+            self.submit()
+        self.full_chunks.put(None)
+        self.writer.join()
+        self.writer = None
+
+        # Trim the files to the recorded steps
+        for field, (dtype, width, first_row) in self.fields.items():
+            self.maps[field].flush()
+            self.maps[field] = None
+            with open(self.field_path(field), 'r+b') as field_file:
+                field_file.truncate(max(0, self.written - first_row) * np.dtype(dtype).itemsize * width)
+        self.maps = {}
+        self.write_meta()
+        if self.error is not None:
+            raise self.error
+
+
+class Trajectory:
+    """
+    The Trajectory class reads a recording back without loading it into memory.
+    Every field is a read-only memory map, decoded one step at a time. Frames
+    are put together from the column segments, with the columns of segments
+    opened after the row dead.
+
+    Attributes:
+        steps (int): Number of recorded steps.
+        num_birds (int): Number of birds recorded, those born during the recording included.
+        kind (ndarray): Species of every bird.
+        world (ndarray): World of every bird.
+        ids (ndarray): Stable id of every bird.
+        first_row (ndarray): Row in which every bird was first recorded, before which it was not born yet.
+        segments (list): First row, first column and end column of every column segment.
+        step_index (ndarray): Simulation step of every recorded row.
+        num_worlds (int): Number of worlds in the recording.
+        populations (ndarray): Living predators and prey of all worlds in every recorded row, shape (steps, 2),
+            summed when read.
+        meta (dict): The recording's metadata.
+
+    Methods:
+        frame(row): Returns positions, headings and alive flags of a recorded row.
+        row_at(step): Returns the last recorded row at or before a simulation step.
+        world_populations(world): Returns the living predators and prey of one world in every recorded row.
+    """
+    def __init__(self, path):
+        with open(os.path.join(path, 'meta.json')) as meta_file:
+            self.meta = json.load(meta_file)
+        self.path = path
+        self.storage = self.meta['storage']
+        self.steps = self.meta['steps']
+        self.num_birds = self.meta['num_birds']
+        self.kind = np.load(os.path.join(path, 'kind.npy'))
+        self.world = np.load(os.path.join(path, 'world.npy'))
+        ids_path = os.path.join(path, 'ids.npy')
+        self.ids = np.load(ids_path) if os.path.exists(ids_path) else np.arange(self.num_birds)
+        first_row_path = os.path.join(path, 'first_row.npy')
+        self.first_row = (np.load(first_row_path) if os.path.exists(first_row_path)
+                          else np.zeros(self.num_birds, dtype=np.int64))
+        # Recordings made before column segments have all their columns in one
+        fields = self.meta['fields']
+        self.segments = [(segment['first_row'], *segment['columns']) for segment in self.meta.get('segments', [])]
+        self.segments = self.segments or [(0, 0, fields['x']['width'])]
+        self.maps = {}
+        for field, layout in fields.items():
+            rows = self.steps - layout.get('first_row', 0)
+            if rows > 0:
+                self.maps[field] = np.memmap(os.path.join(path, f'{field}.bin'), dtype=np.dtype(layout['dtype']),
+                                             mode='r', shape=(rows, layout['width']))
+        self.step_index = np.asarray(self.maps['step'][:, 0]) if self.steps else np.zeros(0, dtype=np.int64)
+        self.num_worlds = self.meta.get('num_worlds', 1)
+
+        # Rows recorded at a fixed interval are found arithmetically, otherwise by binary search
+        intervals = np.diff(self.step_index)
+        self.interval = int(intervals[0]) if len(intervals) and np.all(intervals == intervals[0]) else None
+
+    def __len__(self):
+        return self.steps
+
+    @property
+    def populations(self):
+        return self.world_populations().sum(axis=1)
+
+    def world_populations(self, world=None):
+        """
+        Living predators and prey of one world in every recorded row, shape
+        (steps, 2), or of every world, shape (steps, worlds, 2). A view of the
+        memory map, so rows are only read from disk when used.
+        """
+        if self.steps == 0:
+            counts = np.zeros((0, self.num_worlds, 2), dtype=np.int32)
+        else:
+            counts = np.asarray(self.maps['population']).reshape(self.steps, self.num_worlds, 2)
+        return counts if world is None else counts[:, world]
+
+    def row_at(self, step):
+        """Index of the last recorded row at or before a simulation step, clamped to the recording"""
+        if self.steps == 0:
+            raise IndexError("The recording is empty")
+        if self.interval:
+            row = (step - self.step_index[0]) // self.interval
+        else:
+            row = np.searchsorted(self.step_index, step, side='right') - 1
+        return int(min(max(row, 0), self.steps - 1))
+
+    def frame(self, row):
+        """(x, y, heading, alive) of every bird in a recorded row, as float and bool arrays"""
+        width = self.segments[-1][2]
+        x, y, heading = np.zeros(width), np.zeros(width), np.zeros(width)
+        alive = np.zeros(width, dtype=bool)
+        for index, (first_row, start, stop) in enumerate(self.segments):
+            if row < first_row:
+                break  # Columns of birds born after this row
+            local, columns = row - first_row, slice(start, stop)
+            x[columns] = self.maps[segment_file('x', index)][local]
+            y[columns] = self.maps[segment_file('y', index)][local]
+            heading[columns] = decode_heading(self.maps[segment_file('heading', index)][local], self.storage)
+            alive[columns] = np.unpackbits(self.maps[segment_file('alive', index)][local], count=stop - start)
+        birds = slice(0, self.num_birds)  # The last segment may hold spare columns for births
+        return x[birds], y[birds], heading[birds], alive[birds]
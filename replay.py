@@ -0,0 +1,144 @@
+import numpy as np
+import pygame
+import variables
+from flock import Flock
+from PopulationChart import HistoryPyramid
+from recorder import Trajectory
+
+SPEED_LIMITS = (1 / 16, 1024)  # Slowest and fastest playback, in multiples of SIMULATION_HZ
+SEEK_FRACTION = 0.1  # Share of the recording skipped by Page Up / Page Down
+
+
+class Replay:
+    """
+    The Replay class plays a recorded trajectory back into a Flock that the game
+    draws like a live one, without running any simulation. Playback moves
+    through simulation steps at a variable speed, forwards or backwards, and
+    jumps to any step through the recording's keyframe index. Between two
+    recorded rows positions are interpolated. Birds born during the recording
+    are only in the flock from the row they were first recorded in.
+
+    Attributes:
+        trajectory (Trajectory): The recording being played.
+        world (int): World of the recording being shown.
+        flock (Flock): Birds of the replayed world, holding the displayed frame.
+        step (float): Simulation step currently shown.
+        speed (float): Playback speed in multiples of SIMULATION_HZ.
+        direction (int): 1 to play forwards, -1 to play backwards.
+        paused (bool): Whether playback is stopped.
+
+    Methods:
+        advance(seconds): Moves playback on by some real time.
+        seek(step): Jumps to a simulation step.
+        show(chart): Loads the current frame into the flock and the population chart.
+        handle_key(key): Applies a playback key, returning whether it was one.
+        draw(screen): Renders the playback status line and returns its area.
+    """
+    def __init__(self, path, world=0):
+        self.trajectory = Trajectory(path)
+        if len(self.trajectory) == 0:
+            raise ValueError(f"{path} holds no recorded steps")
+        self.world = world
+        self.members = np.flatnonzero(self.trajectory.world == world)
+        # Columns are added as birds are born, so the birds born by any row come first
+        self.first_row = self.trajectory.first_row[self.members]
+        self.first_step = int(self.trajectory.step_index[0])
+        self.last_step = int(self.trajectory.step_index[-1])
+        self.step = float(self.first_step)
+        self.speed = 1.0
+        self.direction = 1
+        self.paused = False
+        self.font = None
+        self.chart = None
+        self.chart_row = None
+        # Counts of the replayed world, read from the recording as the chart needs them, and their whole-run buckets
+        self.populations = self.trajectory.world_populations(world)
+        self.pyramid = HistoryPyramid(self.populations)
+
+        self.kind = self.trajectory.kind[self.members]
+        zeros = np.zeros(len(self.members))
+        self.flock = Flock(zeros, zeros, zeros, zeros, self.kind)
+        self.flock.energy[:] = np.nan  # Not recorded, so no energy bars are drawn
+
+        # The arena the recording was made in
+        variables.restricted_areas = [tuple(rect) for rect in self.trajectory.meta['restricted_areas']]
+        variables.restricted_polygons = [[tuple(point) for point in points]
+                                         for points in self.trajectory.meta.get('restricted_polygons', [])]
+
+    def advance(self, seconds):
+        if not self.paused:
+            self.seek(self.step + self.direction * self.speed * variables.SIMULATION_HZ * seconds)
+
+    def seek(self, step):
+        self.step = float(min(max(step, self.first_step), self.last_step))
+
+    def show(self, chart=None):
+        """Load the frame at the current step into the flock, and its world's history up to it into the chart"""
+        trajectory = self.trajectory
+        row = trajectory.row_at(self.step)
+        members = self.members[:np.searchsorted(self.first_row, row, side='right')]
+        x, y, heading, alive = (values[members] for values in trajectory.frame(row))
+
+        # Between two recorded rows, living birds move in a straight line
+        if row + 1 < len(trajectory):
+            start, end = trajectory.step_index[row], trajectory.step_index[row + 1]
+            fraction = (self.step - start) / (end - start)
+            if fraction > 0:
+                next_x, next_y, _, next_alive = (values[members] for values in trajectory.frame(row + 1))
+                moving = alive & next_alive
+                x[moving] += (next_x[moving] - x[moving]) * fraction
+                y[moving] += (next_y[moving] - y[moving]) * fraction
+
+        flock = self.flock
+        if len(flock) != len(members):
+            flock.resize(len(members))
+            flock.kind[:] = self.kind[:len(members)]
+            flock.fade_alpha[:] = 255
+            flock.energy[:] = np.nan
+        flock.x[:] = x
+        flock.y[:] = y
+        flock.dx[:] = np.cos(heading)
+        flock.dy[:] = np.sin(heading)
+        flock.alive[:] = alive
+        variables.X = flock.x
+        variables.Y = flock.y
+
+        # The chart holds the recording up to this row, loaded from the latest counts and the pyramid's buckets
+        if chart is not None and (chart is not self.chart or row != self.chart_row):
+            window = self.populations[max(0, row + 1 - chart.length):row + 1]
+            chart.restore(window[:, 0], window[:, 1], row + 1, *self.pyramid.buckets(row + 1))
+            self.chart, self.chart_row = chart, row
+
+    def handle_key(self, key):
+        """Space pauses, arrows set direction and speed, Home/End and Page Up/Down seek"""
+        span = self.last_step - self.first_step
+        if key == pygame.K_SPACE:
+            self.paused = not self.paused
+        elif key == pygame.K_RIGHT:
+            self.direction = 1
+        elif key == pygame.K_LEFT:
+            self.direction = -1
+        elif key == pygame.K_UP:
+            self.speed = min(self.speed * 2, SPEED_LIMITS[1])
+        elif key == pygame.K_DOWN:
+            self.speed = max(self.speed / 2, SPEED_LIMITS[0])
+        elif key == pygame.K_HOME:
+            self.seek(self.first_step)
+        elif key == pygame.K_END:
+            self.seek(self.last_step)
+        elif key == pygame.K_PAGEUP:
+            self.seek(self.step + span * SEEK_FRACTION)
+        elif key == pygame.K_PAGEDOWN:
+            self.seek(self.step - span * SEEK_FRACTION)
+        else:
+            return False
+        return True
+
+    def draw(self, screen):
+        if self.font is None:
+            self.font = pygame.font.Font(None, 24)
+        state = "paused" if self.paused else ("playing" if self.direction > 0 else "rewinding")
+        text = f"Replay step {int(self.step)} / {self.last_step}  {state} at {self.speed:g}x"
+        label = self.font.render(text, True, variables.get_current_theme()['text'])
+        return screen.blit(label, (variables.BORDER_THICKNESS + 10,
+                                   variables.screen_height - variables.BORDER_THICKNESS - 30))
@@ -0,0 +1,134 @@
+import math
+import numpy as np
+import pygame
+import variables
+
+HEADING_STEP = 5  # Degrees per heading bucket
+HEADING_BUCKETS = 360 // HEADING_STEP
+ALPHA_STEP = 16  # Fade levels of dead birds are cached in steps of this many alpha units
+
+
+def heading_bucket(dx, dy):
+    """Quantized heading of a movement vector, works on scalars and arrays"""
+    angle = np.degrees(np.arctan2(dy, dx))
+    return np.round(angle / HEADING_STEP).astype(np.int64) % HEADING_BUCKETS
+
+
+def alpha_bucket(alpha):
+    """Quantized fade level, never below the minimum alpha of dead birds"""
+    return np.clip(np.round(np.asarray(alpha) / ALPHA_STEP) * ALPHA_STEP, 50, 255).astype(np.int64)
+
+
+class SpriteCache:
+    """
+    The SpriteCache class holds pre-rendered, pre-rotated bird sprites so that
+    drawing a bird is a single blit. Sprites are keyed by color and size (which
+    together identify the species and theme), alive/dead, fade level and heading
+    bucket, rendered on first use and dropped when the theme changes.
+
+    Methods:
+        rotations(color, size, alive, alpha): Returns the sprite table for every heading.
+        sprite(color, size, alive, dx, dy, alpha): Returns a sprite and its top-left offset.
+        blur(color, size, dx, dy): Returns the motion-blur sprite for a heading.
+        invalidate(): Drops every cached sprite.
+    """
+    def __init__(self):
+        self.tables = {}
+        self.blur_tables = {}
+        self.is_dark_mode = variables.is_dark_mode
+
+    def invalidate(self):
+        self.tables.clear()
+        self.blur_tables.clear()
+
+    def check_theme(self):
+        if self.is_dark_mode != variables.is_dark_mode:
+            self.is_dark_mode = variables.is_dark_mode
+            self.invalidate()
+
+    def rotations(self, color, size, alive, alpha=255):
+        """
+        Sprites for every heading bucket as parallel arrays: surfaces (object array)
+        and the x and y offsets from the bird position to the sprite's top-left corner.
+        """
+        self.check_theme()
+        key = (tuple(color[:3]), size, alive, int(alpha))
+        if key not in self.tables:
+            base = self.render(color, size, alive, int(alpha))
+            surfaces = np.empty(HEADING_BUCKETS, dtype=object)
+            offset_x = np.zeros(HEADING_BUCKETS)
+            offset_y = np.zeros(HEADING_BUCKETS)
+            for bucket in range(HEADING_BUCKETS):
+                rotated = pygame.transform.rotate(base, -bucket * HEADING_STEP)
+                surfaces[bucket] = rotated
+                offset_x[bucket] = rotated.get_width() / 2
+                offset_y[bucket] = rotated.get_height() / 2
+            self.tables[key] = (surfaces, offset_x, offset_y)
+        return self.tables[key]
+
+    def sprite(self, color, size, alive, dx, dy, alpha=255):
+        surfaces, offset_x, offset_y = self.rotations(color, size, alive, alpha)
+        bucket = heading_bucket(dx, dy)
+        return surfaces[bucket], (offset_x[bucket], offset_y[bucket])
+
+    def blur(self, color, size, dx, dy):
+        """Motion-blur sprite, blitted at the bird position minus size plus its movement"""
+        self.check_theme()
+        key = (tuple(color[:3]), size)
+        if key not in self.blur_tables:
+            blur_surface = pygame.Surface((size * 3, size * 3), pygame.SRCALPHA)
+            pygame.draw.polygon(blur_surface, (*color[:3], 50), [  # Very transparent
+                (size * 3, size * 1.5),
+                (0, size),
+                (size, size * 1.5),
+                (0, size * 2),
+            ])
+            surfaces = np.empty(HEADING_BUCKETS, dtype=object)
+            for bucket in range(HEADING_BUCKETS):
+                surfaces[bucket] = pygame.transform.rotate(blur_surface, -bucket * HEADING_STEP)
+            self.blur_tables[key] = surfaces
+        return self.blur_tables[key][heading_bucket(dx, dy)]
+
+    def render(self, color, size, alive, alpha):
+        """Draw the unrotated bird, facing right"""
+        bird_surface = pygame.Surface((math.ceil(size * 3), math.ceil(size * 3)), pygame.SRCALPHA)
+        if not alive:
+            # Dead bird with faded body and subtle wing-like details
+            pygame.draw.polygon(bird_surface, (*color[:3], alpha), [
+                (size * 3, size * 1.5),  # Elongated tip
+                (0, size),  # Top back
+                (size, size * 1.5),  # Back indent
+                (0, size * 2),  # Bottom back
+            ])
+            pygame.draw.polygon(bird_surface, (*color[:3], alpha // 2), [
+                (size * 2, size * 1.5),
+                (size, size),
+                (size * 1.5, size * 1.5),
+            ])
+            return bird_surface
+
+        # Main body
+        pygame.draw.polygon(bird_surface, color, [
+            (size * 3, size * 1.5),  # Elongated nose
+            (0, size),  # Top back
+            (size, size * 1.5),  # Back indent
+            (0, size * 2),  # Bottom back
+        ])
+
+        # Eye
+        eye_pos = (size * 2.5, size * 1.5)
+        pygame.draw.circle(bird_surface, (255, 255, 255), eye_pos, size / 4)
+        pygame.draw.circle(bird_surface, (0, 0, 0), eye_pos, size / 6)
+
+        # Slightly darker wing
+        wing_color = tuple(max(0, c - 30) for c in color[:3])
+        pygame.draw.polygon(bird_surface, wing_color, [
+            (size * 2, size * 1.5),
+            (size, size),
+            (size * 1.5, size * 1.5),
+        ])
+        return bird_surface
+
+
+# Shared by every bird, so sprites are rendered once per process
+bird_sprites = SpriteCache()
@@ -0,0 +1,187 @@
+"""
+Parameter sweeps. Runs many headless simulations across a process pool, each
+with its own seed, and collects population time series and summary metrics
+into one JSON results file.
+
+    python sweep.py --grid inertia=0.8,0.9 predator_ratio=0.05,0.1 --repeats 4 --steps 5000 --output sweep.json
+    python sweep.py --sample 1000 --ranges shift_to_buddy=0.2:1.0 PREDATOR_INITIAL_ENERGY=50:200 --output sweep.json
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+import numpy as np
+import variables
+from benchmark import environment
+from headless import HeadlessSimulation, load_obstacles, load_polygons
+
+
+def parameter_value(name, text):
+    """Parse a value for a setting in variables.py, keeping the setting's type"""
+    default = getattr(variables, name, None)
+    if isinstance(default, bool) or not isinstance(default, (int, float)):
+        raise ValueError(f"{name} is not a numeric setting in variables.py")
+    return type(default)(round(float(text)) if isinstance(default, int) else float(text))
+
+
+def parse_grid(specs):
+    """{'name': [values]} from 'name=v1,v2,...' strings"""
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        grid[name] = [parameter_value(name, value) for value in values.split(',')]
+    return grid
+
+
+def parse_ranges(specs):
+    """{'name': (low, high)} from 'name=low:high' strings"""
+    ranges = {}
+    for spec in specs:
+        name, _, bounds = spec.partition('=')
+        low, _, high = bounds.partition(':')
+        parameter_value(name, low)  # Validates the name
+        ranges[name] = (float(low), float(high))
+    return ranges
+
+
+def parameter_sets(grid, ranges, samples, rng):
+    """Every grid combination, each crossed with samples random draws from the ranges"""
+    combinations = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    if not samples:
+        return combinations
+    return [{**combination,
+             **{name: parameter_value(name, rng.uniform(low, high)) for name, (low, high) in ranges.items()}}
+            for combination in combinations for _ in range(samples)]
+
+
+def extinction_step(steps, population):
+    """First recorded step with no birds left, or None"""
+    extinct = np.flatnonzero(np.asarray(population) == 0)
+    return int(steps[extinct[0]]) if len(extinct) else None
+
+
+def oscillation_period(steps, population, min_correlation=0.2):
+    """
+    Dominant period of a population series in steps, from the first autocorrelation
+    peak of the detrended series, or None when it does not oscillate at least twice.
+    """
+    values = np.asarray(population, dtype=float)
+    if len(values) < 8:
+        return None
+    time_axis = np.arange(len(values))
+    values = values - np.polyval(np.polyfit(time_axis, values, 1), time_axis)
+    variance = np.dot(values, values)
+    if variance == 0:
+        return None
+    correlation = np.correlate(values, values, mode='full')[len(values) - 1:] / variance
+
+    # The peak has to come after the correlation first drops below zero
+    negative = np.flatnonzero(correlation < 0)
+    if len(negative) == 0:
+        return None
+    lags = np.arange(negative[0], len(correlation) // 2 + 1)
+    peaks = lags[(correlation[lags] >= correlation[lags - 1]) & (correlation[lags] > correlation[lags + 1]) &
+                 (correlation[lags] > min_correlation)]
+    if len(peaks) == 0:
+        return None
+    return int(peaks[0] * (steps[1] - steps[0]))
+
+
+def run_one(run):
+    """Worker entry point: one seeded headless simulation with its settings applied"""
+    for name, value in {**run['settings'], **run['parameters']}.items():
+        setattr(variables, name, value)
+    simulation = HeadlessSimulation(seed=run['seed'])
+
+    steps, predators, prey = [0], [], []
+    num_predators, num_prey = simulation.populations()
+    predators.append(num_predators)
+    prey.append(num_prey)
+    start = time.perf_counter()
+    while simulation.step_count < run['steps'] and num_predators and num_prey:
+        simulation.step()
+        if simulation.step_count % run['record_every'] == 0:
+            num_predators, num_prey = simulation.populations()
+            steps.append(simulation.step_count)
+            predators.append(num_predators)
+            prey.append(num_prey)
+
+    return {
+        'run': run['run'],
+        'seed': run['seed'],
+        'parameters': run['parameters'],
+        'steps_run': simulation.step_count,
+        'elapsed_seconds': round(time.perf_counter() - start, 3),
+        'metrics': {
+            'final_predators': predators[-1],
+            'final_prey': prey[-1],
+            'predator_extinction_step': extinction_step(steps, predators),
+            'prey_extinction_step': extinction_step(steps, prey),
+            'predator_period': oscillation_period(steps, predators),
+            'prey_period': oscillation_period(steps, prey),
+        },
+        'series': {'step': steps, 'predators': predators, 'prey': prey},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run headless simulations over a parameter grid or sample")
+    parser.add_argument('--grid', nargs='*', default=[], metavar='NAME=V1,V2',
+                        help="settings from variables.py and the values to try, every combination is run")
+    parser.add_argument('--ranges', nargs='*', default=[], metavar='NAME=LOW:HIGH',
+                        help="settings to draw uniformly at random, used with --sample")
+    parser.add_argument('--sample', type=int, default=0, help="random draws from --ranges per grid combination")
+    parser.add_argument('--repeats', type=int, default=1, help="seeded runs per parameter set")
+    parser.add_argument('--steps', type=int, default=2000, help="steps per run, fewer if a species dies out")
+    parser.add_argument('--record-every', type=int, default=10)
+    parser.add_argument('--num-birds', type=int, default=variables.num_birds)
+    parser.add_argument('--obstacles', default='default',
+                        help="'default', 'none' or a JSON file listing [x, y, width, height] rectangles "
+                             "and [[x, y], ...] polygons")
+    parser.add_argument('--seed', type=int, default=0, help="root seed the per-run seeds are derived from")
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--output', required=True)
+    args = parser.parse_args()
+
+    try:
+        grid = parse_grid(args.grid)
+        ranges = parse_ranges(args.ranges)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.sample and not ranges:
+        parser.error("--sample needs --ranges")
+
+    rng = np.random.default_rng(args.seed)
+    parameters = parameter_sets(grid, ranges, args.sample, rng)
+    seeds = np.random.SeedSequence(args.seed).generate_state(len(parameters) * args.repeats)
+    settings = {
+        'num_birds': args.num_birds,
+        'restricted_areas': load_obstacles(args.obstacles),
+        'restricted_polygons': load_polygons(args.obstacles),
+        'neighbor_search': variables.neighbor_search,
+        'interaction_kernel': variables.interaction_kernel,
+    }
+    runs = [{'run': index, 'seed': int(seed), 'parameters': parameter_set, 'settings': settings,
+             'steps': args.steps, 'record_every': args.record_every}
+            for index, (parameter_set, seed) in enumerate(
+                zip((p for p in parameters for _ in range(args.repeats)), seeds))]
+
+    results = []
+    with multiprocessing.get_context('spawn').Pool(args.processes) as pool:
+        for result in pool.imap_unordered(run_one, runs):
+            results.append(result)
+            print(f"{len(results)}/{len(runs)} run {result['run']}: {result['steps_run']} steps, "
+                  f"{result['metrics']['final_predators']} predators, {result['metrics']['final_prey']} prey")
+    results.sort(key=lambda result: result['run'])
+
+    with open(args.output, 'w') as output_file:
+        json.dump({'environment': environment(), 'settings': {**settings, 'steps': args.steps,
+                                                              'record_every': args.record_every,
+                                                              'seed': args.seed},
+                   'runs': results}, output_file)
+
+
+if __name__ == "__main__":
+    main()
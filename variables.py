@@ -7,16 +7,37 @@ collision_zone_radius = 15
 interaction_zone_radius = 30
 shift_to_buddy = 0.7  # Adjust this value to control the shift strength
 show_zones = False  # Initially dont show the zones
+color_clusters = False  # Color living prey by the flock (connected group of neighbors) they fly in
+show_profiler = False  # Frame timing overlay, toggled from the control panel
+dirty_rect_rendering = False  # Only redraw and push the screen areas that changed since the last frame
+MAX_DIRTY_RECTS = 400  # Above this many changed areas the whole arena is pushed at once
+profiler_csv = None  # Path to stream per-frame phase timings to as CSV, or None
+checkpoint_path = 'checkpoint.npz'  # File written with F5 and read back with F9
+resume_from = None  # Checkpoint to start the game from, or None for a fresh flock
+record_path = None  # Directory to stream every step's trajectories to, or None
+record_storage = 'quantized'  # 'float32', 'float16' or 'quantized' (int16 positions, 8-bit headings)
+metrics_path = None  # CSV file to stream per-step flock metrics (polarization, kills, energy...) to, or None
+metrics_every = 1  # Steps between two rows of metrics
+replay_path = None  # Recording to play back instead of simulating, or None
+replay_world = 0  # World shown when replaying a batched multi-world recording
+compact_every = 100  # Steps between removals of fully faded dead birds from the simulation arrays, 0 to keep them
+
+# Timing
+SIMULATION_HZ = 60  # Simulation steps per simulated second
+MAX_FPS = 60  # Rendered frames per second cap
+MAX_SUBSTEPS = 8  # Steps per frame before the simulation is allowed to fall behind, per unit of sim_speed
+sim_speed = 1.0  # Fast-forward factor, simulated seconds per real second
 
 # Screen dimensions
 panel_width = 200
 screen_width = 1400
 screen_height = 800
 BORDER_THICKNESS = 9  # Define border thickness
-screen = pygame.display.set_mode((screen_width, screen_height))
+screen = None  # Display surface, created by init_display() so headless runs never open a window
 
 X = []  # Vector to store x-coordinates of birds
 Y = []  # Vector to store y-coordinates of birds
+CLUSTERS = None  # Flock label of every bird, set while color_clusters is on
 
 
 # Define multiple restricted areas as tuples of (x, y, width, height)
@@ -26,11 +47,23 @@ restricted_areas = [
     (600, 50, 100, 300),  # Area 3
 ]
 
+# Obstacles of any shape, as lists of (x, y) vertices
+restricted_polygons = []
+obstacle_avoidance = 'rects'  # 'rects' (per-rectangle loop) or 'field' (precomputed distance field, used with polygons)
+
 # Simulation Configuration
 num_birds = 100  # Total number of birds in the simulation
 predator_ratio = 0.1  # Proportion of predators in the total bird population
+seed = None  # Seed of the simulation's random generator, set it to make runs reproducible
+# 'vectorized' for the array engine, 'objects' for per-bird Bird.update. The default used to be 'objects'; the array
+# engine updates all birds from the start-of-step state, so runs differ from the object engine's
+engine = 'vectorized'
+interaction_kernel = 'numpy'  # 'numpy' for whole-array rules, 'jit' for the compiled pair loop (needs Numba)
+workers = 0  # Worker processes for the tiled parallel update of headless.py runs (--workers), 0 or 1 for none
+neighbor_search = 'grid'  # 'grid' (sorted cells), 'hash' (dict of lists) or 'kdtree' (needs SciPy)
 
 # Predator-Prey constants
+BIRD_SIZE = 10  # Base size of a bird in pixels
 PREDATOR_SIZE_RATIO = 2.0  # Predators are twice as big as prey
 PREDATOR_SPEED_RATIO = 0.6  # Predators move at 60% of prey speed
 PREDATOR_INITIAL_ENERGY = 100  # Starting energy for predators
@@ -38,6 +71,12 @@ PREDATOR_ENERGY_LOSS_INTERVAL = 10  # Lose energy every X simulation cycles
 PREDATOR_ENERGY_LOSS_AMOUNT = 1  # Amount of energy lost per interval
 PREDATOR_SPEED_ENERGY_COST = 0.2  # Additional energy cost per unit of speed above base speed
 PREDATOR_BASE_SPEED = 1.0  # Base speed threshold for additional energy cost
+# Predators that feed with at least this much energy left breed (vectorized engine), above what breeding leaves them
+PREDATOR_BREEDING_ENERGY = 80
+PREDATOR_BREEDING_COST = 50  # Energy a breeding predator gives its offspring, earned back by feeding again
+PREDATOR_BREEDING_COOLDOWN = 500  # Steps after its birth or last offspring before a predator can breed
+PREY_BIRTH_RATE = 0.002  # Chance per step that a living prey has an offspring (vectorized engine), 0 for none
+PREY_CAPACITY_RATIO = 2.0  # Prey births stop once a world has this many times the prey it started with
 ENERGY_BAR_WIDTH = 20  # Width of energy bar in pixels
 ENERGY_BAR_HEIGHT = 3  # Height of energy bar in pixels
 ENERGY_BAR_OFFSET = 15  # Vertical offset of energy bar above predator
@@ -51,6 +90,10 @@ ENERGY_BAR_HIGH = (0, 255, 0)  # Green for high energy
 ENERGY_BAR_MEDIUM = (255, 255, 0)  # Yellow for medium energy
 ENERGY_BAR_LOW = (255, 0, 0)  # Red for low energy
 CHART_GRID_COLOR = (128, 128, 128)  # Gray for chart grid
+CLUSTER_COLORS = [  # Cycled through by flock when color_clusters is on
+    (0, 255, 0), (0, 200, 255), (255, 220, 0), (200, 100, 255), (0, 255, 170), (255, 140, 200),
+    (140, 200, 60), (80, 120, 255), (255, 170, 80), (160, 255, 255),
+]
 
 # Chart settings
 CHART_WIDTH = panel_width - (2 * 20)  # Width to fit panel with margins
@@ -87,3 +130,10 @@ LIGHT_MODE = {
 
 def get_current_theme():
     return DARK_MODE if is_dark_mode else LIGHT_MODE
+
+def init_display():
+    """Open the simulation window, once, and return its surface"""
+    global screen
+    if screen is None:
+        screen = pygame.display.set_mode((screen_width, screen_height))
+    return screen